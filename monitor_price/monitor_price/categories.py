@@ -0,0 +1,44 @@
+# 苏宁回收价格的分类配置
+#
+# 每个分类对应一个列表接口路径和一组品牌编号：
+#     https://hx.suning.com/{path}/{page}/{brand_code}.htm
+# 新增分类只需在此添加一项（category 为写入数据库的分类名称），
+# suning_all 爬虫会自动爬取；也可以用 SUNING_CATEGORIES 只爬取部分分类。
+
+SUNING_CATEGORIES = {
+    'phone': {
+        'category': '手机',
+        'path': 'photo',
+        'brands': {
+            'pa00018': '苹果',
+            'pa00009': '华为',
+            'pa00022': '小米',
+            'pa00019': '三星',
+            'pa00003': 'OPPO',
+            'pa00005': 'vivo',
+            'pa00026': '荣耀',
+            'pa00031': 'Realme'
+        },
+    },
+    'computer': {
+        'category': '电脑',
+        'path': 'computer',
+        'brands': {
+            'pa00007': '苹果',
+            'pa00006': '联想',
+            'pa00004': '华硕',
+            'pa00001': '戴尔',
+            'pa00005': '惠普',
+            'pa00008': '三星',
+            'pa00003': '宏基',
+            'pa00009': '神州',
+            'pa00014': '华为',
+            'pa00016': '微星',
+            'pa00017': '雷神',
+            'pa00015': '外星人',
+            'pa00018': '微软',
+            'pa00012': '小米',
+            'pa00020': '炫龙'
+        },
+    },
+}
@@ -0,0 +1,109 @@
+# 紧凑的产品编号集合
+#
+# 苏宁的产品编号是 一个字母 + 数字（如 P160831000000004），可以无损编码为一个64位整数：
+#     字母序号（5位） | 数字位数（5位，保留前导零） | 数字值（54位，最多16位数字）
+# 编码后存入有序 array('Q')，新加入的编号先放在小缓冲区中，缓冲区超过已有数量的1/16时合并，
+# 每个编号约占 8~12 字节（str 放在 set 中约 100 字节）。
+# 其他格式的编号（如 _clean_item 生成的 分类_品牌_型号）放在普通 set 中，保证结果精确。
+
+from array import array
+from bisect import bisect_left
+
+_PREFIX_SHIFT = 59
+_LENGTH_SHIFT = 54
+_MAX_DIGITS = 16
+_PREFIXES = {letter: index for index, letter in enumerate('ABCDEFGHIJKLMNOPQRSTUVWXYZ', start=1)}
+
+# 缓冲区合并阈值：max(_MIN_BUFFER, 已合并数量 / _BUFFER_RATIO)
+_MIN_BUFFER = 4096
+_BUFFER_RATIO = 16
+
+
+def pack_code(code):
+    """把 [A-Z]? + 1~16位数字 编码为64位无符号整数，其他格式返回None"""
+    prefix = _PREFIXES.get(code[:1], 0)
+    digits = code[1:] if prefix else code
+    if not (0 < len(digits) <= _MAX_DIGITS and digits.isascii() and digits.isdigit()):
+        return None
+    return (prefix << _PREFIX_SHIFT) | (len(digits) << _LENGTH_SHIFT) | int(digits)
+
+
+def unpack_code(value):
+    prefix = value >> _PREFIX_SHIFT
+    length = (value >> _LENGTH_SHIFT) & 0x1F
+    digits = str(value & ((1 << _LENGTH_SHIFT) - 1)).zfill(length)
+    return ('ABCDEFGHIJKLMNOPQRSTUVWXYZ'[prefix - 1] if prefix else '') + digits
+
+
+class CompactCodeSet:
+    """与 set 接口相同（add / discard / in / len / 迭代）的产品编号集合"""
+
+    def __init__(self, codes=()):
+        self._sorted = array('Q')   # 已合并的编码，升序
+        self._buffer = set()        # 尚未合并的编码
+        self._other = set()         # 无法编码的编号，原样保存
+        for code in codes:
+            self.add(code)
+
+    def add(self, code):
+        value = pack_code(code)
+        if value is None:
+            self._other.add(code)
+            return
+        if value in self._buffer or self._in_sorted(value):
+            return
+        self._buffer.add(value)
+        if len(self._buffer) >= max(_MIN_BUFFER, len(self._sorted) // _BUFFER_RATIO):
+            self._merge()
+
+    def discard(self, code):
+        value = pack_code(code)
+        if value is None:
+            self._other.discard(code)
+        elif value in self._buffer:
+            self._buffer.discard(value)
+        elif self._in_sorted(value):
+            del self._sorted[bisect_left(self._sorted, value)]
+
+    def __contains__(self, code):
+        value = pack_code(code)
+        if value is None:
+            return code in self._other
+        return value in self._buffer or self._in_sorted(value)
+
+    def __len__(self):
+        return len(self._sorted) + len(self._buffer) + len(self._other)
+
+    def __iter__(self):
+        self._merge()
+        for value in self._sorted:
+            yield unpack_code(value)
+        yield from self._other
+
+    @property
+    def nbytes(self):
+        """近似内存占用（字节）：有序数组 + 缓冲区和其他编号的估算值"""
+        return (
+            self._sorted.itemsize * self._sorted.buffer_info()[1]
+            + 64 * len(self._buffer)
+            + sum(100 + len(code.encode('utf-8')) for code in self._other)
+        )
+
+    def _in_sorted(self, value):
+        index = bisect_left(self._sorted, value)
+        return index < len(self._sorted) and self._sorted[index] == value
+
+    def _merge(self):
+        """把缓冲区按序插入有序数组（逐段切片拷贝，不把整个数组转成Python对象）"""
+        if not self._buffer:
+            return
+        merged = array('Q')
+        start = 0
+        for value in sorted(self._buffer):
+            index = bisect_left(self._sorted, value, start)
+            merged.extend(self._sorted[start:index])
+            merged.append(value)
+            start = index
+        merged.extend(self._sorted[start:])
+        self._sorted = merged
+        self._buffer = set()
@@ -0,0 +1,142 @@
+# 写入失败数据的死信文件
+#
+# 管道对写入失败的item分批退避重试，重试次数用完仍失败的追加到本地 JSONL 文件，
+# 每行一条 MonitorPriceItem 字段的记录（附带失败原因），之后可以重新写入：
+#     python -m monitor_price.deadletter replay
+#     python -m monitor_price.deadletter stats
+# 文件格式与 import_crawl 管理命令兼容，也可以直接在后端服务器上导入。
+
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+
+class DeadLetterFile:
+    """只追加的死信文件（JSONL）"""
+
+    FIELDS = ('product_code', 'name', 'category', 'brand', 'model', 'avg_price', 'scrape_date')
+
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+
+    def append(self, item, spider_name, error, attempts):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        entry = {field: item.get(field) for field in self.FIELDS}
+        entry['avg_price'] = str(entry['avg_price'])
+        if isinstance(entry['scrape_date'], date):
+            entry['scrape_date'] = entry['scrape_date'].isoformat()
+        entry.update({
+            'spider': spider_name,
+            'error': error,
+            'attempts': attempts,
+            'failed_at': datetime.now().isoformat(timespec='seconds'),
+        })
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.written += 1
+
+    def read(self):
+        """读取全部记录，文件不存在时返回空列表"""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def rewrite(self, entries):
+        """用剩余记录替换文件（先写临时文件再替换，中途失败不会丢数据）"""
+        if not entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+
+def entry_to_item(entry):
+    """死信记录转换回管道清洗后的item格式"""
+    item = {field: entry[field] for field in DeadLetterFile.FIELDS}
+    item['avg_price'] = Decimal(item['avg_price'])
+    item['scrape_date'] = date.fromisoformat(item['scrape_date'])
+    return item
+
+
+def replay(storage, deadletter, chunk_size=100):
+    """
+    按批重新写入死信记录，成功的从文件中删除
+    返回 Deferred，结果为 (成功条数, 剩余条数)
+    """
+    from twisted.internet import defer
+
+    entries = deadletter.read()
+    remaining = []
+
+    @defer.inlineCallbacks
+    def _run():
+        written = 0
+        for start in range(0, len(entries), chunk_size):
+            chunk = entries[start:start + chunk_size]
+            try:
+                yield storage.runInteraction(storage.batch_upsert, [entry_to_item(entry) for entry in chunk])
+            except Exception as e:
+                print(f"写入失败，保留 {len(chunk)} 条: {e}")
+                remaining.extend(chunk)
+            else:
+                written += len(chunk)
+        deadletter.rewrite(remaining)
+        return written, len(remaining)
+
+    return _run()
+
+
+def main(argv=None):
+    import argparse
+
+    from scrapy import Spider
+    from scrapy.settings import Settings
+    from twisted.internet import task
+
+    from monitor_price.storage import open_storage
+
+    settings = Settings()
+    settings.setmodule('monitor_price.settings')
+
+    parser = argparse.ArgumentParser(description='死信文件工具')
+    parser.add_argument('command', choices=['replay', 'stats'])
+    parser.add_argument('--path', default=settings.get('DEADLETTER_PATH'), help='死信文件路径')
+    parser.add_argument('--backend', default=None, help='写入的存储后端（默认使用 STORAGE_BACKEND）')
+    parser.add_argument('--chunk-size', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    deadletter = DeadLetterFile(args.path)
+    if args.command == 'stats':
+        entries = deadletter.read()
+        print(f"{args.path}: {len(entries)} 条")
+        for spider_name in sorted({entry['spider'] for entry in entries}):
+            count = sum(1 for entry in entries if entry['spider'] == spider_name)
+            print(f"  {spider_name}: {count} 条")
+        return
+
+    if args.backend:
+        settings.set('STORAGE_BACKEND', args.backend)
+
+    def _main(reactor):
+        storage = open_storage(settings)
+        storage.open_spider(Spider(name='deadletter'))
+        d = replay(storage, deadletter, args.chunk_size)
+        d.addCallback(lambda result: print(f"已重新写入 {result[0]} 条，剩余 {result[1]} 条: {args.path}"))
+        d.addBoth(lambda result: (storage.close(), result)[1])
+        return d
+
+    task.react(_main)
+
+
+if __name__ == '__main__':
+    main()
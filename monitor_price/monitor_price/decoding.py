@@ -0,0 +1,168 @@
+# 列表接口响应的快速解码
+#
+# 直接解析 response.body（bytes），不先解码成 str；只取出写入数据库需要的字段：
+#     totalPage, listItem[].itemCode / itemName / averagePrice
+# 安装了 orjson 时使用 orjson，否则使用标准库 json；可用 SUNING_JSON_DECODER 指定。
+#
+# 微基准（默认用 test.json 中录制的商品重建列表页，也可以指定保存的原始响应文件）：
+#     python -m monitor_price.decoding
+#     python -m monitor_price.decoding --bodies responses/*.json --repeat 200
+
+import json
+from collections import namedtuple
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+ListItem = namedtuple('ListItem', ['item_code', 'item_name', 'average_price'])
+
+# items 为 None 表示响应中没有 listItem（接口返回数据异常）
+ListingPage = namedtuple('ListingPage', ['total_pages', 'items'])
+
+
+class DecodeError(ValueError):
+    """响应不是合法的JSON对象"""
+
+
+def _loads_stdlib(body):
+    # json.loads 接受 bytes，自动识别 UTF-8/16/32 编码
+    return json.loads(body)
+
+
+def _loads_orjson(body):
+    return orjson.loads(body)
+
+
+DECODERS = {'json': _loads_stdlib}
+if orjson is not None:
+    DECODERS['orjson'] = _loads_orjson
+
+
+def get_decoder(name='auto'):
+    """按名称返回解码函数，auto 时优先使用 orjson"""
+    if name in (None, '', 'auto'):
+        name = 'orjson' if 'orjson' in DECODERS else 'json'
+    if name not in DECODERS:
+        raise ValueError(f'不可用的JSON解码器: {name}（可选: {", ".join(DECODERS)}）')
+    return DECODERS[name]
+
+
+def decode_listing(body, loads=None):
+    """
+    解析列表接口响应
+    参数：
+        body: 响应体（bytes）
+        loads: get_decoder() 返回的解码函数，默认自动选择
+    返回：
+        ListingPage
+    """
+    try:
+        data = (loads or get_decoder())(body)
+    except ValueError as e:  # json.JSONDecodeError、orjson.JSONDecodeError 都是 ValueError
+        raise DecodeError(str(e)) from e
+    if not isinstance(data, dict):
+        raise DecodeError(f'响应不是JSON对象: {type(data).__name__}')
+
+    list_items = data.get('listItem')
+    if list_items is None:
+        return ListingPage(int(data.get('totalPage') or 1), None)
+
+    items = [
+        ListItem(
+            str(row.get('itemCode') or '').strip(),
+            str(row.get('itemName') or '').strip(),
+            str(row.get('averagePrice') or '0').strip(),
+        )
+        for row in list_items
+    ]
+    return ListingPage(int(data.get('totalPage') or 1), items)
+
+
+def _recorded_bodies(path, page_size=20):
+    """用录制的商品（replay.load_records 支持的格式）重建与接口格式相同的列表页响应"""
+    from monitor_price.replay import load_records
+
+    pages = []
+    records = load_records(path)
+    for start in range(0, len(records), page_size):
+        chunk = records[start:start + page_size]
+        pages.append({
+            'totalPage': (len(records) + page_size - 1) // page_size,
+            'currentPage': start // page_size + 1,
+            'listItem': [
+                {
+                    'itemCode': code,
+                    'itemName': name,
+                    'averagePrice': str(price),
+                    'brandName': brand,
+                    'categoryName': category,
+                    'itemImg': f'//image.suning.cn/uimg/hx/item/{code}_1_200x200.jpg',
+                    'itemUrl': f'//hx.suning.com/item/{code}.htm',
+                    'maxPrice': str(price * 2),
+                    'minPrice': str(price // 2),
+                    'recycleCount': 0,
+                    'tags': [],
+                }
+                for code, name, category, brand, model, price in chunk
+            ],
+        })
+    return [json.dumps(page, ensure_ascii=False).encode('utf-8') for page in pages]
+
+
+def _baseline(body):
+    """原来的解析方式：先解码成 str，再用 json.loads 生成完整的字典"""
+    data = json.loads(body.decode('utf-8'))
+    return data.get('totalPage'), [
+        (row.get('itemCode', '').strip(), row.get('itemName', '').strip(), row.get('averagePrice', '0').strip())
+        for row in data.get('listItem', [])
+    ]
+
+
+def main(argv=None):
+    import argparse
+    import glob
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description='列表接口响应解码微基准')
+    parser.add_argument('--input', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test.json'),
+                        help='录制的商品数据，用于重建列表页（JSON数组或JSONL）')
+    parser.add_argument('--bodies', nargs='*', default=None, help='保存的原始响应文件（支持通配符），指定后不再重建')
+    parser.add_argument('--repeat', type=int, default=100, help='每种方式重复解析全部页面的次数')
+    args = parser.parse_args(argv)
+
+    if args.bodies:
+        bodies = []
+        for pattern in args.bodies:
+            for path in sorted(glob.glob(pattern)):
+                with open(path, 'rb') as f:
+                    bodies.append(f.read())
+    else:
+        bodies = _recorded_bodies(args.input)
+    if not bodies:
+        parser.error('没有可用的响应数据')
+
+    cases = [('baseline (str + json.loads)', _baseline)]
+    for name in DECODERS:
+        loads = DECODERS[name]
+        cases.append((f'decode_listing [{name}]', lambda body, loads=loads: decode_listing(body, loads)))
+
+    total_bytes = sum(len(body) for body in bodies)
+    print(f'{len(bodies)} 个页面，共 {total_bytes / 1024:.1f} KB，重复 {args.repeat} 次')
+    print(f'{"方式":<32}{"页/秒":>12}{"MB/秒":>10}{"每页(µs)":>12}')
+    for name, func in cases:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for body in bodies:
+                func(body)
+        elapsed = time.perf_counter() - started
+        pages = len(bodies) * args.repeat
+        print(f'{name:<32}{pages / elapsed:>12.0f}{total_bytes * args.repeat / elapsed / 1e6:>10.1f}'
+              f'{elapsed / pages * 1e6:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
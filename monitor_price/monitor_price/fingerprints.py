@@ -0,0 +1,189 @@
+# 价格指纹缓存
+#
+# 以 product_code 为键，在本地 SQLite 文件中记录上次写入数据库的
+# 主键、价格、日期和名称哈希，跨运行保留。管道据此跳过没有任何变化的写入。
+# 指纹只对写入它的目标有效：每个存储目标（后端 + 数据库/文件）使用单独的指纹文件，见 store_path()。
+#
+# 从数据库重建：
+#     python -m monitor_price.fingerprints rebuild
+
+import hashlib
+import os
+import sqlite3
+from collections import namedtuple
+
+
+Fingerprint = namedtuple('Fingerprint', ['product_id', 'price', 'scrape_date', 'name_hash'])
+
+
+def name_hash(name, category, brand, model):
+    """名称相关字段的哈希（任一字段变化都需要完整写入）"""
+    raw = '\x1f'.join((name or '', category or '', brand or '', model or ''))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def store_path(path, target):
+    """
+    存储目标对应的指纹文件：data/price_fingerprints.sqlite3 -> data/price_fingerprints.mysql-1a2b3c4d.sqlite3
+    target 为存储后端的 target（如 mysql://localhost:3306/recycle_db）
+    """
+    root, ext = os.path.splitext(path)
+    backend = target.split(':', 1)[0]
+    digest = hashlib.blake2b(target.encode('utf-8'), digest_size=4).hexdigest()
+    return f'{root}.{backend}-{digest}{ext}'
+
+
+def fingerprint_of(item, product_id=None):
+    """由清洗后的item生成指纹"""
+    return Fingerprint(
+        product_id,
+        str(item['avg_price']),
+        item['scrape_date'].isoformat(),
+        name_hash(item['name'], item['category'], item['brand'], item['model']),
+    )
+
+
+class PriceFingerprintStore:
+    """
+    基于SQLite的价格指纹存储
+    写入先缓存在内存中，达到 flush_every 条或调用 flush()/close() 时批量落盘
+    """
+
+    def __init__(self, path, flush_every=1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.flush_every = flush_every
+        self._dirty = {}
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS price_fingerprint (
+                product_code TEXT PRIMARY KEY,
+                product_id INTEGER,
+                price TEXT NOT NULL,
+                scrape_date TEXT NOT NULL,
+                name_hash TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def get(self, product_code):
+        """查询指纹，不存在时返回None"""
+        if product_code in self._dirty:
+            return self._dirty[product_code]
+        row = self.conn.execute(
+            'SELECT product_id, price, scrape_date, name_hash FROM price_fingerprint WHERE product_code = ?',
+            (product_code,)
+        ).fetchone()
+        return Fingerprint(*row) if row else None
+
+    def put(self, product_code, fingerprint):
+        self._dirty[product_code] = fingerprint
+        if len(self._dirty) >= self.flush_every:
+            self.flush()
+
+    def discard(self, product_code):
+        self._dirty.pop(product_code, None)
+        self.conn.execute('DELETE FROM price_fingerprint WHERE product_code = ?', (product_code,))
+
+    def flush(self):
+        if not self._dirty:
+            return
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO price_fingerprint VALUES (?, ?, ?, ?, ?)',
+                [(code, *fp) for code, fp in self._dirty.items()]
+            )
+        self._dirty = {}
+
+    def rebuild(self, rows):
+        """
+        用数据库中的记录重建指纹
+        参数：
+            rows: 可迭代的 (product_code, product_id, avg_price, scrape_date, name, category, brand, model)
+        返回：
+            重建的条数
+        """
+        self._dirty = {}
+        count = 0
+        with self.conn:
+            self.conn.execute('DELETE FROM price_fingerprint')
+            batch = []
+            for code, product_id, avg_price, scrape_date, name, category, brand, model in rows:
+                batch.append((
+                    code,
+                    product_id,
+                    str(avg_price),
+                    scrape_date.strftime('%Y-%m-%d'),
+                    name_hash(name, category, brand, model),
+                ))
+                if len(batch) >= self.flush_every:
+                    self.conn.executemany('INSERT OR REPLACE INTO price_fingerprint VALUES (?, ?, ?, ?, ?)', batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self.conn.executemany('INSERT OR REPLACE INTO price_fingerprint VALUES (?, ?, ?, ?, ?)', batch)
+                count += len(batch)
+        return count
+
+    def __len__(self):
+        self.flush()
+        return self.conn.execute('SELECT COUNT(*) FROM price_fingerprint').fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+REBUILD_SQL = """
+    SELECT product_code, id, avg_price, scrape_date, name, category, brand, model
+    FROM `recycle_recycleproduct`
+"""
+
+
+def main(argv=None):
+    import argparse
+
+    import pymysql
+    from monitor_price import settings
+    from monitor_price.storage.mysql import MySQLStorage
+
+    parser = argparse.ArgumentParser(description='价格指纹缓存工具（MySQL后端）')
+    parser.add_argument('command', choices=['rebuild', 'stats'])
+    parser.add_argument('--path', default=settings.FINGERPRINT_STORE_PATH,
+                        help='指纹文件路径（实际文件名中会加上数据库对应的后缀）')
+    args = parser.parse_args(argv)
+
+    path = store_path(args.path, MySQLStorage.target_of(settings))
+    store = PriceFingerprintStore(path)
+    if args.command == 'stats':
+        print(f"{path}: {len(store)} 条指纹")
+        store.close()
+        return
+
+    conn = pymysql.connect(
+        host=settings.MYSQL_HOST,
+        port=settings.MYSQL_PORT,
+        user=settings.MYSQL_USER,
+        password=settings.MYSQL_PASSWORD,
+        db=settings.MYSQL_DB,
+        charset=settings.MYSQL_CHARSET,
+        cursorclass=pymysql.cursors.SSCursor,
+    )
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(REBUILD_SQL)
+            count = store.rebuild(cursor)
+    finally:
+        conn.close()
+        store.close()
+    print(f"已从 recycle_recycleproduct 重建 {count} 条指纹: {path}")
+
+
+if __name__ == '__main__':
+    main()
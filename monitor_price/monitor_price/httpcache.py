@@ -0,0 +1,61 @@
+# 压缩的HTTP缓存存储
+#
+# 供 Scrapy 的 HttpCacheMiddleware 使用（HTTPCACHE_STORAGE），每个响应以 zlib 压缩后存入一个 DBM 文件，
+# 列表接口的JSON响应压缩后约为原来的 1/5~1/10。用于录制一次爬取的响应，之后离线重复回放：
+#     HTTPCACHE_ENABLED=1 scrapy crawl suning_all          # 第一次：请求线上（或模拟服务器）并录制
+#     HTTPCACHE_ENABLED=1 scrapy crawl suning_all          # 之后：全部从缓存读取，不访问网络
+
+import logging
+import os
+import pickle
+import time
+import zlib
+from importlib import import_module
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+logger = logging.getLogger(__name__)
+
+
+class CompressedDbmCacheStorage:
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.dbmodule = import_module(settings.get('HTTPCACHE_DBM_MODULE', 'dbm'))
+        self.level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', 6)
+        self.db = None
+
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, f'{spider.name}.zdb')
+        self.db = self.dbmodule.open(path, 'c')
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        logger.debug(f'使用压缩HTTP缓存: {path}')
+
+    def close_spider(self, spider):
+        self.db.close()
+
+    def retrieve_response(self, spider, request):
+        key = self._fingerprinter.fingerprint(request).hex()
+        if key not in self.db:
+            return None
+        data = pickle.loads(zlib.decompress(self.db[key]))
+        if 0 < self.expiration_secs < time.time() - data['time']:
+            return None
+        request.meta['cache_timestamp'] = data['time']
+        headers = Headers(data['headers'])
+        respcls = responsetypes.from_args(headers=headers, url=data['url'], body=data['body'])
+        return respcls(url=data['url'], headers=headers, status=data['status'], body=data['body'])
+
+    def store_response(self, spider, request, response):
+        key = self._fingerprinter.fingerprint(request).hex()
+        data = {
+            'time': time.time(),
+            'status': response.status,
+            'url': response.url,
+            'headers': dict(response.headers),
+            'body': response.body,
+        }
+        self.db[key] = zlib.compress(pickle.dumps(data, protocol=4), self.level)
@@ -0,0 +1,129 @@
+# 数据管道耗时统计
+#
+# 按阶段记录延迟直方图（对数分桶）和各类结果计数，
+# 关闭爬虫时写入 Scrapy 统计信息并生成 JSON 运行报告。
+
+import bisect
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+
+# 分桶上界（秒）：1微秒到约100秒，相邻桶相差25%
+_BUCKET_BOUNDS = []
+_bound = 1e-6
+while _bound < 100:
+    _BUCKET_BOUNDS.append(_bound)
+    _bound *= 1.25
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图，百分位取所在桶的上界（误差不超过25%）"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.buckets[bisect.bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        """合并另一个直方图（用于汇总多次运行）"""
+        for index, bucket in enumerate(other.buckets):
+            self.buckets[index] += bucket
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """返回第p百分位（0-100）的延迟（秒）"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(self.count * p / 100.0)))
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                if index < len(_BUCKET_BOUNDS):
+                    return min(_BUCKET_BOUNDS[index], self.max)
+                return self.max
+        return self.max
+
+    def summary(self):
+        """汇总（毫秒）"""
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p90_ms': round(self.percentile(90) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'total_s': round(self.total, 3),
+        }
+
+
+class PipelineMetrics:
+    """
+    数据管道各阶段的耗时和结果计数
+    阶段：clean（清洗）、validate（校验）、pool_wait（等待连接池）、
+          sql（执行SQL）、item（从进入管道到写入完成）
+    结果：inserted、updated、touched、skipped、duplicate、invalid、failed
+    """
+
+    STAGES = ('clean', 'validate', 'pool_wait', 'sql', 'item')
+    OUTCOMES = ('inserted', 'updated', 'touched', 'skipped', 'duplicate', 'invalid', 'failed')
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.stages = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.outcomes = Counter()
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+
+    def observe(self, stage, seconds):
+        self.stages[stage].record(seconds)
+
+    def count(self, outcome, n=1):
+        self.outcomes[outcome] += n
+        if self.stats is not None:
+            self.stats.inc_value(f'pipeline/items/{outcome}', n)
+
+    def report(self, **extra):
+        elapsed = time.perf_counter() - self._started
+        written = sum(self.outcomes[name] for name in ('inserted', 'updated', 'touched'))
+        report = {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'elapsed_s': round(elapsed, 3),
+            'items_per_sec': round(written / elapsed, 2) if elapsed else 0.0,
+            'outcomes': {name: self.outcomes[name] for name in self.OUTCOMES},
+            'stages': {stage: histogram.summary() for stage, histogram in self.stages.items()},
+        }
+        report.update(extra)
+        return report
+
+    def publish(self):
+        """将各阶段汇总写入Scrapy统计信息"""
+        if self.stats is None:
+            return
+        for stage, histogram in self.stages.items():
+            for key, value in histogram.summary().items():
+                self.stats.set_value(f'pipeline/stage/{stage}/{key}', value)
+
+    def write_report(self, directory, spider_name, **extra):
+        """写入JSON运行报告，返回文件路径"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory,
+            f"pipeline_{spider_name}_{self.started_at.strftime('%Y%m%d_%H%M%S')}.json"
+        )
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(spider=spider_name, **extra), f, ensure_ascii=False, indent=2)
+        return path
@@ -20,9 +20,9 @@ class MonitorPriceItem(scrapy.Item):
     model = scrapy.Field()             # VARCHAR(100) NOT NULL - 产品型号
     avg_price = scrapy.Field()         # DECIMAL(10,2) NOT NULL - 平均回收价格
     scrape_date = scrapy.Field()       # DATE NOT NULL - 数据爬取日期
-    price_history = scrapy.Field()     # JSON DEFAULT NULL - 7天价格历史
     
     # 辅助字段（用于爬虫处理，不直接存入数据库）
     crawl_time = scrapy.Field()        # 爬取时间戳（用于转换为scrape_date）
     source_platform = scrapy.Field()   # 数据来源平台
     page = scrapy.Field()              # 数据所在页码
+    page_key = scrapy.Field()          # 所属列表页的登记号（管道写入完成后据此通知爬虫）
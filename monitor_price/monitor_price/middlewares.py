@@ -3,12 +3,194 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
-from selenium import webdriver
 import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
 from scrapy.http import HtmlResponse
-from itemadapter import ItemAdapter
+from twisted.internet import defer
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+
+class BrowserPool:
+    """
+    可复用的无头浏览器池
+    最多同时存在 size 个浏览器，用完归还后给下一个请求使用；
+    每个浏览器渲染 max_pages 个页面（或出错）后关闭，需要时再新建，避免内存持续增长
+    浏览器的创建、使用和关闭都在 threadpool 中执行，不阻塞reactor
+    """
+
+    def __init__(self, factory, size, max_pages, threadpool, stats=None):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.threadpool = threadpool
+        self.stats = stats
+        self.idle = []      # 空闲的 [browser, 已渲染页数]
+        self.waiters = []   # 等待浏览器的Deferred
+        self.created = 0
+        self.closed = False
+
+    def acquire(self):
+        """返回Deferred，结果为 [browser, 已渲染页数]"""
+        from twisted.internet import reactor
+
+        if self.idle:
+            return defer.succeed(self.idle.pop())
+        if self.created < self.size:
+            self.created += 1
+            d = deferToThreadPool(reactor, self.threadpool, self.factory)
+            d.addCallbacks(self._created, self._create_failed)
+            return d
+        waiter = defer.Deferred()
+        self.waiters.append(waiter)
+        return waiter
+
+    def _created(self, browser):
+        if self.stats is not None:
+            self.stats.inc_value('selenium/browsers_started')
+        return [browser, 0]
+
+    def _create_failed(self, failure):
+        self.created -= 1
+        return failure
+
+    def release(self, entry, broken=False):
+        """归还浏览器；达到 max_pages 或出错的浏览器关闭后不再使用"""
+        entry[1] += 1
+        if self.closed or broken or entry[1] >= self.max_pages:
+            self.created -= 1
+            self._quit(entry[0])
+            if self.stats is not None:
+                self.stats.inc_value('selenium/browsers_recycled')
+            if self.waiters and not self.closed:
+                self.acquire().chainDeferred(self.waiters.pop(0))
+            return
+        if self.waiters:
+            self.waiters.pop(0).callback(entry)
+        else:
+            self.idle.append(entry)
+
+    def _quit(self, browser):
+        from twisted.internet import reactor
+
+        return deferToThreadPool(reactor, self.threadpool, browser.quit).addErrback(lambda _: None)
+
+    def close(self):
+        """关闭所有空闲的浏览器（使用中的在归还时关闭）"""
+        self.closed = True
+        for waiter in self.waiters:
+            waiter.cancel()
+        self.waiters = []
+        closing = [self._quit(browser) for browser, _ in self.idle]
+        self.created -= len(self.idle)
+        self.idle = []
+        return defer.DeferredList(closing)
+
+
+class SeleniumRenderMiddleware:
+    """
+    用无头浏览器渲染需要执行JS的页面（下载器中间件）
+    只处理 meta['render_js'] 为真的请求，其他请求照常由Scrapy下载；
+    SELENIUM_ENABLED 为真时才会导入 selenium 并启动浏览器，未开启时不产生任何开销
+    可选的 meta：
+        render_wait_selector: 等待出现的CSS选择器
+        render_wait: 等待的秒数（未指定选择器时固定等待，指定时为最长等待时间）
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('SELENIUM_ENABLED'):
+            raise NotConfigured
+        try:
+            from selenium import webdriver
+        except ImportError:
+            raise NotConfigured('SELENIUM_ENABLED 已开启，但未安装 selenium（pip install selenium）')
+
+        self.webdriver = webdriver
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.browser = settings.get('SELENIUM_BROWSER', 'chrome')
+        self.page_load_timeout = settings.getint('SELENIUM_PAGE_LOAD_TIMEOUT', 30)
+        self.default_wait = settings.getfloat('SELENIUM_RENDER_WAIT', 2)
+        self.browser_arguments = settings.getlist('SELENIUM_BROWSER_ARGUMENTS')
+
+        size = settings.getint('SELENIUM_POOL_SIZE', 2)
+        self.threadpool = ThreadPool(minthreads=0, maxthreads=size, name='selenium')
+        self.pool = BrowserPool(
+            self.create_browser, size, settings.getint('SELENIUM_MAX_PAGES_PER_BROWSER', 50), self.threadpool, self.stats
+        )
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.threadpool.start()
+
+    def spider_closed(self, spider):
+        d = self.pool.close()
+        d.addBoth(lambda _: self.threadpool.stop())
+        return d
+
+    def create_browser(self):
+        """新建无头浏览器（在线程池中执行）"""
+        if self.browser == 'firefox':
+            options = self.webdriver.FirefoxOptions()
+            options.add_argument('-headless')
+            for argument in self.browser_arguments:
+                options.add_argument(argument)
+            driver = self.webdriver.Firefox(options=options)
+        else:
+            options = self.webdriver.ChromeOptions()
+            for argument in ['--headless=new', '--disable-gpu', '--no-sandbox', *self.browser_arguments]:
+                options.add_argument(argument)
+            driver = self.webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(self.page_load_timeout)
+        return driver
+
+    def process_request(self, request, spider=None):
+        if not request.meta.get('render_js'):
+            return None
+        return self.pool.acquire().addCallback(self._render_with, request)
+
+    def _render_with(self, entry, request):
+        from twisted.internet import reactor
+
+        started = time.time()
+        d = deferToThreadPool(reactor, self.threadpool, self.render, entry[0], request)
+
+        def rendered(result):
+            self.pool.release(entry)
+            url, body = result
+            self.stats.inc_value('selenium/rendered')
+            request.meta['render_time'] = time.time() - started
+            return HtmlResponse(url=url, body=body, encoding='utf-8', request=request)
 
+        def failed(failure):
+            self.pool.release(entry, broken=True)
+            self.stats.inc_value('selenium/render_failed')
+            return failure
 
+        return d.addCallbacks(rendered, failed)
 
+    def render(self, driver, request):
+        """打开页面并等待渲染完成（在线程池中执行），返回 (url, html)"""
+        driver.get(request.url)
+        wait = request.meta.get('render_wait', self.default_wait)
+        selector = request.meta.get('render_wait_selector')
+        if selector:
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support import expected_conditions
+            from selenium.webdriver.support.ui import WebDriverWait
 
+            WebDriverWait(driver, wait).until(
+                expected_conditions.presence_of_element_located((By.CSS_SELECTOR, selector))
+            )
+        elif wait:
+            time.sleep(wait)
+        return driver.current_url, driver.page_source
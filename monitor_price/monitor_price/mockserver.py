@@ -0,0 +1,302 @@
+# 本地模拟的苏宁回收列表接口，用于无网络环境下的端到端爬取基准
+#
+# 提供与线上相同的 /{path}/{page}/{brand_code}.htm 接口（path 见 categories.py），
+# 商品默认取自 test.json 中录制的数据，不足的品牌合成商品补齐；可以配置延迟、负载相关的延迟和各种错误的比例。
+#
+# 启动模拟服务器，再让爬虫请求它：
+#     python -m monitor_price.mockserver serve --port 8800 --latency-ms 150 --error-rate 0.02
+#     SUNING_BASE_URL=http://127.0.0.1:8800 scrapy crawl suning_all
+#
+# 一次完成的端到端基准（服务器和爬虫在同一进程，数据写入临时SQLite库）：
+#     python -m monitor_price.mockserver bench --pages 10 --latency-ms 100 --rate-limit-rate 0.05
+
+import json
+import os
+import random
+import time
+import zlib
+from collections import Counter, defaultdict
+
+from monitor_price.categories import SUNING_CATEGORIES
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test.json')
+
+CAPTCHA_PAGE = '<html><head><title>验证</title></head><body>访问过于频繁，请完成验证</body></html>'.encode('utf-8')
+
+
+def build_catalog(records, pages=None, page_size=20, default_pages=3):
+    """
+    按 (path, brand_code) 组织商品列表
+    参数：
+        records: replay.load_records() 返回的录制商品
+        pages: 每个品牌的页数，为None时录制的品牌按实际数量分页，其他品牌 default_pages 页
+    返回：
+        {(path, brand_code): [listItem字典, ...]}
+    """
+    brand_codes = {}
+    for config in SUNING_CATEGORIES.values():
+        for brand_code, brand_name in config['brands'].items():
+            brand_codes[(config['category'], brand_name)] = (config['path'], brand_code)
+
+    catalog = defaultdict(list)
+    for code, name, category, brand, model, price in records:
+        key = brand_codes.get((category, brand))
+        if key is not None:
+            catalog[key].append(_list_item(code, name, price))
+
+    for config in SUNING_CATEGORIES.values():
+        for brand_code, brand_name in config['brands'].items():
+            key = (config['path'], brand_code)
+            items = catalog[key]
+            wanted = (pages or (0 if items else default_pages)) * page_size
+            serial = 0
+            while len(items) < wanted:
+                serial += 1
+                code = f'M{zlib.crc32(brand_code.encode()) % 10 ** 6:06d}{serial:09d}'
+                items.append(_list_item(code, f'{brand_name} {config["category"]} 模拟型号{serial}', 100 + serial * 7))
+            if pages:
+                del items[wanted:]
+    return dict(catalog)
+
+
+def _list_item(code, name, price):
+    return {
+        'itemCode': code,
+        'itemName': name,
+        'averagePrice': str(price),
+        'itemImg': f'//image.suning.cn/uimg/hx/item/{code}_1_200x200.jpg',
+        'itemUrl': f'//hx.suning.com/item/{code}.htm',
+        'tags': [],
+    }
+
+
+class MockSuningResource:
+    """twisted.web 资源（在 make_site 中包装），按配置返回列表页、错误或验证页面"""
+
+    def __init__(self, catalog, page_size=20, latency_ms=0, jitter_ms=0, load_latency_ms=0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=2, garbage_rate=0.0, seed=None):
+        self.catalog = catalog
+        self.page_size = page_size
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.load_latency = load_latency_ms / 1000
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.garbage_rate = garbage_rate
+        self.random = random.Random(seed)
+
+        self.inflight = 0
+        self.max_inflight = 0
+        self.requests = 0
+        self.statuses = Counter()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'max_inflight': self.max_inflight,
+            'statuses': dict(self.statuses),
+        }
+
+    def delay(self):
+        """本次响应的延迟：基础延迟 + 抖动 + 每个并发中的请求增加的延迟（模拟服务端负载升高）"""
+        return self.latency + self.random.uniform(0, self.jitter) + self.load_latency * (self.inflight - 1)
+
+    def respond(self, path):
+        """
+        生成响应
+        返回：
+            (status, headers, body)
+        """
+        if path == '/__stats':
+            return 200, {'Content-Type': 'application/json'}, json.dumps(self.stats()).encode('utf-8')
+
+        parts = path.strip('/').split('/')
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].endswith('.htm'):
+            return 404, {}, b'not found'
+        items = self.catalog.get((parts[0], parts[2][:-len('.htm')]))
+        if items is None:
+            return 404, {}, b'not found'
+
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 429, {'Retry-After': str(self.retry_after)}, b''
+        roll -= self.rate_limit_rate
+        if roll < self.error_rate:
+            return 503, {}, b''
+        roll -= self.error_rate
+        if roll < self.garbage_rate:
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, CAPTCHA_PAGE
+
+        page = int(parts[1])
+        total_pages = max(1, -(-len(items) // self.page_size))
+        start = (page - 1) * self.page_size
+        body = {
+            'totalPage': total_pages,
+            'currentPage': page,
+            'listItem': items[start:start + self.page_size],
+        }
+        return 200, {'Content-Type': 'application/json;charset=UTF-8'}, json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+
+def make_site(resource):
+    """包装成 twisted.web.server.Site，延迟用 deferLater 实现，不阻塞reactor"""
+    from twisted.internet import reactor, task
+    from twisted.python.failure import Failure
+    from twisted.web import server
+    from twisted.web.resource import Resource
+
+    class _Handler(Resource):
+        isLeaf = True
+
+        def render_GET(self, request):
+            resource.requests += 1
+            resource.inflight += 1
+            resource.max_inflight = max(resource.max_inflight, resource.inflight)
+            path = request.path.decode('utf-8')
+
+            def finish():
+                status, headers, body = resource.respond(path)
+                resource.statuses[status] += 1
+                request.setResponseCode(status)
+                for name, value in headers.items():
+                    request.setHeader(name, value)
+                request.write(body)
+                request.finish()
+
+            def done(result):
+                resource.inflight -= 1
+                if isinstance(result, Failure):  # 客户端提前断开
+                    delayed.cancel()
+
+            delayed = task.deferLater(reactor, max(resource.delay(), 0), finish)
+            delayed.addErrback(lambda _: None)
+            request.notifyFinish().addBoth(done)
+            return server.NOT_DONE_YET
+
+    return server.Site(_Handler())
+
+
+def _add_server_arguments(parser):
+    parser.add_argument('--input', default=DEFAULT_INPUT, help='录制数据文件（JSON数组或JSONL），用于生成商品列表')
+    parser.add_argument('--pages', type=int, default=None, help='每个品牌的页数（默认录制的品牌按实际数量，其余3页）')
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=50, help='每个响应的基础延迟')
+    parser.add_argument('--jitter-ms', type=float, default=50, help='随机增加的延迟上限')
+    parser.add_argument('--load-latency-ms', type=float, default=0, help='每个并发中的请求使延迟增加的毫秒数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回503的比例')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429（带Retry-After）的比例')
+    parser.add_argument('--retry-after', type=int, default=2, help='429响应的Retry-After秒数')
+    parser.add_argument('--garbage-rate', type=float, default=0.0, help='返回验证页面（无法解析的JSON）的比例')
+    parser.add_argument('--seed', type=int, default=None, help='随机数种子（固定后错误出现的位置可复现）')
+
+
+def _make_resource(args):
+    from monitor_price.replay import load_records
+
+    catalog = build_catalog(load_records(args.input), pages=args.pages, page_size=args.page_size)
+    return MockSuningResource(
+        catalog, page_size=args.page_size, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        load_latency_ms=args.load_latency_ms, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, garbage_rate=args.garbage_rate, seed=args.seed,
+    )
+
+
+def serve(args):
+    from twisted.internet import reactor
+
+    resource = _make_resource(args)
+    reactor.listenTCP(args.port, make_site(resource), interface=args.host)
+    pages = sum(-(-len(items) // args.page_size) for items in resource.catalog.values())
+    print(f'模拟服务器: http://{args.host}:{args.port}（{len(resource.catalog)} 个品牌，{pages} 个列表页），统计: /__stats')
+    reactor.run()
+
+
+def bench(args):
+    import tempfile
+
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    from scrapy.utils.reactor import install_reactor
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='monitor_price_bench_')
+    settings = get_project_settings()
+    settings.setdict({
+        'STORAGE_BACKEND': 'sqlite',
+        'STORAGE_SQLITE_PATH': os.path.join(workdir, 'bench.sqlite3'),
+        'FINGERPRINT_STORE_PATH': '',
+        'DEADLETTER_PATH': os.path.join(workdir, 'deadletter.jsonl'),
+        'PIPELINE_REPORT_DIR': workdir,
+        'INCREMENTAL_STORE_PATH': os.path.join(workdir, 'page_fingerprints.sqlite3'),
+        'HTTPCACHE_DIR': os.path.join(workdir, 'httpcache'),
+        'DOWNLOAD_DELAY': args.download_delay,
+        'AIMD_START_DELAY': args.download_delay,
+        'AIMD_MIN_DELAY': min(args.download_delay, settings.getfloat('AIMD_MIN_DELAY')),
+        'LOG_LEVEL': args.log_level,
+    }, priority='cmdline')
+    for pair in args.set:
+        name, _, value = pair.partition('=')
+        settings.set(name, value, priority='cmdline')
+
+    # 先安装配置的reactor（asyncio），模拟服务器和爬虫共用同一个reactor
+    if settings.get('TWISTED_REACTOR'):
+        install_reactor(settings.get('TWISTED_REACTOR'))
+    from twisted.internet import reactor
+
+    process = CrawlerProcess(settings)
+
+    resource = _make_resource(args)
+    port = reactor.listenTCP(args.port, make_site(resource), interface='127.0.0.1')
+    base_url = f'http://127.0.0.1:{port.getHost().port}'
+    settings.set('SUNING_BASE_URL', base_url, priority='cmdline')
+    settings.set('AIMD_DOMAINS', ['127.0.0.1'], priority='cmdline')
+
+    crawler = process.create_crawler('suning_all')
+    process.crawl(crawler, categories=args.categories)
+    started = time.perf_counter()
+    process.start()
+    elapsed = time.perf_counter() - started
+
+    stats = crawler.stats.get_stats()
+    requests = stats.get('downloader/request_count', 0)
+    items = stats.get('item_scraped_count', 0)
+    print(f'耗时 {elapsed:.1f}s，请求 {requests}（{requests / elapsed:.1f}/s），item {items}（{items / elapsed:.1f}/s），'
+          f'结束原因 {stats.get("finish_reason")}')
+    print(f'服务端: {resource.stats()}')
+    for prefix in ('retry/', 'aimd/', 'pipeline/items/', 'httpcache/', 'incremental/'):
+        values = {key: value for key, value in sorted(stats.items()) if key.startswith(prefix)}
+        if values:
+            print(f'{prefix:<16}{values}')
+    print(f'数据目录: {workdir}')
+    return 0 if stats.get('finish_reason') == 'finished' else 1
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本地模拟的苏宁回收列表接口')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='启动模拟服务器')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8800)
+    _add_server_arguments(serve_parser)
+
+    bench_parser = commands.add_parser('bench', help='启动模拟服务器并完成一次爬取，输出吞吐和重试统计')
+    _add_server_arguments(bench_parser)
+    bench_parser.add_argument('--port', type=int, default=0, help='模拟服务器端口（默认随机；用HTTP缓存回放时需固定）')
+    bench_parser.add_argument('--categories', default=None, help='逗号分隔的分类键（默认全部）')
+    bench_parser.add_argument('--download-delay', type=float, default=0.0, help='覆盖 DOWNLOAD_DELAY')
+    bench_parser.add_argument('--workdir', default=None, help='数据目录（默认新建临时目录）')
+    bench_parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE', help='覆盖其他Scrapy配置')
+    bench_parser.add_argument('--log-level', default='WARNING')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        serve(args)
+        return 0
+    return bench(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+# 增量爬取：列表页指纹
+#
+# 以 (分类, 品牌, 页码) 为键，在本地 SQLite 文件中记录每一页 listItem 的摘要，跨运行保留。
+# - 内容与上次相同的页面不再输出 item（数据库中已是最新数据）
+# - 默认逐页翻页，遇到内容未变化的页面时停止请求该品牌之后的页面（INCREMENTAL_STOP_PAGINATION），
+#   之后的页面中有从未输出或到了兜底间隔的页面时继续翻页
+# - 摘要在该页的 item 全部由管道确认写入后才保存（见 spiders/base.py 的 track_page）；
+#   写入失败、进入死信文件或进程中断时不保存，下次运行照常输出该页
+# - 某页距上次输出超过 full_sweep_days 天时，即使内容相同也照常输出（兜底）
+
+import hashlib
+import os
+import sqlite3
+import time
+
+
+def page_digest(list_items):
+    """listItem 的摘要（decoding.ListItem 列表）：只含写入数据库的字段，与商品顺序无关"""
+    rows = sorted('\x1f'.join(item) for item in list_items)
+    return hashlib.blake2b('\x1e'.join(rows).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class PageFingerprintStore:
+    """基于SQLite的列表页指纹存储"""
+
+    def __init__(self, path, full_sweep_days=7):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.full_sweep_seconds = full_sweep_days * 86400
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS listing_page (
+                category_key TEXT NOT NULL,
+                brand_code TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                PRIMARY KEY (category_key, brand_code, page)
+            ) WITHOUT ROWID;
+            -- 旧版本按品牌跳过翻页时使用的表（摘要在写入前保存，不可信），不再使用
+            DROP TABLE IF EXISTS page_fingerprint;
+            DROP TABLE IF EXISTS brand_sweep;
+        """)
+        self.conn.commit()
+
+    def unchanged(self, category_key, brand_code, page, digest):
+        """与上次输出时内容相同，且距上次输出未超过 full_sweep_days 天"""
+        row = self.conn.execute(
+            'SELECT digest, stored_at FROM listing_page WHERE category_key = ? AND brand_code = ? AND page = ?',
+            (category_key, brand_code, page)
+        ).fetchone()
+        return row is not None and row[0] == digest and time.time() - row[1] < self.full_sweep_seconds
+
+    def sweep_due(self, category_key, brand_code, first_page, last_page):
+        """first_page ~ last_page 中有从未输出、或距上次输出已超过 full_sweep_days 天的页面"""
+        fresh = self.conn.execute(
+            'SELECT COUNT(*) FROM listing_page '
+            'WHERE category_key = ? AND brand_code = ? AND page BETWEEN ? AND ? AND stored_at > ?',
+            (category_key, brand_code, first_page, last_page, time.time() - self.full_sweep_seconds)
+        ).fetchone()[0]
+        return fresh < last_page - first_page + 1
+
+    def save(self, category_key, brand_code, page, digest):
+        """该页的 item 全部写入后记录摘要"""
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO listing_page VALUES (?, ?, ?, ?, ?)',
+                (category_key, brand_code, page, digest, time.time())
+            )
+
+    def prune(self, category_key, brand_code, total_pages):
+        """删除超出当前总页数的页面指纹（列表变短后残留的旧页）"""
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM listing_page WHERE category_key = ? AND brand_code = ? AND page > ?',
+                (category_key, brand_code, total_pages)
+            )
+
+    def close(self):
+        self.conn.close()
@@ -3,71 +3,297 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
-import json
-import pymysql
+import time
+from collections import deque
 from datetime import datetime, date
 from decimal import Decimal, InvalidOperation
 from itemadapter import ItemAdapter
-from twisted.enterprise import adbapi
-from monitor_price import settings
+from twisted.internet import defer, task
+from twisted.python.failure import Failure
+from monitor_price.codeset import CompactCodeSet
+from monitor_price.deadletter import DeadLetterFile
+from monitor_price.fingerprints import PriceFingerprintStore, fingerprint_of, store_path
+from monitor_price.instrumentation import PipelineMetrics
+from monitor_price.storage import open_storage
+
+
+# 管道处理完一个带 page_key 的item后发送（参数 item, spider, stored），爬虫据此确认一个列表页的数据已落库：
+# stored 为 True 表示已写入或无需写入（重复、指纹命中、数据无效），False 表示重试后仍写入失败（已写入死信文件）
+item_stored = object()
 
 
 class MonitorPricePipeline:
     """
     二手回收平台数据管道
-    功能：数据清洗、格式转换、去重、存储到MySQL数据库
+    功能：数据清洗、格式转换、去重、存储到MySQL数据库（或本地SQLite/JSONL文件，见 storage 包）
     数据库表：recycle_recycleproduct
     """
     
-    def __init__(self, dbpool):
-        self.dbpool = dbpool
-        self.processed_codes = set()  # 用于当前会话的内存去重
+    def __init__(self, storage, batch_size=0, batch_interval=2.0, fingerprints=None,
+                 rebuild_fingerprints=False, stats=None, max_inflight=0, report_dir=None,
+                 deadletter=None, max_retries=0, retry_delay=2.0, version_interval=0, signals=None):
+        self.storage = storage        # 存储后端：MySQL / SQLite / JSONL 文件
+        self.signals = signals        # 用于发送 item_stored（离线回放时为 None）
+        self.processed_codes = CompactCodeSet()  # 用于当前会话的内存去重（编号编码为整数存储）
+        self.stats = stats
+
+        # 各阶段耗时和结果计数，关闭时写入统计信息和 report_dir 下的JSON报告
+        self.metrics = PipelineMetrics(stats)
+        self.report_dir = report_dir
+
+        # 价格指纹缓存：价格和名称未变化的产品跳过写入
+        self.fingerprints = fingerprints
+        self.rebuild_fingerprints = rebuild_fingerprints
+
+        # 批量写入模式：batch_size > 1 时启用，按条数或时间间隔刷新
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._batch = []               # 待写入的 (cleaned_item, spider)
+        self._batch_codes = set()      # 缓冲区内的 product_code，用于缓冲区去重
+        self._flush_loop = None
+        self._pending_writes = set()   # 尚未完成的数据库写入 Deferred
+
+        # 在途写入窗口：缓冲区和写入中的item总数达到上限时，
+        # process_item 返回 Deferred，让 Scrapy 引擎放慢速度（0 表示不限制）
+        self.max_inflight = max_inflight
+        self._inflight = 0
+        self._waiters = deque()        # 等待写入窗口的 (Deferred, 开始等待时间)
+
+        # 写入失败的item分批退避重试（第n次重试前等待 retry_delay * 2^(n-1) 秒），
+        # 重试 max_retries 次仍失败的写入死信文件
+        self.deadletter = deadletter
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._retry = []               # 待重试的 (cleaned_item, spider, started, 已重试次数)
+        self._retry_timer = None
+
+        # 有写入后更新网站的数据版本号（网站据此重建搜索索引），
+        # 爬取过程中最多每 version_interval 秒一次（0 表示只在结束时更新）
+        self.version_interval = version_interval
+        self._version_dirty = False
+        self._version_bumped_at = time.monotonic()
 
     @classmethod
-    def from_crawler(cls, crawler):
-        """从爬虫配置创建连接池"""
-        db_params = {
-            'host': settings.MYSQL_HOST if hasattr(settings, 'MYSQL_HOST') else 'localhost',
-            'port': settings.MYSQL_PORT if hasattr(settings, 'MYSQL_PORT') else 3306,
-            'user': settings.MYSQL_USER if hasattr(settings, 'MYSQL_USER') else 'root',
-            'password': settings.MYSQL_PASSWORD,
-            'db': settings.MYSQL_DB,
-            'charset': settings.MYSQL_CHARSET if hasattr(settings, 'MYSQL_CHARSET') else 'utf8mb4',
-            'use_unicode': True,
-            'cursorclass': pymysql.cursors.DictCursor
-        }
-
-        # 创建数据库连接池
-        dbpool = adbapi.ConnectionPool('pymysql', **db_params)
-        return cls(dbpool)
+    def from_crawler(cls, crawler, dbpool=None):
+        """按 STORAGE_BACKEND 创建存储后端（传入dbpool时直接用作MySQL连接池，供离线回放工具替换数据库）"""
+        storage = open_storage(crawler.settings, dbpool=dbpool)
+
+        # 价格指纹缓存（路径为空或后端没有主键时不启用），每个存储目标使用单独的文件
+        fingerprint_path = crawler.settings.get('FINGERPRINT_STORE_PATH')
+        fingerprints = None
+        if fingerprint_path and storage.target:
+            fingerprints = PriceFingerprintStore(store_path(fingerprint_path, storage.target))
+
+        # 死信文件（路径为空时重试用完后只记录日志）
+        deadletter_path = crawler.settings.get('DEADLETTER_PATH')
+        deadletter = DeadLetterFile(deadletter_path) if deadletter_path else None
+
+        return cls(
+            storage,
+            batch_size=crawler.settings.getint('MYSQL_BATCH_SIZE', 0),
+            batch_interval=crawler.settings.getfloat('MYSQL_BATCH_INTERVAL', 2.0),
+            fingerprints=fingerprints,
+            rebuild_fingerprints=crawler.settings.getbool('FINGERPRINT_REBUILD', False),
+            stats=crawler.stats,
+            max_inflight=crawler.settings.getint('MYSQL_MAX_INFLIGHT', 0),
+            report_dir=crawler.settings.get('PIPELINE_REPORT_DIR'),
+            deadletter=deadletter,
+            max_retries=crawler.settings.getint('DEADLETTER_MAX_RETRIES', 0),
+            retry_delay=crawler.settings.getfloat('DEADLETTER_RETRY_DELAY', 2.0),
+            version_interval=crawler.settings.getfloat('DATA_VERSION_BUMP_INTERVAL', 0),
+            signals=getattr(crawler, 'signals', None),
+        )
+
+    @property
+    def batch_enabled(self):
+        return self.batch_size > 1
+
+    def open_spider(self, spider):
+        """批量模式下启动定时刷新；按需从数据库重建价格指纹"""
+        self.storage.open_spider(spider)
+
+        if self.batch_enabled and self.batch_interval > 0:
+            self._flush_loop = task.LoopingCall(self._flush_batch)
+            self._flush_loop.start(self.batch_interval, now=False)
+
+        if self.fingerprints is not None and self.rebuild_fingerprints:
+            query = self.storage.runInteraction(self.storage.fetch_fingerprint_rows)
+            query.addCallback(self.fingerprints.rebuild)
+            query.addCallback(lambda count: spider.logger.info(f"已从数据库重建 {count} 条价格指纹"))
+            return query
 
     def process_item(self, item, spider):
         """异步处理item"""
+        started = time.perf_counter()
         try:
             # 数据清洗和验证
             cleaned_item = self._clean_item(item, spider)
+            cleaned = time.perf_counter()
+            self.metrics.observe('clean', cleaned - started)
             
             # 检查必填字段
-            if not self._validate_item(cleaned_item, spider):
+            valid = self._validate_item(cleaned_item, spider)
+            self.metrics.observe('validate', time.perf_counter() - cleaned)
+            if not valid:
                 spider.logger.warning(f"数据验证失败，跳过: {item}")
+                self.metrics.count('invalid')
+                self._notify(cleaned_item, spider)
                 return item
             
             # 内存去重检查
             product_code = cleaned_item.get('product_code')
-            if product_code in self.processed_codes:
+            if product_code in self.processed_codes or product_code in self._batch_codes:
                 spider.logger.info(f"重复数据（内存去重）: {product_code}")
+                self.metrics.count('duplicate')
+                self._notify(cleaned_item, spider)
                 return item
-            
-            # 异步插入数据库
-            query = self.dbpool.runInteraction(self._do_upsert, cleaned_item)
-            query.addCallback(self._insert_success, cleaned_item, spider)
-            query.addErrback(self._handle_error, cleaned_item, spider)
+
+            # 指纹比对：当天已写入且价格、名称均未变化时跳过
+            if self._check_fingerprint(cleaned_item, spider):
+                self.metrics.count('skipped')
+                self._notify(cleaned_item, spider)
+                return item
+
+            # 在途写入已满：等待窗口空出后再写入，期间Scrapy不会继续向管道推送该item
+            if self.max_inflight and self._inflight >= self.max_inflight:
+                waiter = defer.Deferred()
+                self._waiters.append((waiter, time.monotonic()))
+                self._inc_stat('pipeline/backpressure_waits')
+                self._set_gauge('pipeline/queue_depth', len(self._waiters))
+                # 由释放名额的写入回调触发，异常不能抛给触发方
+                waiter.addCallback(lambda _: self._write_or_fail(cleaned_item, spider, started))
+                waiter.addCallback(lambda _: item)
+                return waiter
+
+            self._write_or_fail(cleaned_item, spider, started)
             
         except Exception as e:
             spider.logger.error(f"处理Item时发生异常: {e}, Item: {item}")
+            self.metrics.count('failed')
+            self._notify(item, spider, stored=False)
         
         return item
 
+    def _notify(self, item, spider, stored=True):
+        """发送 item_stored（只对爬虫登记了所属列表页的item）"""
+        if self.signals is not None and item.get('page_key') is not None:
+            self.signals.send_catch_log(item_stored, item=item, spider=spider, stored=stored)
+
+    def _write_or_fail(self, cleaned_item, spider, started):
+        """写入数据库；提交写入时出错按失败处理（释放已占用的名额，通知爬虫该item未写入）"""
+        inflight = self._inflight
+        try:
+            self._write(cleaned_item, spider, started)
+        except Exception as e:
+            if self._inflight > inflight:
+                self._release(1)
+            spider.logger.error(f"提交写入时发生异常: {e}, Item: {cleaned_item}")
+            self.metrics.count('failed')
+            self._notify(cleaned_item, spider, stored=False)
+
+    def _write(self, cleaned_item, spider, started):
+        """
+        占用一个在途写入名额并写入数据库
+        名额在item最终写入成功或写入死信文件后才释放（重试等待期间仍占用），见 _insert_success / _handle_error
+        """
+        self._inflight += 1
+        self._set_gauge('pipeline/inflight', self._inflight)
+
+        if self.batch_enabled:
+            # 批量模式：放入缓冲区，达到批量大小或在途名额已满时刷新
+            # （名额已满时不会再有新的item进入缓冲区，等定时刷新会拖慢整个窗口）
+            self._batch.append((cleaned_item, spider, started))
+            self._batch_codes.add(cleaned_item['product_code'])
+            if len(self._batch) >= self.batch_size or (self.max_inflight and self._inflight >= self.max_inflight):
+                self._flush_batch()
+            return
+
+        # 异步插入数据库（指纹命中时只更新日期和当天价格）
+        operation = self.storage.touch if cleaned_item.get('date_only') else self.storage.upsert
+        query = self._run_interaction(operation, cleaned_item)
+        # 只有写入本身失败才进入重试；成功回调中的异常只记录日志，不能重写已经成功的数据
+        query.addCallbacks(
+            self._insert_success, self._handle_error,
+            callbackArgs=(cleaned_item, spider, started), errbackArgs=(cleaned_item, spider, started)
+        )
+        query.addErrback(self._callback_error, spider)
+        self._track(query)
+
+    def _run_interaction(self, operation, *args):
+        """
+        在连接池中执行数据库操作，并记录等待连接池和执行SQL的耗时
+        （计时在线程池中完成，统计在Deferred回调中记录，避免跨线程修改直方图）
+        """
+        timing = {'submitted': time.perf_counter()}
+
+        def _timed(tx, *args):
+            timing['started'] = time.perf_counter()
+            try:
+                return operation(tx, *args)
+            finally:
+                timing['finished'] = time.perf_counter()
+
+        def _record(result):
+            if 'started' in timing:
+                self.metrics.observe('pool_wait', timing['started'] - timing['submitted'])
+                self.metrics.observe('sql', timing['finished'] - timing['started'])
+            return result
+
+        # 后端同步抛出的异常同样转为失败的Deferred，进入重试/死信流程
+        return defer.maybeDeferred(self.storage.runInteraction, _timed, *args).addBoth(_record)
+
+    def _release(self, count):
+        """item最终写入成功或写入死信文件后释放名额，并唤醒等待中的item"""
+        self._inflight -= count
+        while self._waiters and (not self.max_inflight or self._inflight < self.max_inflight):
+            waiter, started = self._waiters.popleft()
+            self._inc_stat('pipeline/backpressure_wait_seconds', time.monotonic() - started)
+            waiter.callback(None)
+        self._set_gauge('pipeline/inflight', self._inflight)
+        self._set_gauge('pipeline/queue_depth', len(self._waiters))
+
+    def _set_gauge(self, key, value):
+        """记录当前值及峰值"""
+        if self.stats is not None:
+            self.stats.set_value(key, value)
+            self.stats.max_value(f'{key}_max', value)
+
+    def _check_fingerprint(self, item, spider):
+        """
+        与上次写入的指纹比对
+        返回True表示无需写入；否则在item中记录指纹中的主键 product_id（批量写入时不再查询是否存在），
+        价格和名称未变化、只有日期不同时再标记 date_only，后续只更新日期并写入当天价格
+        """
+        if self.fingerprints is None:
+            return False
+
+        product_code = item['product_code']
+        fingerprint = self.fingerprints.get(product_code)
+        # 写入成功后直接保存本次的指纹（见 _insert_success），不再重新计算
+        current = item['fingerprint'] = fingerprint_of(item)
+        if fingerprint is None or not fingerprint.product_id:
+            self._inc_stat('fingerprint/miss')
+            return False
+
+        item['product_id'] = fingerprint.product_id
+        if fingerprint.price != current.price or fingerprint.name_hash != current.name_hash:
+            self._inc_stat('fingerprint/miss')
+            return False
+
+        self._inc_stat('fingerprint/hit')
+        if fingerprint.scrape_date == current.scrape_date:
+            self._inc_stat('fingerprint/skip')
+            self.processed_codes.add(product_code)
+            spider.logger.debug(f"价格未变化（指纹命中），跳过: {product_code}")
+            return True
+
+        item['date_only'] = True
+        return False
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
     def _clean_item(self, item, spider):
         """数据清洗和格式转换"""
         adapter = ItemAdapter(item)
@@ -121,9 +347,8 @@ class MonitorPricePipeline:
             scrape_date = self._convert_to_date(adapter.get('crawl_time'))
         cleaned['scrape_date'] = scrape_date
         
-        # 8. price_history - 价格历史（JSON格式）
-        price_history = adapter.get('price_history')
-        cleaned['price_history'] = self._format_price_history(price_history, avg_price, scrape_date)
+        # 8. page_key - 所属列表页（辅助字段，不写入数据库），写入完成后随 item_stored 发回爬虫
+        cleaned['page_key'] = adapter.get('page_key')
         
         return cleaned
 
@@ -205,187 +430,220 @@ class MonitorPricePipeline:
         # 默认返回今天
         return date.today()
 
-    def _format_price_history(self, price_history, current_price, current_date):
-        """格式化价格历史为JSON"""
-        if price_history is None:
-            # 如果没有历史数据，创建当天的记录
-            if current_price and current_date:
-                return json.dumps([{
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'price': float(current_price)
-                }], ensure_ascii=False)
-            return json.dumps([])
-        
-        # 如果已经是字符串（JSON）
-        if isinstance(price_history, str):
-            try:
-                # 验证是否为有效JSON
-                parsed = json.loads(price_history)
-                if isinstance(parsed, list):
-                    return price_history
-            except:
-                pass
-        
-        # 如果是列表或字典
-        if isinstance(price_history, (list, dict)):
-            try:
-                return json.dumps(price_history, ensure_ascii=False)
-            except:
-                pass
-        
-        # 默认返回空列表
-        return json.dumps([])
+    def _flush_batch(self):
+        """将缓冲区中的数据作为一个批次写入数据库"""
+        if not self._batch:
+            return None
 
-    def _do_upsert(self, tx, item):
-        """
-        执行数据库插入或更新操作
-        逻辑：
-        1. 先查询product_code是否存在
-        2. 如果存在：获取历史price_history，追加新价格（保留最近7天）
-        3. 如果不存在：插入新记录
-        """
-        product_code = item['product_code']
-        current_price = float(item['avg_price'])
-        current_date = item['scrape_date'].strftime('%Y-%m-%d')
-        
-        # 1. 查询是否存在该product_code
-        select_sql = """
-            SELECT price_history, avg_price, scrape_date
-            FROM `recycle_recycleproduct`
-            WHERE product_code = %s
-        """
-        tx.execute(select_sql, (product_code,))
-        existing_record = tx.fetchone()
-        
-        if existing_record:
-            # 2. 记录已存在，更新price_history
-            new_price_history = self._update_price_history(
-                existing_record['price_history'],
-                current_price,
-                current_date
-            )
-            
-            # 更新现有记录
-            update_sql = """
-                UPDATE `recycle_recycleproduct`
-                SET name = %s,
-                    category = %s,
-                    brand = %s,
-                    model = %s,
-                    avg_price = %s,
-                    scrape_date = %s,
-                    price_history = %s
-                WHERE product_code = %s
-            """
-            
-            tx.execute(update_sql, (
-                item['name'],
-                item['category'],
-                item['brand'],
-                item['model'],
-                item['avg_price'],
-                item['scrape_date'],
-                new_price_history,
-                product_code
-            ))
-            
-            return ('updated', product_code)
-        else:
-            # 3. 记录不存在，插入新记录
-            # 创建初始price_history（只包含当前价格）
-            initial_price_history = json.dumps([{
-                'date': current_date,
-                'price': current_price
-            }], ensure_ascii=False)
-            
-            insert_sql = """
-                INSERT INTO `recycle_recycleproduct`
-                (product_code, name, category, brand, model, avg_price, scrape_date, price_history, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
-            """
-            
-            tx.execute(insert_sql, (
-                product_code,
-                item['name'],
-                item['category'],
-                item['brand'],
-                item['model'],
-                item['avg_price'],
-                item['scrape_date'],
-                initial_price_history
-            ))
-            
-            return ('inserted', product_code)
+        batch, self._batch = self._batch, []
+        self._batch_codes = set()
 
-    def _update_price_history(self, old_history_json, new_price, new_date):
-        """
-        更新价格历史，保留最近7天的数据
-        参数：
-            old_history_json: 旧的price_history JSON字符串
-            new_price: 新价格（float）
-            new_date: 新日期（YYYY-MM-DD字符串）
-        返回：
-            更新后的JSON字符串
-        """
-        # 解析现有历史数据
-        try:
-            if old_history_json:
-                price_history = json.loads(old_history_json)
-                if not isinstance(price_history, list):
-                    price_history = []
-            else:
-                price_history = []
-        except (json.JSONDecodeError, TypeError):
-            price_history = []
-        
-        # 检查是否已经有今天的记录
-        existing_dates = [entry.get('date') for entry in price_history]
-        
-        if new_date in existing_dates:
-            # 如果今天已有记录，更新价格
-            for entry in price_history:
-                if entry.get('date') == new_date:
-                    entry['price'] = new_price
-                    break
-        else:
-            # 添加新记录
-            price_history.append({
-                'date': new_date,
-                'price': new_price
-            })
-        
-        # 按日期排序（最新的在后面）
-        price_history.sort(key=lambda x: x.get('date', ''))
-        
-        # 保留最近7天的数据
-        if len(price_history) > 7:
-            price_history = price_history[-7:]  # 保留最后7条
-        
-        # 转换回JSON字符串
-        return json.dumps(price_history, ensure_ascii=False)
+        query = self._run_interaction(self.storage.batch_upsert, [item for item, _, _ in batch])
+        query.addCallbacks(self._batch_success, self._batch_error, callbackArgs=(batch,), errbackArgs=(batch,))
+        query.addErrback(self._callback_error, batch[0][1])
+        return self._track(query)
 
-    def _insert_success(self, result, item, spider):
-        """插入成功回调"""
-        operation, product_code = result
+    def _track(self, query):
+        """记录未完成的写入，close_spider时等待其结束"""
+        self._pending_writes.add(query)
+
+        def _done(result):
+            self._pending_writes.discard(query)
+            return result
+
+        return query.addBoth(_done)
+
+    def _insert_success(self, result, item, spider, started, release=True):
+        """插入成功回调（批量写入时由调用方统一释放整批的名额，避免逐条唤醒等待的item产生很小的批次）"""
+        if release:
+            self._release(1)
+        operation, product_code, product_id = result
         self.processed_codes.add(product_code)
+        self._notify(item, spider)
+        self.metrics.observe('item', time.perf_counter() - started)
+        self.metrics.count(operation)
+        if self.fingerprints is not None:
+            current = item.get('fingerprint') or fingerprint_of(item)
+            self.fingerprints.put(product_code, current._replace(product_id=product_id))
+
+        self._version_dirty = True
+        if self.version_interval and time.monotonic() - self._version_bumped_at >= self.version_interval:
+            self._bump_version(spider)
         
         if operation == 'inserted':
             spider.logger.info(f"✓ 新增产品: {product_code} - {item['name']}")
+        elif operation == 'touched':
+            spider.logger.info(f"✓ 价格未变化: {product_code} - {item['name']}")
         else:  # updated
             spider.logger.info(f"✓ 更新产品: {product_code} - {item['name']}")
 
-    def _handle_error(self, failure, item, spider):
-        """处理数据库错误"""
+    def _callback_error(self, failure, spider):
+        """写入成功后的回调（统计、指纹、日志）出错：数据已写入，只记录日志"""
+        spider.logger.error(f"写入成功后的处理出错: {failure}")
+
+    def _batch_success(self, results, batch):
+        """批量写入成功回调（一条item的回调出错不影响同批其他item通知爬虫）"""
+        try:
+            for result, (item, spider, started) in zip(results, batch):
+                try:
+                    self._insert_success(result, item, spider, started, release=False)
+                except Exception:
+                    self._callback_error(Failure(), spider)
+        finally:
+            self._release(len(batch))
+
+    def _handle_error(self, failure, item, spider, started, attempts=0, release=True):
+        """
+        处理数据库错误：还有重试次数时放入重试队列（继续占用名额），否则写入死信文件
+        返回该item是否已最终失败（release 为 False 时由调用方释放名额）
+        """
+        if attempts < self.max_retries:
+            spider.logger.warning(
+                f"数据库操作失败，稍后重试（第{attempts + 1}次）: {item['product_code']} - {failure.getErrorMessage()}"
+            )
+            self._retry.append((item, spider, started, attempts + 1))
+            self._schedule_retry()
+            return False
+
+        if release:
+            self._release(1)
+        self.metrics.observe('item', time.perf_counter() - started)
+        self.metrics.count('failed')
         spider.logger.error(f"数据库操作失败: {failure}")
         spider.logger.error(f"失败的Item: {item}")
+        if self.deadletter is not None:
+            self.deadletter.append(item, spider.name, failure.getErrorMessage(), attempts)
+            self._inc_stat('pipeline/deadletter/written')
+        self._notify(item, spider, stored=False)
+        return True
+
+    def _batch_error(self, failure, batch):
+        """批量写入失败回调（整个批次回滚）"""
+        finished = 0
+        try:
+            for item, spider, started in batch:
+                finished += self._handle_error(failure, item, spider, started, release=False)
+        finally:
+            self._release(finished)
+
+    def _schedule_retry(self):
+        """按队列中最少的重试次数计算退避时间，安排下一轮重试"""
+        if self._retry_timer is not None or not self._retry:
+            return
+        from twisted.internet import reactor
+
+        attempts = min(entry[3] for entry in self._retry)
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        self._retry_timer = task.deferLater(reactor, delay, self._retry_failed)
+
+    def _retry_failed(self):
+        """
+        重试一轮：批量模式下整批写入；有item处于最后一次重试时逐条写入，
+        避免一条坏数据拖累同批的其他item进入死信文件
+        """
+        self._retry_timer = None
+        entries, self._retry = self._retry, []
+        self._inc_stat('pipeline/retry/attempts', len(entries))
+
+        if self.batch_enabled and len(entries) > 1 and all(entry[3] < self.max_retries for entry in entries):
+            query = self._run_interaction(self.storage.batch_upsert, [item for item, *_ in entries])
+            query.addCallbacks(
+                self._retry_batch_success, self._retry_batch_error, callbackArgs=(entries,), errbackArgs=(entries,)
+            )
+            query.addErrback(self._callback_error, entries[0][1])
+            return self._track(query)
+
+        queries = []
+        for item, spider, started, attempts in entries:
+            operation = self.storage.touch if item.get('date_only') else self.storage.upsert
+            query = self._run_interaction(operation, item)
+            query.addCallbacks(
+                self._retry_success, self._handle_error,
+                callbackArgs=(item, spider, started), errbackArgs=(item, spider, started, attempts)
+            )
+            query.addErrback(self._callback_error, spider)
+            queries.append(self._track(query))
+        return defer.DeferredList(queries)
+
+    def _retry_success(self, result, item, spider, started, release=True):
+        self._inc_stat('pipeline/retry/recovered')
+        self._insert_success(result, item, spider, started, release)
+
+    def _retry_batch_success(self, results, entries):
+        try:
+            for result, (item, spider, started, _) in zip(results, entries):
+                try:
+                    self._retry_success(result, item, spider, started, release=False)
+                except Exception:
+                    self._callback_error(Failure(), spider)
+        finally:
+            self._release(len(entries))
+
+    def _retry_batch_error(self, failure, entries):
+        finished = 0
+        try:
+            for item, spider, started, attempts in entries:
+                finished += self._handle_error(failure, item, spider, started, attempts, release=False)
+        finally:
+            self._release(finished)
+
+    def _bump_version(self, spider):
+        """更新产品数据版本号（失败只记录日志，不影响写入）"""
+        if not self._version_dirty:
+            return None
+        self._version_dirty = False
+        self._version_bumped_at = time.monotonic()
+
+        query = self.storage.runInteraction(self.storage.bump_data_version, 'products')
+        query.addCallback(lambda bumped: bumped and self._inc_stat('pipeline/data_version_bumps'))
+        query.addErrback(lambda failure: spider.logger.warning(f"更新数据版本号失败: {failure.getErrorMessage()}"))
+        return self._track(query)
+
+    def _drain(self):
+        """等待未完成的写入和重试全部结束（重试可能产生新的写入，循环直到清空）"""
+        waiting = list(self._pending_writes)
+        if self._retry_timer is not None:
+            waiting.append(self._retry_timer)
+        if not waiting:
+            return defer.succeed(None)
+        return defer.DeferredList(waiting).addCallback(lambda _: self._drain())
 
     def close_spider(self, spider):
-        """爬虫关闭时的清理工作"""
-        if hasattr(self, 'dbpool'):
-            self.dbpool.close()
-        
-        spider.logger.info(f"数据库连接池已关闭")
-        spider.logger.info(f"本次共处理 {len(self.processed_codes)} 条唯一数据")
+        """爬虫关闭时的清理工作：写入剩余缓冲数据，等待未完成的写入和重试后关闭存储后端"""
+        if self._flush_loop is not None and self._flush_loop.running:
+            self._flush_loop.stop()
+        self._flush_batch()
+
+        def _close(_):
+            self.storage.close()
+            if self.fingerprints is not None:
+                self.fingerprints.close()
+
+            self.metrics.publish()
+            if self.report_dir:
+                path = self.metrics.write_report(
+                    self.report_dir,
+                    spider.name,
+                    storage=self.storage.name,
+                    batch_size=self.batch_size,
+                    max_inflight=self.max_inflight,
+                    processed_codes=len(self.processed_codes),
+                    processed_codes_bytes=self.processed_codes.nbytes,
+                )
+                spider.logger.info(f"管道运行报告已写入: {path}")
+
+            if self.deadletter is not None and self.deadletter.written:
+                spider.logger.warning(
+                    f"{self.deadletter.written} 条数据重试后仍写入失败，已保存到 {self.deadletter.path}，"
+                    f"可用 python -m monitor_price.deadletter replay 重新写入"
+                )
+
+            spider.logger.info(f"存储后端已关闭: {self.storage.name}")
+            spider.logger.info(f"本次共处理 {len(self.processed_codes)} 条唯一数据")
+
+        d = self._drain()
+        d.addCallback(lambda _: self._bump_version(spider))
+        return d.addCallback(_close)
 
 
 
@@ -0,0 +1,398 @@
+# 数据管道离线回放与吞吐基准
+#
+# 将录制的商品数据（默认 test.json）按需倍增为大量合成记录，
+# 送入 MonitorPricePipeline，数据库由内存模拟连接池代替，无需网络和MySQL。
+# 每种管道模式在独立子进程中运行，分别统计 items/sec、单条延迟 p50/p99 和峰值内存。
+#
+# 用法：
+#     python -m monitor_price.replay
+#     python -m monitor_price.replay --rows 1000000 --days 2 --modes batch,fingerprint
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from twisted.internet import defer, task, threads
+from twisted.python.threadpool import ThreadPool
+
+
+# 各模式对应的管道配置（{batch_size}、{max_inflight} 由命令行参数填充，{workdir} 为临时目录）
+# sqlite、jsonl 模式写入临时目录中的真实文件，不经过模拟数据库
+MODES = {
+    'per_item': {'MYSQL_BATCH_SIZE': 0, 'MYSQL_MAX_INFLIGHT': 0},
+    'batch': {'MYSQL_BATCH_SIZE': '{batch_size}', 'MYSQL_MAX_INFLIGHT': 0},
+    'bounded': {'MYSQL_BATCH_SIZE': '{batch_size}', 'MYSQL_MAX_INFLIGHT': '{max_inflight}'},
+    'fingerprint': {'MYSQL_BATCH_SIZE': '{batch_size}', 'MYSQL_MAX_INFLIGHT': '{max_inflight}',
+                    'FINGERPRINT_STORE_PATH': '{fingerprint_path}'},
+    'sqlite': {'MYSQL_BATCH_SIZE': '{batch_size}', 'MYSQL_MAX_INFLIGHT': '{max_inflight}',
+               'STORAGE_BACKEND': 'sqlite', 'STORAGE_SQLITE_PATH': '{workdir}/replay.sqlite3'},
+    'jsonl': {'MYSQL_BATCH_SIZE': '{batch_size}', 'MYSQL_MAX_INFLIGHT': '{max_inflight}',
+              'STORAGE_BACKEND': 'jsonl', 'STORAGE_JSONL_DIR': '{workdir}/dumps'},
+}
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test.json')
+
+# 每送入多少条item让出一次reactor，模拟Scrapy逐页处理
+YIELD_EVERY = 100
+
+
+def load_records(path):
+    """
+    读取录制数据，支持两种格式：
+    1. test.json 录制格式：product_name, price, item_code, brand_name, crawl_time
+    2. MonitorPriceItem 字段：product_code, name, category, brand, model, avg_price
+    文件可以是JSON数组，也可以是每行一条的JSONL
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        rows = json.loads(text)
+    except json.JSONDecodeError:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    records = []
+    for row in rows:
+        if 'item_code' in row:
+            name = row.get('product_name', '')
+            records.append((
+                row['item_code'], name, row.get('category', '手机'), row.get('brand_name', ''),
+                row.get('model') or name, Decimal(str(row.get('price', 0))),
+            ))
+        else:
+            name = row.get('name', '')
+            records.append((
+                row['product_code'], name, row.get('category', ''), row.get('brand', ''),
+                row.get('model') or name, Decimal(str(row.get('avg_price', 0))),
+            ))
+    return records
+
+
+def iter_items(records, rows, day, scrape_date, change_rate):
+    """
+    逐条生成item（不在内存中展开全部合成记录）
+    第k份副本的编号为 首字母 + k(6位) + 原序号(9位)，第0份保留原编号；
+    每条记录每天以 change_rate 的概率调价（由编号和日期确定，多次运行结果一致）
+    """
+    from monitor_price.items import MonitorPriceItem
+
+    threshold = int(change_rate * 1000)
+    crawl_time = datetime.combine(scrape_date, datetime.min.time()).isoformat()
+    for n in range(rows):
+        index = n % len(records)
+        copy = n // len(records)
+        code, name, category, brand, model, price = records[index]
+        if copy:
+            code = f"{code[:1]}{copy:06d}{index:09d}"
+
+        changes = sum(
+            1 for d in range(1, day + 1)
+            if zlib.crc32(f"{n}:{d}".encode()) % 1000 < threshold
+        )
+
+        item = MonitorPriceItem()
+        item['product_code'] = code
+        item['name'] = name
+        item['category'] = category
+        item['brand'] = brand
+        item['model'] = model
+        item['avg_price'] = str(price + changes * 10)
+        item['scrape_date'] = scrape_date
+        item['crawl_time'] = crawl_time
+        item['source_platform'] = '回放'
+        item['page'] = n // 20 + 1
+        yield item
+
+
+class _StandInCursor:
+    """模拟 pymysql DictCursor，只支持管道用到的SQL语句"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.rowcount = 0
+        self.lastrowid = 0
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        pool = self.pool
+        if pool.latency:
+            time.sleep(pool.latency)
+
+        sql = ' '.join(sql.split())
+        params = list(params or ())
+        with pool.lock:
+            pool.statements += 1
+            if sql.startswith('INSERT INTO `recycle_recycleproduct` '):
+                self._upsert_products(sql, params)
+            elif sql.startswith('INSERT INTO `recycle_recycleproductprice`'):
+                # 与MySQL的外键约束一致：产品不存在时整条语句失败
+                missing = [params[i] for i in range(0, len(params), 3) if params[i] not in pool.codes]
+                if missing:
+                    import pymysql
+                    raise pymysql.IntegrityError(1452, f'Cannot add or update a child row: product_id {missing[0]}')
+                for i in range(0, len(params), 3):
+                    pool.prices[(params[i], params[i + 1])] = params[i + 2]
+                self.rowcount = len(params) // 3
+            elif sql.startswith('UPDATE `recycle_recycleproduct` SET scrape_date = %s WHERE id = %s AND product_code = %s'):
+                scrape_date, product_id, code = params
+                row = pool.products.get(code)
+                self.rowcount = 0
+                if row and row[0] == product_id:
+                    row[6] = scrape_date
+                    self.rowcount = 1
+            elif sql.startswith('SELECT id, product_code FROM `recycle_recycleproduct` WHERE product_code IN'):
+                self._rows = [{'id': pool.products[c][0], 'product_code': c} for c in params if c in pool.products]
+            elif sql.startswith('SELECT id FROM `recycle_recycleproduct` WHERE product_code = %s'):
+                row = pool.products.get(params[0])
+                self._rows = [{'id': row[0]}] if row else []
+            elif sql.startswith('INSERT INTO `recycle_dataversion`'):
+                pool.data_versions[params[0]] = pool.data_versions.get(params[0], 0) + 1
+                self.rowcount = 1
+            elif sql.startswith('SELECT product_code, id, avg_price, scrape_date'):
+                self._rows = [
+                    {'product_code': code, 'id': row[0], 'name': row[1], 'category': row[2],
+                     'brand': row[3], 'model': row[4], 'avg_price': row[5], 'scrape_date': row[6]}
+                    for code, row in pool.products.items()
+                ]
+            else:
+                raise NotImplementedError(f"模拟数据库不支持该语句: {sql[:80]}")
+
+    def _upsert_products(self, sql, params):
+        """INSERT ... ON DUPLICATE KEY UPDATE，受影响行数和 lastrowid 与MySQL一致"""
+        pool = self.pool
+        self.rowcount = 0
+        self.lastrowid = 0
+        for i in range(0, len(params), 7):
+            code, *values = params[i:i + 7]
+            values[4] = Decimal(str(values[4]))
+            row = pool.products.get(code)
+            if row is None:
+                pool.next_id += 1
+                pool.products[code] = [pool.next_id, *values]
+                pool.codes[pool.next_id] = code
+                self.rowcount += 1
+                self.lastrowid = self.lastrowid or pool.next_id
+            elif row[1:] != values:
+                row[1:] = values
+                self.rowcount += 2
+            if row is not None and 'LAST_INSERT_ID(id)' in sql:
+                self.lastrowid = row[0]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+class StandInConnectionPool:
+    """
+    代替 adbapi.ConnectionPool 的内存数据库
+    在独立线程池中执行事务，每条语句按 latency 模拟一次网络往返；
+    close() 不清空数据，多天回放共用同一份数据
+    """
+
+    def __init__(self, latency=0.0, max_connections=5):
+        from twisted.internet import reactor
+
+        self.reactor = reactor
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.products = {}    # product_code -> [id, name, category, brand, model, avg_price, scrape_date]
+        self.codes = {}       # id -> product_code
+        self.prices = {}      # (product_id, date) -> price
+        self.data_versions = {}  # name -> version
+        self.next_id = 0
+        self.statements = 0
+        self.threadpool = ThreadPool(1, max_connections, 'replay-db')
+        self.threadpool.start()
+
+    def runInteraction(self, interaction, *args, **kw):
+        return threads.deferToThreadPool(
+            self.reactor, self.threadpool, interaction, _StandInCursor(self), *args, **kw
+        )
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        self.threadpool.stop()
+
+
+class _ReplayStats:
+    """最小的统计收集器，接口与 Scrapy StatsCollector 相同"""
+
+    def __init__(self):
+        self._stats = {}
+
+    def get_value(self, key, default=None):
+        return self._stats.get(key, default)
+
+    def set_value(self, key, value):
+        self._stats[key] = value
+
+    def inc_value(self, key, count=1, start=0):
+        self._stats[key] = self._stats.get(key, start) + count
+
+    def max_value(self, key, value):
+        self._stats[key] = max(self._stats.get(key, value), value)
+
+    def get_stats(self):
+        return self._stats
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+@defer.inlineCallbacks
+def replay(mode, args):
+    """在当前进程中回放一种模式，返回结果字典"""
+    from scrapy import Spider
+    from scrapy.settings import Settings
+    from monitor_price.instrumentation import LatencyHistogram
+    from monitor_price.pipelines import MonitorPricePipeline
+
+    records = load_records(args.input)
+    workdir = tempfile.mkdtemp(prefix='replay_')
+    values = {
+        'batch_size': args.batch_size,
+        'max_inflight': args.max_inflight,
+        'fingerprint_path': os.path.join(workdir, 'fingerprints.sqlite3'),
+        'workdir': workdir,
+    }
+    overrides = {key: value.format(**values) if isinstance(value, str) else value
+                 for key, value in MODES[mode].items()}
+    settings = Settings({
+        'MYSQL_BATCH_INTERVAL': args.batch_interval,
+        'STORAGE_BACKEND': 'mysql',
+        'FINGERPRINT_STORE_PATH': '',
+        'PIPELINE_REPORT_DIR': '',
+        **overrides,
+    })
+
+    pool = StandInConnectionPool(args.db_latency_ms / 1000.0, args.pool_size)
+    stats = _ReplayStats()
+    spider = Spider(name=f'replay_{mode}')
+    latency = LatencyHistogram()
+    outcomes = {}
+    fed = 0
+    first_day = args.start_date or date.today() - timedelta(days=args.days - 1)
+
+    started = time.perf_counter()
+    try:
+        # 每天一次完整的爬取：新的管道实例，共用模拟数据库和指纹文件
+        for day in range(args.days):
+            crawler = SimpleNamespace(settings=settings, stats=stats)
+            pipeline = MonitorPricePipeline.from_crawler(crawler, dbpool=pool)
+            yield defer.maybeDeferred(pipeline.open_spider, spider)
+
+            scrape_date = first_day + timedelta(days=day)
+            for item in iter_items(records, args.rows, day, scrape_date, args.change_rate):
+                result = pipeline.process_item(item, spider)
+                if isinstance(result, defer.Deferred):
+                    yield result
+                fed += 1
+                if fed % YIELD_EVERY == 0:
+                    yield task.deferLater(pool.reactor, 0, lambda: None)
+
+            yield defer.maybeDeferred(pipeline.close_spider, spider)
+            latency.merge(pipeline.metrics.stages['item'])
+            for outcome, count in pipeline.metrics.outcomes.items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+    finally:
+        pool.shutdown()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'mode': mode,
+        'items': fed,
+        'elapsed_s': round(elapsed, 3),
+        'items_per_sec': round(fed / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(latency.percentile(50) * 1000, 3),
+        'p99_ms': round(latency.percentile(99) * 1000, 3),
+        'peak_rss_mb': _peak_rss_mb(),
+        'statements': pool.statements,
+        'outcomes': outcomes,
+        'backpressure_waits': stats.get_value('pipeline/backpressure_waits', 0),
+    }
+
+
+def _run_single(args):
+    """子进程入口：回放一种模式并输出一行JSON"""
+    import logging
+
+    logging.basicConfig(level=logging.WARNING)
+    task.react(lambda reactor: replay(args.single, args).addCallback(
+        lambda result: print(json.dumps(result, ensure_ascii=False))
+    ))
+
+
+def _run_all(args, argv):
+    """为每种模式启动独立子进程（峰值内存互不影响），汇总输出"""
+    results = []
+    for mode in args.modes:
+        output = subprocess.run(
+            [sys.executable, '-m', 'monitor_price.replay', *argv, '--single', mode],
+            stdout=subprocess.PIPE, check=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"回放 {args.input}: 每天 {args.rows} 条 × {args.days} 天，"
+          f"模拟数据库延迟 {args.db_latency_ms}ms/语句，连接数 {args.pool_size}")
+    print(f"{'模式':<12}{'items':>10}{'items/s':>12}{'p50(ms)':>10}{'p99(ms)':>10}"
+          f"{'峰值内存(MB)':>14}{'SQL语句':>10}")
+    for r in results:
+        print(f"{r['mode']:<12}{r['items']:>10}{r['items_per_sec']:>12}{r['p50_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['peak_rss_mb']:>14}{r['statements']:>10}")
+
+
+def main(argv=None):
+    import argparse
+
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description='数据管道离线回放与吞吐基准')
+    parser.add_argument('--input', default=DEFAULT_INPUT, help='录制数据文件（JSON数组或JSONL）')
+    parser.add_argument('--rows', type=int, default=0, help='每天回放的条数，超过录制条数时合成新编号（默认等于录制条数）')
+    parser.add_argument('--days', type=int, default=2, help='连续回放的天数（第2天起可观察指纹命中）')
+    parser.add_argument('--start-date', type=date.fromisoformat, default=None, help='第一天的日期（YYYY-MM-DD）')
+    parser.add_argument('--change-rate', type=float, default=0.1, help='每条记录每天调价的概率')
+    parser.add_argument('--modes', type=lambda s: s.split(','), default=list(MODES),
+                        help=f"逗号分隔的模式：{','.join(MODES)}")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--batch-interval', type=float, default=2.0)
+    parser.add_argument('--max-inflight', type=int, default=500)
+    parser.add_argument('--db-latency-ms', type=float, default=1.0, help='模拟每条SQL语句的往返耗时')
+    parser.add_argument('--pool-size', type=int, default=5, help='模拟连接池的连接数')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    parser.add_argument('--single', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    unknown = set(args.modes) - set(MODES)
+    if unknown:
+        parser.error(f"未知模式: {', '.join(sorted(unknown))}")
+    if not args.rows:
+        args.rows = len(load_records(args.input))
+
+    if args.single:
+        _run_single(args)
+    else:
+        _run_all(args, argv)
+
+
+if __name__ == '__main__':
+    main()
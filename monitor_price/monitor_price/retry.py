@@ -0,0 +1,139 @@
+# 带退避的重试中间件
+#
+# 替代Scrapy自带的 RetryMiddleware（重试次数、状态码、异常类型沿用 RETRY_* 配置）：
+# - 重试按指数退避并加随机抖动延后：第n次重试等待 RETRY_BACKOFF_BASE * 2^(n-1) 秒（上限 RETRY_BACKOFF_MAX），
+#   实际取其 50%~100%
+# - 响应带 Retry-After 时按其等待（上限 RETRY_AFTER_MAX），并且该域名的其他重试也不早于这个时间
+# - 每个域名在 RETRY_BUDGET_WINDOW 秒内最多重试 RETRY_BUDGET 次，超出后直接放弃，避免在服务端限流时加重负担
+# 延后的请求用 reactor.callLater 到期后重新交给引擎，不占用下载并发，也不阻塞reactor；
+# 爬虫在 meta['retry_not_before'] 中指定时间的请求同样延后到该时间下载。
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+from scrapy import signals
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.response import response_status_message
+
+
+def backoff_delay(attempt, base, max_delay):
+    """第 attempt 次重试的等待时间（秒）：指数退避，取 50%~100% 的随机值"""
+    delay = min(max_delay, base * 2 ** max(attempt - 1, 0))
+    return random.uniform(delay / 2, delay)
+
+
+def parse_retry_after(value):
+    """解析 Retry-After（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    value = value.decode('latin-1').strip() if isinstance(value, bytes) else value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class BackoffRetryMiddleware(RetryMiddleware):
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 5)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 120)
+        self.retry_after_max = settings.getfloat('RETRY_AFTER_MAX', 300)
+        self.budget = settings.getint('RETRY_BUDGET', 30)
+        self.budget_window = settings.getfloat('RETRY_BUDGET_WINDOW', 60)
+        self.host_retries = {}      # 域名 -> 窗口内的重试时间列表
+        self.host_blocked_until = {}  # 域名 -> Retry-After 指定的时间
+        self.delayed = set()        # 等待中的 callLater
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = super().from_crawler(crawler)
+        crawler.signals.connect(middleware.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def process_request(self, request, spider=None):
+        not_before = request.meta.get('retry_not_before')
+        if not_before is not None and not_before > time.time():
+            self._delay(request, request, not_before - time.time())
+
+    def process_response(self, request, response, spider=None):
+        if request.meta.get('dont_retry', False) or response.status not in self.retry_http_codes:
+            return response
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        retry = self._backoff_retry(request, response_status_message(response.status), retry_after)
+        if retry is None:
+            return response
+        self._delay(request, retry, retry.meta['retry_not_before'] - time.time())
+
+    def process_exception(self, request, exception, spider=None):
+        if not isinstance(exception, self.exceptions_to_retry) or request.meta.get('dont_retry', False):
+            return None
+        retry = self._backoff_retry(request, exception)
+        if retry is not None:
+            self._delay(request, retry, retry.meta['retry_not_before'] - time.time())
+        return None
+
+    def _backoff_retry(self, request, reason, retry_after=None):
+        """生成延后的重试请求；超过重试次数或域名的重试预算时返回None"""
+        host = urlparse_cached(request).hostname
+        now = time.time()
+        retries = [at for at in self.host_retries.get(host, []) if now - at < self.budget_window]
+        self.host_retries[host] = retries
+        if self.budget and len(retries) >= self.budget:
+            self.crawler.stats.inc_value('retry/budget_exhausted')
+            self.crawler.spider.logger.warning(
+                f'{host} 在 {self.budget_window:.0f} 秒内已重试 {len(retries)} 次，放弃重试: {request.url}（{reason}）'
+            )
+            return None
+
+        retry = self._retry(request, reason)
+        if retry is None:
+            return None
+        retries.append(now)
+
+        if retry_after is not None:
+            delay = min(retry_after, self.retry_after_max)
+            self.host_blocked_until[host] = max(self.host_blocked_until.get(host, 0), now + delay)
+            self.crawler.stats.inc_value('retry/retry_after')
+        else:
+            delay = backoff_delay(retry.meta['retry_times'], self.backoff_base, self.backoff_max)
+        retry.meta['retry_not_before'] = max(now + delay, self.host_blocked_until.get(host, 0))
+        return retry
+
+    def _delay(self, original, request, delay):
+        """
+        delay 秒后把 request 重新交给引擎；original 以 IgnoreRequest 结束，
+        并在 meta['retry_delayed'] 中标记，errback 据此区分延后重试和真正的失败
+        """
+        from twisted.internet import reactor
+
+        delayed = request.replace(meta={key: value for key, value in request.meta.items() if key != 'retry_delayed'})
+        call = reactor.callLater(max(delay, 0), self._reschedule, delayed)
+        self.delayed.add(call)
+        self.crawler.stats.inc_value('retry/delayed')
+        self.crawler.stats.max_value('retry/max_delay', round(delay, 1))
+        original.meta['retry_delayed'] = True
+        raise IgnoreRequest(f'延后 {delay:.1f} 秒重试: {request.url}')
+
+    def _reschedule(self, request):
+        self.delayed = {call for call in self.delayed if call.active()}
+        self.crawler.engine.crawl(request)
+
+    def spider_idle(self, spider):
+        # 还有等待中的重试时不关闭爬虫
+        self.delayed = {call for call in self.delayed if call.active()}
+        if self.delayed:
+            raise DontCloseSpider
+
+    def spider_closed(self, spider):
+        for call in self.delayed:
+            if call.active():
+                call.cancel()
+        self.delayed = set()
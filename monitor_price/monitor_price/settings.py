@@ -8,6 +8,7 @@
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 import os
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -22,6 +23,62 @@ MYSQL_DB = os.getenv('MYSQL_DATABASE', 'recycle_db')
 MYSQL_CHARSET = 'utf8mb4'
 MYSQL_TABLES = {'recycle_recycleproduct'}
 
+# 存储后端：mysql（默认，直接写入数据库）/ sqlite（本地WAL文件）/ jsonl（gzip压缩的追加文件）
+# 没有数据库访问权限的爬虫机器可以写入本地文件，之后再一次性导入
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mysql')
+STORAGE_SQLITE_PATH = os.getenv('STORAGE_SQLITE_PATH', 'data/monitor_price.sqlite3')
+STORAGE_JSONL_DIR = os.getenv('STORAGE_JSONL_DIR', 'data/dumps')
+
+# 批量写入：缓冲达到 MYSQL_BATCH_SIZE 条或每隔 MYSQL_BATCH_INTERVAL 秒，
+# 使用一条多行 INSERT ... ON DUPLICATE KEY UPDATE 写入（设为 0 或 1 恢复逐条写入）
+MYSQL_BATCH_SIZE = int(os.getenv('MYSQL_BATCH_SIZE', '100'))
+MYSQL_BATCH_INTERVAL = float(os.getenv('MYSQL_BATCH_INTERVAL', '2'))
+
+# 在途写入上限（缓冲区 + 正在写入 + 等待重试的item数），达到上限时管道向Scrapy施加背压；0 表示不限制
+MYSQL_MAX_INFLIGHT = int(os.getenv('MYSQL_MAX_INFLIGHT', '500'))
+
+# 写入失败的数据分批退避重试 DEADLETTER_MAX_RETRIES 次（间隔从 DEADLETTER_RETRY_DELAY 秒开始翻倍），
+# 仍失败的追加到死信文件，之后用 `python -m monitor_price.deadletter replay` 重新写入；0 表示不重试
+DEADLETTER_PATH = os.getenv('DEADLETTER_PATH', 'data/deadletter.jsonl')
+DEADLETTER_MAX_RETRIES = int(os.getenv('DEADLETTER_MAX_RETRIES', '3'))
+DEADLETTER_RETRY_DELAY = float(os.getenv('DEADLETTER_RETRY_DELAY', '2'))
+
+# 价格指纹缓存（默认不启用）：记录每个产品上次写入的主键/价格/日期/名称哈希，当天未变化时跳过写入，
+# 批量写入时已知主键的记录不再查询是否存在（SQL语句约少20%，但每个item多一次本地SQLite查询，
+# 数据库往返较慢时才更快，见 README「价格指纹缓存」），例如 data/price_fingerprints.sqlite3
+# 每个写入目标（MySQL数据库 / SQLite文件）使用单独的文件（文件名加目标后缀，见 fingerprints.store_path），jsonl 后端不启用；
+# 数据库被修改或恢复后用 FINGERPRINT_REBUILD=True 或 `python -m monitor_price.fingerprints rebuild` 从数据库重建
+FINGERPRINT_STORE_PATH = os.getenv('FINGERPRINT_STORE_PATH', '')
+FINGERPRINT_REBUILD = False
+
+# 有数据写入后更新网站的数据版本号（recycle_dataversion，网站据此重建搜索索引和缓存），
+# 爬取过程中最多每 DATA_VERSION_BUMP_INTERVAL 秒更新一次，结束时再更新一次（0 表示只在结束时更新）
+DATA_VERSION_BUMP_INTERVAL = float(os.getenv('DATA_VERSION_BUMP_INTERVAL', '600'))
+
+# 增量爬取：记录每个品牌每一页 listItem 的摘要，与上次相同的页面不输出item；
+# 摘要在该页item全部写入后才保存。内容未变化的页面每隔 INCREMENTAL_FULL_SWEEP_DAYS 天重新输出一次
+# INCREMENTAL_STOP_PAGINATION：逐页翻页，遇到未变化的页面时不再请求该品牌之后的页面
+# （之后的页面到了兜底间隔时继续翻页）；设为 0 时照常请求所有页面，只跳过输出
+INCREMENTAL_CRAWL_ENABLED = os.getenv('INCREMENTAL_CRAWL_ENABLED', '0') == '1'
+INCREMENTAL_STORE_PATH = os.getenv('INCREMENTAL_STORE_PATH', 'data/page_fingerprints.sqlite3')
+INCREMENTAL_FULL_SWEEP_DAYS = int(os.getenv('INCREMENTAL_FULL_SWEEP_DAYS', '7'))
+INCREMENTAL_STOP_PAGINATION = os.getenv('INCREMENTAL_STOP_PAGINATION', '1') == '1'
+
+# 任务队列模式：分类 × 品牌 × 页码 的任务放在共享队列中，多个爬虫进程（可以在不同机器上）领取任务共同完成一次爬取
+# 为空时不使用队列；sqlite 适合同一台机器上的多个进程，redis 适合多台机器
+WORKQUEUE_BACKEND = os.getenv('WORKQUEUE_BACKEND', '')
+# 队列名称，默认为 爬虫名_日期；多台机器共同爬取时应显式指定同一个名称，中断后用同一名称重新启动即可继续
+WORKQUEUE_NAME = os.getenv('WORKQUEUE_NAME', '')
+WORKQUEUE_SQLITE_PATH = os.getenv('WORKQUEUE_SQLITE_PATH', 'data/workqueue.sqlite3')
+WORKQUEUE_REDIS_URL = os.getenv('WORKQUEUE_REDIS_URL', 'redis://localhost:6379/0')
+# 租约时长（秒），超时未确认的任务（例如进程被杀掉）回到队列由其他进程领取
+WORKQUEUE_LEASE_SECONDS = int(os.getenv('WORKQUEUE_LEASE_SECONDS', '600'))
+# 每个进程同时处理的任务数
+WORKQUEUE_LEASE_BATCH = int(os.getenv('WORKQUEUE_LEASE_BATCH', '16'))
+
+# 管道运行报告（各阶段耗时直方图和结果计数）输出目录，置空则只写入Scrapy统计信息
+PIPELINE_REPORT_DIR = os.getenv('PIPELINE_REPORT_DIR', 'logs')
+
 
 
 BOT_NAME = "monitor_price"
@@ -41,9 +98,28 @@ ADDONS = {}
 ROBOTSTXT_OBEY = False
 
 # Concurrency and throttling settings
-CONCURRENT_REQUESTS = 1
+# 爬虫按品牌分配下载槽（meta['download_slot']），每个槽内串行并间隔 DOWNLOAD_DELAY，
+# 按 DOWNLOAD_DELAY_JITTER 随机化为 0.5~1.5 倍（约2~5秒，与原来翻页时的随机等待相同）；不同品牌之间并发，
+# CONCURRENT_REQUESTS 需不小于同时爬取的品牌数
+# （RANDOMIZE_DOWNLOAD_DELAY 在 Scrapy 2.19 中已弃用，设置后每次爬取都会告警）
+CONCURRENT_REQUESTS = 16
 CONCURRENT_REQUESTS_PER_DOMAIN = 1
-DOWNLOAD_DELAY = 1
+DOWNLOAD_DELAY = 3.5
+DOWNLOAD_DELAY_JITTER = 0.5
+
+# 列表接口地址；本地基准测试时指向模拟服务器（python -m monitor_price.mockserver serve）
+SUNING_BASE_URL = os.getenv('SUNING_BASE_URL', 'https://hx.suning.com')
+
+# suning_all 爬虫爬取的分类（monitor_price/categories.py 中的键，如 phone,computer），为空时爬取全部分类
+SUNING_CATEGORIES = [key for key in os.getenv('SUNING_CATEGORIES', '').split(',') if key]
+
+# 第1页返回总页数后，其余页面一次性提交；同一品牌的页面按页码分散到 SUNING_PAGE_CONCURRENCY 个下载槽，
+# 即每个品牌最多同时下载的页数。默认 1：与原来一样逐页下载，对同一品牌的请求频率不变；
+# 调大会成倍增加对苏宁的请求频率，需确认不会触发限流后再调整
+SUNING_PAGE_CONCURRENCY = int(os.getenv('SUNING_PAGE_CONCURRENCY', '1'))
+
+# 列表接口响应的JSON解码器：auto（安装了 orjson 时使用 orjson）/ orjson / json
+SUNING_JSON_DECODER = os.getenv('SUNING_JSON_DECODER', 'auto')
 
 # Disable cookies (enabled by default)
 #COOKIES_ENABLED = False
@@ -65,15 +141,38 @@ DOWNLOAD_DELAY = 1
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "monitor_price.middlewares.MonitorPriceDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "monitor_price.middlewares.SeleniumRenderMiddleware": 950,
+    "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+    "monitor_price.retry.BackoffRetryMiddleware": 550,
+}
+
+# 无头浏览器渲染（monitor_price/middlewares.py），只处理 meta['render_js'] 为真的请求；
+# 开启后才导入 selenium，浏览器在池中复用，每个浏览器渲染 SELENIUM_MAX_PAGES_PER_BROWSER 个页面后重建
+SELENIUM_ENABLED = os.getenv('SELENIUM_ENABLED', '0') == '1'
+SELENIUM_BROWSER = os.getenv('SELENIUM_BROWSER', 'chrome')  # chrome / firefox
+SELENIUM_POOL_SIZE = int(os.getenv('SELENIUM_POOL_SIZE', '2'))
+SELENIUM_MAX_PAGES_PER_BROWSER = int(os.getenv('SELENIUM_MAX_PAGES_PER_BROWSER', '50'))
+SELENIUM_PAGE_LOAD_TIMEOUT = 30
+# 未指定 meta['render_wait_selector'] 时页面加载后固定等待的秒数
+SELENIUM_RENDER_WAIT = 2
+
+# 重试退避（monitor_price/retry.py）：第n次重试等待 RETRY_BACKOFF_BASE * 2^(n-1) 秒的 50%~100%，
+# 最多 RETRY_BACKOFF_MAX 秒；响应带 Retry-After 时按其等待（最多 RETRY_AFTER_MAX 秒）
+RETRY_TIMES = int(os.getenv('RETRY_TIMES', '3'))
+RETRY_BACKOFF_BASE = float(os.getenv('RETRY_BACKOFF_BASE', '5'))
+RETRY_BACKOFF_MAX = float(os.getenv('RETRY_BACKOFF_MAX', '120'))
+RETRY_AFTER_MAX = 300
+# 每个域名在 RETRY_BUDGET_WINDOW 秒内最多重试 RETRY_BUDGET 次，超出后直接放弃；0 表示不限制
+RETRY_BUDGET = int(os.getenv('RETRY_BUDGET', '30'))
+RETRY_BUDGET_WINDOW = 60
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "monitor_price.throttle.AimdThrottle": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -94,13 +193,34 @@ AUTOTHROTTLE_START_DELAY = 5
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
+# 按域名自适应调整并发和下载间隔（monitor_price/throttle.py，与 AutoThrottle 二选一），默认关闭
+# 正常响应时并发窗口逐步 +1、间隔逐步减小；出现拥塞状态码、延迟超过 AIMD_TARGET_LATENCY
+# 或接口返回无法解析的内容时，窗口减半、间隔翻倍。只调整该域名各下载槽的并发和间隔，不修改 CONCURRENT_REQUESTS
+AIMD_ENABLED = os.getenv('AIMD_ENABLED', '0') == '1'
+AIMD_DOMAINS = [urlparse(SUNING_BASE_URL).hostname]
+# 并发窗口（每个下载槽同时下载的请求数，下载槽按品牌划分）：初始值、下限和上限
+AIMD_START_CONCURRENCY = int(os.getenv('AIMD_START_CONCURRENCY', '1'))
+AIMD_MIN_CONCURRENCY = 1
+AIMD_MAX_CONCURRENCY = int(os.getenv('AIMD_MAX_CONCURRENCY', '2'))
+# 每个下载槽的下载间隔（秒）：初始值、下限、上限和每次增加窗口时减小的步长
+AIMD_START_DELAY = DOWNLOAD_DELAY
+AIMD_MIN_DELAY = float(os.getenv('AIMD_MIN_DELAY', '1.5'))
+AIMD_MAX_DELAY = 30
+AIMD_DELAY_STEP = 0.25
+# 响应延迟超过该值（秒）视为拥塞
+AIMD_TARGET_LATENCY = float(os.getenv('AIMD_TARGET_LATENCY', '2.0'))
+# 视为拥塞（被限流或服务端过载）的状态码
+AIMD_CONGESTION_STATUS = [403, 429, 500, 502, 503, 504]
+
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# 录制/回放响应（monitor_price/httpcache.py，压缩后存入 .scrapy/httpcache/<爬虫名>.zdb），默认关闭
+HTTPCACHE_ENABLED = os.getenv('HTTPCACHE_ENABLED', '0') == '1'
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
+# 限流和服务端错误不缓存，回放时重新请求
+HTTPCACHE_IGNORE_HTTP_CODES = [403, 429, 500, 502, 503, 504]
+HTTPCACHE_STORAGE = "monitor_price.httpcache.CompressedDbmCacheStorage"
 
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
@@ -0,0 +1,417 @@
+import itertools
+import os
+import socket
+import time
+from urllib.parse import urlparse
+
+import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from monitor_price.categories import SUNING_CATEGORIES
+from monitor_price.decoding import DecodeError, decode_listing, get_decoder
+from monitor_price.page_fingerprints import PageFingerprintStore, page_digest
+from monitor_price.items import MonitorPriceItem
+from monitor_price.pipelines import item_stored
+from monitor_price.retry import backoff_delay
+from monitor_price.throttle import response_parse_failed
+from monitor_price.workqueue import Task, open_workqueue, task_id
+from datetime import datetime
+import random
+
+
+class SuningBaseSpider(scrapy.Spider):
+    """
+    苏宁回收价格爬虫基类
+    按 categories 中的分类（见 monitor_price/categories.py）爬取各品牌的列表接口，
+    子类只需指定 name 和 categories
+    """
+
+    allowed_domains = ["hx.suning.com"]
+    site_url = "https://hx.suning.com"  # 由 SUNING_BASE_URL 覆盖
+    base_url = site_url + "/{path}/{page}/{brand}.htm"
+    categories = []
+    page_store = None  # 增量爬取的列表页指纹（INCREMENTAL_CRAWL_ENABLED）
+    stop_unchanged_pages = False  # 增量爬取时逐页翻页，遇到未变化的页面停止（INCREMENTAL_STOP_PAGINATION）
+    json_loads = None  # 列表接口的JSON解码函数（SUNING_JSON_DECODER），None 时自动选择
+    work_queue = None  # 分布式爬取的任务队列（WORKQUEUE_BACKEND）
+
+    def __init__(self, categories=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 命令行参数：scrapy crawl suning_all -a categories=phone,computer
+        if categories:
+            self.categories = [key.strip() for key in categories.split(',') if key.strip()]
+        # 等待管道确认写入的列表页：登记号 -> [未确认的item数, 是否全部写入成功, 回调]
+        self.pending_pages = {}
+        self._page_keys = itertools.count(1)
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        site_url = settings.get('SUNING_BASE_URL')
+        if site_url:
+            # 指向模拟服务器等其他地址时，同时放行该域名
+            spider.site_url = site_url.rstrip('/')
+            spider.base_url = spider.site_url + '/{path}/{page}/{brand}.htm'
+            host = urlparse(spider.site_url).hostname
+            if host not in spider.allowed_domains:
+                spider.allowed_domains = [*spider.allowed_domains, host]
+        spider.json_loads = get_decoder(settings.get('SUNING_JSON_DECODER', 'auto'))
+        crawler.signals.connect(spider.item_stored, signal=item_stored)
+        if settings.getbool('INCREMENTAL_CRAWL_ENABLED'):
+            spider.page_store = PageFingerprintStore(
+                settings.get('INCREMENTAL_STORE_PATH'),
+                full_sweep_days=settings.getint('INCREMENTAL_FULL_SWEEP_DAYS', 7),
+            )
+            spider.stop_unchanged_pages = settings.getbool('INCREMENTAL_STOP_PAGINATION', True)
+            crawler.signals.connect(spider.close_page_store, signal=signals.spider_closed)
+        if settings.get('WORKQUEUE_BACKEND'):
+            name = settings.get('WORKQUEUE_NAME') or f"{spider.name}_{datetime.now().strftime('%Y%m%d')}"
+            spider.work_queue = open_workqueue(settings, name)
+            spider.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+            spider.leased_tasks = set()   # 已领取、尚未解析完的任务（占用本进程的处理名额）
+            spider.writing_tasks = set()  # 已解析、等待管道写入后确认的任务
+            crawler.signals.connect(spider.lease_on_idle, signal=signals.spider_idle)
+            crawler.signals.connect(spider.close_work_queue, signal=signals.spider_closed)
+        return spider
+
+    def close_page_store(self, spider):
+        self.page_store.close()
+
+    def track_page(self, items, on_done):
+        """
+        登记一个列表页的item，管道确认全部item（写入或放弃）后调用 on_done(stored)，
+        stored 为 False 表示其中有item重试后仍写入失败；没有item时立即调用
+        """
+        if not items:
+            on_done(True)
+            return
+        page_key = next(self._page_keys)
+        for item in items:
+            item['page_key'] = page_key
+        self.pending_pages[page_key] = [len(items), True, on_done]
+
+    def item_stored(self, item, spider, stored):
+        """管道的 item_stored 信号：该页的item全部确认后调用登记的回调"""
+        page_key = item.get('page_key')
+        pending = self.pending_pages.get(page_key)
+        if pending is None:
+            return
+        pending[0] -= 1
+        pending[1] = pending[1] and stored
+        if pending[0] == 0:
+            del self.pending_pages[page_key]
+            pending[2](pending[1])
+
+    def close_work_queue(self, spider):
+        # 正常退出时把已领取但未完成的任务放回队列，其他进程可以立即领取
+        # （管道此时已写完剩余数据，writing_tasks 中只剩没有收到写入确认的任务）
+        for leased_id in self.leased_tasks | self.writing_tasks:
+            self.work_queue.release(leased_id, self.worker_id)
+        self.work_queue.close()
+
+    def category_configs(self):
+        """返回要爬取的 (分类键, 分类配置)，未知的分类键记录错误后跳过"""
+        configs = []
+        for key in self.categories:
+            if key not in SUNING_CATEGORIES:
+                self.logger.error(f'未知的分类: {key}（可选: {", ".join(SUNING_CATEGORIES)}）')
+                continue
+            configs.append((key, SUNING_CATEGORIES[key]))
+        return configs
+
+    async def start(self):
+        """Scrapy 2.13+ 的入口，旧版本直接调用 start_requests()"""
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        if self.work_queue is not None:
+            # 各品牌的第1页加入队列（已存在或已完成的不会重复加入），再领取第一批任务
+            added = self.work_queue.seed(
+                Task(task_id(category_key, brand_code, 1),
+                     {'category_key': category_key, 'brand_code': brand_code, 'brand_name': brand_name, 'page': 1})
+                for category_key, config in self.category_configs()
+                for brand_code, brand_name in config['brands'].items()
+            )
+            self.logger.info(f'任务队列 {self.work_queue.name}: 新加入 {added} 个任务，进度 {self.work_queue.stats()}')
+            yield from self.lease_requests()
+            return
+
+        for category_key, config in self.category_configs():
+            for brand_code, brand_name in config['brands'].items():
+                yield self.page_request(category_key, brand_code, brand_name, 1)
+
+    def page_request(self, category_key, brand_code, brand_name, page, retry_count=0, task=None, total_pages=None):
+        """
+        列表页请求
+        页码越小优先级越高（各品牌的第2页先于第3页下载）；请求间隔由品牌下载槽控制
+        total_pages 为逐页翻页时已知的总页数（该页放弃时据此继续下一页）
+        """
+        path = SUNING_CATEGORIES[category_key]['path']
+        meta = {
+            'category_key': category_key,
+            'brand_code': brand_code,
+            'brand_name': brand_name,
+            'page': page,
+            'retry_count': retry_count,
+            'download_slot': self.brand_slot(category_key, brand_code, page)
+        }
+        if task is not None:
+            meta['task_id'] = task
+        if total_pages is not None:
+            meta['total_pages'] = total_pages
+        return scrapy.Request(
+            self.base_url.format(path=path, page=page, brand=brand_code),
+            headers=self.get_headers(path, brand_code),
+            callback=self.parse,
+            errback=self.handle_task_error if task is not None else None,
+            priority=1 - page,
+            meta=meta,
+            dont_filter=True
+        )
+
+    def lease_requests(self):
+        """从任务队列领取任务，使本进程处理中的任务保持 WORKQUEUE_LEASE_BATCH 个"""
+        count = self.settings.getint('WORKQUEUE_LEASE_BATCH', 16) - len(self.leased_tasks)
+        if count <= 0:
+            return
+        for task in self.work_queue.lease(self.worker_id, count):
+            self.leased_tasks.add(task.task_id)
+            payload = task.payload
+            yield self.page_request(
+                payload['category_key'], payload['brand_code'], payload['brand_name'], payload['page'],
+                task=task.task_id, total_pages=payload.get('total_pages')
+            )
+
+    def finish_task(self, meta, failed=False, written=True):
+        """
+        请求 meta 中的任务已解析完（或放弃），领取新任务
+        written 为 False 时该页还有item等待管道写入，由 track_page 的回调调用 ack_task 确认
+        """
+        leased_id = meta.get('task_id')
+        if leased_id is None:
+            return
+        if failed:
+            if self.work_queue.fail(leased_id, self.worker_id):
+                self.crawler.stats.inc_value('workqueue/failed')
+            else:
+                self.lease_lost(leased_id)
+        elif written:
+            self.ack_task(leased_id)
+        self.leased_tasks.discard(leased_id)
+        yield from self.lease_requests()
+
+    def ack_task(self, leased_id):
+        """确认任务完成（该页的item已全部写入或进入死信文件），之后不会再被领取"""
+        if self.work_queue.ack(leased_id, self.worker_id):
+            self.crawler.stats.inc_value('workqueue/done')
+        else:
+            self.lease_lost(leased_id)
+        self.writing_tasks.discard(leased_id)
+
+    def lease_lost(self, leased_id):
+        """租约到期后任务已被其他进程领取，本进程的结果不再确认（由新的租约重新爬取）"""
+        self.logger.warning(f'任务 {leased_id} 的租约已被其他进程领取，忽略本进程的确认')
+        self.crawler.stats.inc_value('workqueue/lease_lost')
+
+    def handle_task_error(self, failure):
+        """请求在下载阶段失败（已由重试中间件重试）时放弃该任务"""
+        if failure.check(IgnoreRequest) and failure.request.meta.get('retry_delayed'):
+            return  # 重试中间件延后了这个请求，任务仍在处理中
+        self.logger.error(f'请求失败: {failure.request.url}, 错误: {failure.value!r}')
+        for request in itertools.chain(
+            self.skip_page(failure.request.meta), self.finish_task(failure.request.meta, failed=True)
+        ):
+            self.crawler.engine.crawl(request)
+
+    def lease_on_idle(self, spider):
+        """空闲时继续领取任务；队列中还有其他进程未完成的任务时保持运行，等待租约到期"""
+        requests = list(self.lease_requests())
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        stats = self.work_queue.stats()
+        if requests or stats['pending'] or stats['leased']:
+            raise DontCloseSpider
+
+    def brand_slot(self, category_key, brand_code, page=1):
+        """
+        每个品牌使用独立的下载槽：槽内请求按 DOWNLOAD_DELAY 依次发出，
+        不同品牌之间并发，等待由Scrapy调度，不阻塞reactor
+        SUNING_PAGE_CONCURRENCY > 1 时同一品牌的页面按页码分散到多个槽中并发
+        """
+        concurrency = self.settings.getint('SUNING_PAGE_CONCURRENCY', 1)
+        if concurrency > 1:
+            return f'{self.name}:{category_key}:{brand_code}:{page % concurrency}'
+        return f'{self.name}:{category_key}:{brand_code}'
+
+    def get_headers(self, path='photo', brand_code='pa00009'):
+        user_agents = [
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/120.0'
+        ]
+
+        return {
+            'Accept': 'application/json, text/javascript, */*; q=0.01',
+            'Accept-Encoding': 'gzip, deflate, br, zstd',
+            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+            'Connection': 'keep-alive',
+            'Host': urlparse(self.site_url).netloc,
+            'Referer': f'{self.site_url}/{path}/{brand_code}.htm',
+            'Sec-Fetch-Dest': 'empty',
+            'Sec-Fetch-Mode': 'cors',
+            'Sec-Fetch-Site': 'same-origin',
+            'User-Agent': random.choice(user_agents),
+            'X-Requested-With': 'XMLHttpRequest',
+            'sec-ch-ua': '"Chromium";v="120", "Not=A?Brand";v="24"',
+            'sec-ch-ua-mobile': '?0',
+            'sec-ch-ua-platform': '"Windows"'
+        }
+
+    def parse(self, response):
+        category_key = response.meta['category_key']
+        config = SUNING_CATEGORIES[category_key]
+        brand_code = response.meta['brand_code']  # brand_code 是动态网页的API接口，每次都需要传递
+        brand_name = response.meta['brand_name']  # 品牌名字
+        current_page = response.meta['page']
+        retry_count = response.meta['retry_count']
+
+        if response.status != 200:
+            self.logger.warning(f'请求失败: {response.url}, 状态码: {response.status}')
+            yield from self.handle_request_failure(response, retry_count)
+            return
+
+        try:
+            listing = decode_listing(response.body, self.json_loads)
+        except DecodeError as e:
+            self.logger.error(f'JSON解析失败: {response.url}, 错误: {e}')
+            # 通常是被限流返回的验证页面，通知 AimdThrottle 降低请求频率
+            self.crawler.signals.send_catch_log(response_parse_failed, request=response.request, spider=self)
+            yield from self.handle_request_failure(response, retry_count)
+            return
+
+        if listing.items is None:
+            self.logger.warning(f'返回数据异常: {response.url}')
+            yield from self.skip_page(response.meta)
+            yield from self.finish_task(response.meta)
+            return
+
+        # 增量爬取：与上次输出时内容相同的页面不输出item（见 page_fingerprints.py）
+        digest = None
+        unchanged = False
+        if self.page_store is not None:
+            digest = page_digest(listing.items)
+            unchanged = self.page_store.unchanged(category_key, brand_code, current_page, digest)
+            self.crawler.stats.inc_value('incremental/pages_unchanged' if unchanged else 'incremental/pages_changed')
+
+        # 翻页处理：第1页返回总页数后一次性提交其余页面；增量爬取时逐页翻页，遇到未变化的页面停止
+        if current_page == 1 and self.page_store is not None:
+            self.page_store.prune(category_key, brand_code, listing.total_pages)
+        yield from self.handle_pagination(
+            category_key, brand_code, brand_name, current_page, listing.total_pages, unchanged
+        )
+
+        if unchanged:
+            yield from self.finish_task(response.meta)
+            return
+
+        # 处理商品数据
+        items = [self.build_item(list_item, config, brand_name, current_page) for list_item in listing.items]
+        leased_id = response.meta.get('task_id')
+        if digest is not None or leased_id is not None:
+            # 该页的item全部由管道确认后：记录页面摘要（全部写入成功时），确认任务
+            # 写入失败或进程中断时不记录摘要、不确认任务，下次运行（或租约到期后）重新爬取该页
+            def page_stored(stored):
+                if digest is not None and stored:
+                    self.page_store.save(category_key, brand_code, current_page, digest)
+                if leased_id is not None:
+                    self.ack_task(leased_id)
+
+            if leased_id is not None:
+                self.writing_tasks.add(leased_id)
+            self.track_page(items, page_stored)
+        yield from items
+
+        # 任务队列模式：页面解析完成后领取新任务，该页的任务在item写入后确认
+        yield from self.finish_task(response.meta, written=False)
+
+    def build_item(self, list_item, config, brand_name, current_page):
+        item = MonitorPriceItem()
+
+        item_code = list_item.item_code
+        item_name = list_item.item_name
+
+        item['product_code'] = item_code  # 产品唯一编号
+        item['name'] = item_name  # 产品完整名称
+        item['category'] = config['category']  # 产品分类
+        item['brand'] = brand_name  # 品牌名称
+        item['model'] = item_name  # 产品型号
+        item['avg_price'] = list_item.average_price  # 平均价格
+        item['scrape_date'] = datetime.now().date()  # 爬取日期
+
+        # 辅助字段（不直接存入数据库）
+        item['crawl_time'] = datetime.now().isoformat()
+        item['source_platform'] = '苏宁'
+        item['page'] = current_page
+
+        return item
+
+    def handle_pagination(self, category_key, brand_code, brand_name, current_page, total_pages, unchanged=False):
+        """
+        提交 current_page 之后的页面
+        逐页翻页（stop_unchanged_pages）时只提交下一页：本页与上次相同，且之后的页面都在兜底间隔内输出过时，
+        停止翻页（列表页按相同顺序排列，前面的页面未变化时后面的页面通常也未变化）
+        """
+        if self.stop_unchanged_pages:
+            if current_page >= total_pages:
+                return
+            if unchanged and not self.page_store.sweep_due(category_key, brand_code, current_page + 1, total_pages):
+                self.crawler.stats.inc_value('incremental/pages_not_requested', total_pages - current_page)
+                return
+            pages = [current_page + 1]
+        elif current_page == 1:
+            pages = range(2, total_pages + 1)
+        else:
+            return
+
+        # 任务队列模式：其余页面加入队列，由各进程领取
+        if self.work_queue is not None:
+            self.work_queue.seed(
+                Task(task_id(category_key, brand_code, page), {
+                    'category_key': category_key, 'brand_code': brand_code, 'brand_name': brand_name, 'page': page,
+                    'total_pages': total_pages,
+                })
+                for page in pages
+            )
+            return
+
+        for next_page in pages:
+            yield self.page_request(category_key, brand_code, brand_name, next_page, total_pages=total_pages)
+
+    def skip_page(self, meta):
+        """放弃的页面：逐页翻页时继续下一页（第1页放弃时总页数未知，该品牌不再翻页）"""
+        yield from self.handle_pagination(
+            meta['category_key'], meta['brand_code'], meta['brand_name'], meta['page'], meta.get('total_pages', 0)
+        )
+
+    def handle_request_failure(self, response, retry_count):
+        if retry_count < 3:
+            # 按指数退避延后重试（由 BackoffRetryMiddleware 在到期后下载），不立即重新请求
+            delay = backoff_delay(
+                retry_count + 1, self.settings.getfloat('RETRY_BACKOFF_BASE', 5), self.settings.getfloat('RETRY_BACKOFF_MAX', 120)
+            )
+            self.logger.info(f'{delay:.1f} 秒后重试请求: {response.url}, 重试次数: {retry_count + 1}')
+            request = self.page_request(
+                response.meta['category_key'], response.meta['brand_code'], response.meta['brand_name'],
+                response.meta['page'], retry_count=retry_count + 1, task=response.meta.get('task_id'),
+                total_pages=response.meta.get('total_pages')
+            )
+            request.meta['retry_not_before'] = time.time() + delay
+            request.meta['dont_cache'] = True  # 开启HTTP缓存时不再读取缓存中的错误页面
+            yield request
+        else:
+            self.logger.error(f'请求超过最大次数: {response.url}')
+            yield from self.skip_page(response.meta)
+            yield from self.finish_task(response.meta, failed=True)
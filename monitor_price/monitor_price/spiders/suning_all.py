@@ -0,0 +1,18 @@
+from monitor_price.categories import SUNING_CATEGORIES
+from monitor_price.spiders.base import SuningBaseSpider
+
+
+class SuningAllSpider(SuningBaseSpider):
+    """
+    一个爬虫爬取所有分类，共用下载器、数据库连接池和去重状态
+    默认爬取 SUNING_CATEGORIES 配置中的分类（为空时爬取 categories.py 中的全部分类），
+    也可以用 -a categories=phone,computer 指定
+    """
+
+    name = "suning_all"
+
+    def start_requests(self):
+        if not self.categories:
+            self.categories = [key for key in self.settings.getlist('SUNING_CATEGORIES') if key] or list(SUNING_CATEGORIES)
+        self.logger.info(f'爬取分类: {", ".join(self.categories)}')
+        yield from super().start_requests()
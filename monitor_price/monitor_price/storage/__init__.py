@@ -0,0 +1,49 @@
+# 爬取结果的存储后端
+#
+# 由 STORAGE_BACKEND 选择：
+#     mysql   直接写入 recycle 数据库（默认）
+#     sqlite  写入本地 SQLite 文件（WAL），表结构与数据库一致
+#     jsonl   追加写入 gzip 压缩的 JSONL 文件，之后一次性导入数据库
+
+from monitor_price.storage.base import LocalStorage, StorageBackend
+from monitor_price.storage.jsonl import JsonlStorage
+from monitor_price.storage.mysql import MySQLStorage
+from monitor_price.storage.sqlite import SQLiteStorage
+
+
+BACKENDS = {
+    'mysql': MySQLStorage,
+    'sqlite': SQLiteStorage,
+    'jsonl': JsonlStorage,
+}
+
+
+def open_storage(crawler_settings, dbpool=None):
+    """
+    按爬虫配置创建存储后端
+    传入dbpool时直接用作MySQL连接池（供离线回放工具替换数据库）
+    """
+    from monitor_price import settings
+
+    backend = (crawler_settings.get('STORAGE_BACKEND') or 'mysql').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的存储后端: {backend}（可选: {', '.join(BACKENDS)}）")
+
+    if backend == 'sqlite':
+        return SQLiteStorage(crawler_settings.get('STORAGE_SQLITE_PATH') or 'data/monitor_price.sqlite3')
+    if backend == 'jsonl':
+        return JsonlStorage(crawler_settings.get('STORAGE_JSONL_DIR') or 'data/dumps')
+    if dbpool is not None:
+        return MySQLStorage(dbpool)
+    return MySQLStorage.from_settings(settings)
+
+
+__all__ = [
+    'BACKENDS',
+    'JsonlStorage',
+    'LocalStorage',
+    'MySQLStorage',
+    'SQLiteStorage',
+    'StorageBackend',
+    'open_storage',
+]
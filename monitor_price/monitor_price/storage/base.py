@@ -0,0 +1,85 @@
+from twisted.internet import threads
+from twisted.python.threadpool import ThreadPool
+
+
+class StorageBackend:
+    """
+    存储后端基类
+    管道通过 runInteraction(操作, *参数) 在后端的连接/线程中执行写入，操作的第一个参数为后端自己的事务句柄：
+        upsert(tx, item)         写入产品记录和当天价格，返回 (operation, product_code, product_id)
+        touch(tx, item)          指纹命中（item['date_only']）时只更新日期和当天价格，记录不存在时退回 upsert
+        batch_upsert(tx, items)  一个事务内写入一批，返回与items一一对应的结果
+    operation 取值：inserted / updated / touched
+    """
+
+    name = None
+    # 写入目标（如 mysql://host:port/db），价格指纹按目标分别保存；为 None 时不使用价格指纹（没有主键的后端）
+    target = None
+
+    def open_spider(self, spider):
+        pass
+
+    def runInteraction(self, interaction, *args, **kw):
+        raise NotImplementedError
+
+    def upsert(self, tx, item):
+        raise NotImplementedError
+
+    def touch(self, tx, item):
+        return self.upsert(tx, item)
+
+    def batch_upsert(self, tx, items):
+        return [self.touch(tx, item) if item.get('date_only') else self.upsert(tx, item) for item in items]
+
+    def fetch_fingerprint_rows(self, tx):
+        """重建价格指纹所需的 (product_code, id, avg_price, scrape_date, name, category, brand, model)"""
+        return []
+
+    def bump_data_version(self, tx, name):
+        """
+        数据版本号加一（recycle_dataversion），网站据此重建搜索索引和缓存，返回是否已更新
+        本地文件后端不更新，由导入命令 import_crawl 更新
+        """
+        return False
+
+    def close(self):
+        pass
+
+
+class LocalStorage(StorageBackend):
+    """
+    本地文件类后端：所有事务在同一个写线程中按提交顺序执行
+    子类实现 begin()/commit()/rollback()，begin() 返回事务句柄
+    """
+
+    def __init__(self):
+        from twisted.internet import reactor
+
+        self.reactor = reactor
+        self.threadpool = ThreadPool(1, 1, f'storage-{self.name}')
+        self.threadpool.start()
+
+    def runInteraction(self, interaction, *args, **kw):
+        return threads.deferToThreadPool(self.reactor, self.threadpool, self._transaction, interaction, *args, **kw)
+
+    def _transaction(self, interaction, *args, **kw):
+        tx = self.begin()
+        try:
+            result = interaction(tx, *args, **kw)
+        except Exception:
+            self.rollback()
+            raise
+        self.commit()
+        return result
+
+    def begin(self):
+        raise NotImplementedError
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.threadpool.stop()
@@ -0,0 +1,60 @@
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+from monitor_price.storage.base import LocalStorage
+
+
+class JsonlStorage(LocalStorage):
+    """
+    只追加的 gzip JSONL 文件后端：每次运行写入 {directory}/{爬虫名}_{时间}.jsonl.gz，
+    每行一条 MonitorPriceItem 字段的记录
+    文件本身不做合并，按写入顺序导入即得到与数据库后端相同的结果：
+    product_code 相同的记录后写覆盖先写，(product_code, scrape_date) 对应一条价格历史
+    """
+
+    name = 'jsonl'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = None
+        self._file = None
+        self._written = set()   # 本次运行已写入的 product_code，用于区分新增/更新
+        super().__init__()
+
+    def open_spider(self, spider):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(
+            self.directory,
+            f"{spider.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+        )
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+
+    def begin(self):
+        return self._file
+
+    def commit(self):
+        self._file.flush()
+
+    def upsert(self, tx, item):
+        """追加一行；文件后端没有主键，product_id 为 None（指纹缓存不会跳过写入）"""
+        product_code = item['product_code']
+        tx.write(json.dumps({
+            'product_code': product_code,
+            'name': item['name'],
+            'category': item['category'],
+            'brand': item['brand'],
+            'model': item['model'],
+            'avg_price': str(item['avg_price']),
+            'scrape_date': item['scrape_date'].isoformat() if isinstance(item['scrape_date'], date) else item['scrape_date'],
+        }, ensure_ascii=False) + '\n')
+
+        operation = 'updated' if product_code in self._written else 'inserted'
+        self._written.add(product_code)
+        return (operation, product_code, None)
+
+    def close(self):
+        super().close()
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,233 @@
+import pymysql
+from twisted.enterprise import adbapi
+
+from monitor_price.fingerprints import REBUILD_SQL
+from monitor_price.storage.base import StorageBackend
+
+
+class MySQLStorage(StorageBackend):
+    """
+    MySQL后端（默认），写入 recycle_recycleproduct / recycle_recycleproductprice
+    通过 adbapi 连接池异步执行
+    """
+
+    name = 'mysql'
+
+    def __init__(self, dbpool, target='mysql://'):
+        self.dbpool = dbpool
+        self.target = target
+
+    @staticmethod
+    def target_of(settings):
+        """连接的数据库（价格指纹按此区分）"""
+        host = getattr(settings, 'MYSQL_HOST', 'localhost')
+        port = getattr(settings, 'MYSQL_PORT', 3306)
+        return f'mysql://{host}:{port}/{settings.MYSQL_DB}'
+
+    @classmethod
+    def from_settings(cls, settings):
+        """settings 为 monitor_price.settings 模块"""
+        db_params = {
+            'host': settings.MYSQL_HOST if hasattr(settings, 'MYSQL_HOST') else 'localhost',
+            'port': settings.MYSQL_PORT if hasattr(settings, 'MYSQL_PORT') else 3306,
+            'user': settings.MYSQL_USER if hasattr(settings, 'MYSQL_USER') else 'root',
+            'password': settings.MYSQL_PASSWORD,
+            'db': settings.MYSQL_DB,
+            'charset': settings.MYSQL_CHARSET if hasattr(settings, 'MYSQL_CHARSET') else 'utf8mb4',
+            'use_unicode': True,
+            'cursorclass': pymysql.cursors.DictCursor
+        }
+        return cls(adbapi.ConnectionPool('pymysql', **db_params), target=cls.target_of(settings))
+
+    def runInteraction(self, interaction, *args, **kw):
+        return self.dbpool.runInteraction(interaction, *args, **kw)
+
+    def upsert(self, tx, item):
+        """
+        执行数据库插入或更新操作
+        逻辑：
+        1. INSERT ... ON DUPLICATE KEY UPDATE 写入产品记录（id = LAST_INSERT_ID(id) 取回主键）
+        2. 幂等写入当天价格到 recycle_recycleproductprice（同一天重复爬取只更新价格）
+        """
+        product_code = item['product_code']
+
+        upsert_sql = """
+            INSERT INTO `recycle_recycleproduct`
+            (product_code, name, category, brand, model, avg_price, scrape_date, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                id = LAST_INSERT_ID(id),
+                name = VALUES(name),
+                category = VALUES(category),
+                brand = VALUES(brand),
+                model = VALUES(model),
+                avg_price = VALUES(avg_price),
+                scrape_date = VALUES(scrape_date)
+        """
+        tx.execute(upsert_sql, (
+            product_code,
+            item['name'],
+            item['category'],
+            item['brand'],
+            item['model'],
+            item['avg_price'],
+            item['scrape_date']
+        ))
+
+        # 受影响行数：1 = 新插入，2 = 已存在且有变化，0 = 已存在且无变化
+        operation = 'inserted' if tx.rowcount == 1 else 'updated'
+        product_id = tx.lastrowid
+        if not product_id:
+            tx.execute("SELECT id FROM `recycle_recycleproduct` WHERE product_code = %s", (product_code,))
+            product_id = tx.fetchone()['id']
+
+        self._insert_prices(tx, [(product_id, item['scrape_date'], item['avg_price'])])
+
+        return (operation, product_code, product_id)
+
+    def touch(self, tx, item):
+        """
+        指纹命中（价格和名称未变化）时的轻量写入
+        只更新scrape_date并写入当天价格；记录已不存在时退回完整写入
+        """
+        product_code = item['product_code']
+        product_id = item['product_id']
+
+        tx.execute("""
+            UPDATE `recycle_recycleproduct`
+            SET scrape_date = %s
+            WHERE id = %s AND product_code = %s
+        """, (item['scrape_date'], product_id, product_code))
+        if tx.rowcount == 0:
+            return self.upsert(tx, item)
+
+        self._insert_prices(tx, [(product_id, item['scrape_date'], item['avg_price'])])
+
+        return ('touched', product_code, product_id)
+
+    def batch_upsert(self, tx, items):
+        """
+        批量执行插入或更新操作（一个事务）
+        逻辑：
+        1. 有指纹的记录（item['product_id']）直接使用指纹中的主键，其余记录查询是否存在（区分新增/更新、取得主键）
+        2. 全部记录（包括只有日期变化的）用一条多行 INSERT ... ON DUPLICATE KEY UPDATE 写入，再取回新增记录的主键
+        3. 多行幂等写入当天价格；指纹中的主键已失效（记录被删除后上一步重新插入）时
+           外键检查失败，重新查询这些记录的主键后再写入
+        整批都有指纹时只执行两条语句（没有指纹时为三到四条）
+        返回：
+            与items一一对应的 (operation, product_code, product_id) 列表
+        """
+        results = {}
+        product_ids = {}
+
+        # 1. 有指纹的记录使用指纹中的主键，其余记录查询是否已存在
+        for item in items:
+            if item.get('product_id'):
+                product_ids[item['product_code']] = item['product_id']
+                results[item['product_code']] = 'touched' if item.get('date_only') else 'updated'
+        codes = [item['product_code'] for item in items if not item.get('product_id')]
+        existing_ids = self._select_product_ids(tx, codes) if codes else {}
+
+        # 2. 一条多行写入
+        params = []
+        for item in items:
+            params.extend((
+                item['product_code'],
+                item['name'],
+                item['category'],
+                item['brand'],
+                item['model'],
+                item['avg_price'],
+                item['scrape_date']
+            ))
+
+        values = ', '.join(["(%s, %s, %s, %s, %s, %s, %s, NOW())"] * len(items))
+        upsert_sql = f"""
+            INSERT INTO `recycle_recycleproduct`
+            (product_code, name, category, brand, model, avg_price, scrape_date, created_at)
+            VALUES {values}
+            ON DUPLICATE KEY UPDATE
+                name = VALUES(name),
+                category = VALUES(category),
+                brand = VALUES(brand),
+                model = VALUES(model),
+                avg_price = VALUES(avg_price),
+                scrape_date = VALUES(scrape_date)
+        """
+        tx.execute(upsert_sql, params)
+
+        for code in codes:
+            results[code] = 'updated' if code in existing_ids else 'inserted'
+        product_ids.update(existing_ids)
+
+        new_codes = [code for code in codes if code not in existing_ids]
+        if new_codes:
+            product_ids.update(self._select_product_ids(tx, new_codes))
+
+        # 3. 写入当天价格
+        def price_rows():
+            return [
+                (product_ids[item['product_code']], item['scrape_date'], item['avg_price'])
+                for item in items
+            ]
+
+        try:
+            self._insert_prices(tx, price_rows())
+        except pymysql.IntegrityError:
+            # 指纹过期（数据库被修改或恢复）：按编号取回有指纹的记录的实际主键
+            known = [item['product_code'] for item in items if item.get('product_id')]
+            actual_ids = self._select_product_ids(tx, known)
+            for code in known:
+                if actual_ids[code] != product_ids[code]:
+                    product_ids[code] = actual_ids[code]
+                    results[code] = 'inserted'
+            self._insert_prices(tx, price_rows())
+
+        return [
+            (results[item['product_code']], item['product_code'], product_ids[item['product_code']])
+            for item in items
+        ]
+
+    def _select_product_ids(self, tx, codes):
+        """按product_code批量查询主键，返回 {product_code: id}"""
+        placeholders = ', '.join(['%s'] * len(codes))
+        tx.execute(f"""
+            SELECT id, product_code
+            FROM `recycle_recycleproduct`
+            WHERE product_code IN ({placeholders})
+        """, codes)
+        return {row['product_code']: row['id'] for row in tx.fetchall()}
+
+    def _insert_prices(self, tx, rows):
+        """
+        幂等写入价格历史
+        参数：
+            rows: [(product_id, date, price), ...]
+        同一产品同一天重复写入时只更新价格（依赖 (product_id, date) 唯一索引）
+        """
+        values = ', '.join(['(%s, %s, %s)'] * len(rows))
+        tx.execute(f"""
+            INSERT INTO `recycle_recycleproductprice` (product_id, date, price)
+            VALUES {values}
+            ON DUPLICATE KEY UPDATE price = VALUES(price)
+        """, [value for row in rows for value in row])
+
+    def fetch_fingerprint_rows(self, tx):
+        """读取重建价格指纹所需的字段"""
+        tx.execute(REBUILD_SQL)
+        return [
+            (row['product_code'], row['id'], row['avg_price'], row['scrape_date'],
+             row['name'], row['category'], row['brand'], row['model'])
+            for row in tx.fetchall()
+        ]
+
+    def bump_data_version(self, tx, name):
+        tx.execute("""
+            INSERT INTO `recycle_dataversion` (name, version, updated_at)
+            VALUES (%s, 1, UTC_TIMESTAMP(6))
+            ON DUPLICATE KEY UPDATE version = version + 1, updated_at = VALUES(updated_at)
+        """, (name,))
+        return True
+
+    def close(self):
+        self.dbpool.close()
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+from datetime import date, datetime
+
+from monitor_price.storage.base import LocalStorage
+
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS recycle_recycleproduct (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_code TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        brand TEXT NOT NULL,
+        model TEXT NOT NULL,
+        avg_price TEXT NOT NULL,
+        scrape_date TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS recycle_recycleproductprice (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL REFERENCES recycle_recycleproduct (id) ON DELETE CASCADE,
+        date TEXT NOT NULL,
+        price TEXT NOT NULL,
+        UNIQUE (product_id, date)
+    );
+"""
+
+
+class SQLiteStorage(LocalStorage):
+    """
+    SQLite后端（WAL模式），表结构与 recycle 应用的两张表一致，
+    适合没有数据库访问权限的爬虫机器，爬取结果之后再导入MySQL
+    价格和日期以文本保存（Decimal 原样、YYYY-MM-DD）
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.target = 'sqlite://' + os.path.abspath(path)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        super().__init__()
+
+    def begin(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn.cursor()
+
+    def commit(self):
+        self.conn.execute('COMMIT')
+
+    def rollback(self):
+        self.conn.execute('ROLLBACK')
+
+    def upsert(self, tx, item):
+        """
+        INSERT ... ON CONFLICT(product_code) DO UPDATE 写入产品记录，
+        并幂等写入当天价格（同一天重复写入只更新价格）
+        """
+        product_code = item['product_code']
+        scrape_date = _iso(item['scrape_date'])
+
+        row = tx.execute(
+            'SELECT id FROM recycle_recycleproduct WHERE product_code = ?', (product_code,)
+        ).fetchone()
+        tx.execute("""
+            INSERT INTO recycle_recycleproduct
+            (product_code, name, category, brand, model, avg_price, scrape_date, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (product_code) DO UPDATE SET
+                name = excluded.name,
+                category = excluded.category,
+                brand = excluded.brand,
+                model = excluded.model,
+                avg_price = excluded.avg_price,
+                scrape_date = excluded.scrape_date
+        """, (
+            product_code,
+            item['name'],
+            item['category'],
+            item['brand'],
+            item['model'],
+            str(item['avg_price']),
+            scrape_date,
+            datetime.now().isoformat(sep=' ', timespec='seconds'),
+        ))
+
+        if row is None:
+            operation, product_id = 'inserted', tx.lastrowid
+        else:
+            operation, product_id = 'updated', row[0]
+
+        self._insert_price(tx, product_id, scrape_date, item['avg_price'])
+
+        return (operation, product_code, product_id)
+
+    def touch(self, tx, item):
+        """只更新scrape_date并写入当天价格；记录已不存在时退回完整写入"""
+        scrape_date = _iso(item['scrape_date'])
+        tx.execute(
+            'UPDATE recycle_recycleproduct SET scrape_date = ? WHERE id = ? AND product_code = ?',
+            (scrape_date, item['product_id'], item['product_code'])
+        )
+        if tx.rowcount == 0:
+            return self.upsert(tx, item)
+
+        self._insert_price(tx, item['product_id'], scrape_date, item['avg_price'])
+
+        return ('touched', item['product_code'], item['product_id'])
+
+    def _insert_price(self, tx, product_id, scrape_date, price):
+        tx.execute("""
+            INSERT INTO recycle_recycleproductprice (product_id, date, price)
+            VALUES (?, ?, ?)
+            ON CONFLICT (product_id, date) DO UPDATE SET price = excluded.price
+        """, (product_id, scrape_date, str(price)))
+
+    def fetch_fingerprint_rows(self, tx):
+        rows = tx.execute("""
+            SELECT product_code, id, avg_price, scrape_date, name, category, brand, model
+            FROM recycle_recycleproduct
+        """).fetchall()
+        return [
+            (code, product_id, avg_price, date.fromisoformat(scrape_date), name, category, brand, model)
+            for code, product_id, avg_price, scrape_date, name, category, brand, model in rows
+        ]
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, date) else str(value)
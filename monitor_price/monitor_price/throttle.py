@@ -0,0 +1,156 @@
+# 按域名自适应调整并发和下载间隔（AIMD）
+#
+# 对 AIMD_DOMAINS 中的域名：
+# - 响应正常（状态码200、延迟不超过 AIMD_TARGET_LATENCY）时加性增加：
+#   每收到约一个窗口数量的正常响应，并发窗口 +1，下载间隔 -AIMD_DELAY_STEP
+# - 出现拥塞信号（拥塞状态码、延迟超标、接口返回无法解析的内容）时乘性减少：
+#   并发窗口减半，下载间隔翻倍；同一轮（减少之前发出的请求）的信号只处理一次
+# 窗口和间隔只应用到该域名的下载槽（含按品牌划分的槽）：窗口为每个槽的并发数，间隔为每个槽的下载间隔；
+# 不修改下载器的总并发数（CONCURRENT_REQUESTS），一个域名变慢不会限制其他域名。
+# 默认关闭（AIMD_ENABLED=1 开启）。当前窗口和间隔写入统计信息 aimd/<域名>/window、aimd/<域名>/delay。
+
+import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+
+# 爬虫解析接口失败时发送（参数 request, spider），作为拥塞信号
+response_parse_failed = object()
+
+
+class DomainWindow:
+    """单个域名的并发窗口和下载间隔"""
+
+    def __init__(self, window, delay):
+        self.window = float(window)
+        self.delay = float(delay)
+        self.successes = 0
+        self.last_decrease = 0.0
+
+
+class AimdThrottle:
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('AIMD_ENABLED'):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.domains = set(settings.getlist('AIMD_DOMAINS'))
+        self.min_window = settings.getint('AIMD_MIN_CONCURRENCY', 1)
+        self.max_window = settings.getint('AIMD_MAX_CONCURRENCY', 2)
+        self.min_delay = settings.getfloat('AIMD_MIN_DELAY', 0.5)
+        self.max_delay = settings.getfloat('AIMD_MAX_DELAY', 30)
+        self.delay_step = settings.getfloat('AIMD_DELAY_STEP', 0.25)
+        self.target_latency = settings.getfloat('AIMD_TARGET_LATENCY', 2.0)
+        self.congestion_status = {int(status) for status in settings.getlist('AIMD_CONGESTION_STATUS')}
+        self.start_window = settings.getint('AIMD_START_CONCURRENCY', self.min_window)
+        self.start_delay = settings.getfloat('AIMD_START_DELAY', settings.getfloat('DOWNLOAD_DELAY'))
+
+        self.windows = {}      # 域名 -> DomainWindow
+        self.slot_domains = {} # 下载槽 -> 域名（下载槽空闲一段时间后会被回收，应用时跳过已回收的槽）
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(self.response_received, signal=signals.response_received)
+        crawler.signals.connect(self.parse_failed, signal=response_parse_failed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    @property
+    def downloader(self):
+        return self.crawler.engine.downloader
+
+    def spider_opened(self, spider):
+        for domain in self.domains:
+            self.windows[domain] = DomainWindow(
+                max(self.min_window, min(self.start_window, self.max_window)),
+                max(self.min_delay, min(self.start_delay, self.max_delay)),
+            )
+        self._apply()
+
+    def request_reached_downloader(self, request, spider):
+        """请求进入下载槽时，让该槽使用域名当前的窗口和间隔（新建或回收后重建的槽也能及时生效）"""
+        domain = self._domain(request)
+        if domain is None:
+            return
+        slot_key = request.meta.get('download_slot')
+        self.slot_domains[slot_key] = domain
+        slot = self.downloader.slots.get(slot_key)
+        if slot is not None:
+            self._apply_slot(slot, self.windows[domain])
+
+    def response_received(self, response, request, spider):
+        domain = self._domain(request)
+        if domain is None:
+            return
+        latency = request.meta.get('download_latency')
+        if response.status in self.congestion_status:
+            self._decrease(domain, request, f'状态码 {response.status}')
+        elif latency is not None and latency > self.target_latency:
+            self._decrease(domain, request, f'延迟 {latency:.2f}s')
+        elif response.status == 200:
+            self._increase(domain)
+
+    def parse_failed(self, request, spider):
+        domain = self._domain(request)
+        if domain is not None:
+            self._decrease(domain, request, '接口返回内容无法解析')
+
+    def _domain(self, request):
+        host = urlparse_cached(request).hostname
+        return host if host in self.windows else None
+
+    def _increase(self, domain):
+        state = self.windows[domain]
+        state.successes += 1
+        if state.successes < state.window:
+            return
+        state.successes = 0
+        state.window = min(self.max_window, state.window + 1)
+        state.delay = max(self.min_delay, state.delay - self.delay_step)
+        self.stats.inc_value(f'aimd/{domain}/increases')
+        self._apply(domain)
+
+    def _decrease(self, domain, request, reason):
+        state = self.windows[domain]
+        # 在上次减少之前发出的请求属于同一轮拥塞，不重复减少
+        sent_at = time.time() - request.meta.get('download_latency', 0)
+        if sent_at < state.last_decrease:
+            return
+        state.last_decrease = time.time()
+        state.successes = 0
+        state.window = max(self.min_window, state.window / 2)
+        state.delay = min(self.max_delay, max(state.delay * 2, self.min_delay))
+        self.stats.inc_value(f'aimd/{domain}/decreases')
+        self.crawler.spider.logger.info(
+            f'{domain} 出现拥塞（{reason}），每个下载槽的并发降为 {int(state.window)}，下载间隔 {state.delay:.2f}s'
+        )
+        self._apply(domain)
+
+    @staticmethod
+    def _apply_slot(slot, state):
+        slot.concurrency = int(state.window)
+        slot.delay = state.delay
+
+    def _apply(self, domain=None):
+        """把窗口和间隔应用到该域名（为 None 时为所有域名）的下载槽，并更新统计信息"""
+        domains = self.windows if domain is None else [domain]
+        slots = self.downloader.slots
+        for slot_key, slot_domain in list(self.slot_domains.items()):
+            slot = slots.get(slot_key)
+            if slot is None:
+                del self.slot_domains[slot_key]
+            elif slot_domain in domains:
+                self._apply_slot(slot, self.windows[slot_domain])
+        for domain in domains:
+            state = self.windows[domain]
+            self.stats.set_value(f'aimd/{domain}/window', int(state.window))
+            self.stats.set_value(f'aimd/{domain}/delay', round(state.delay, 3))
+            self.stats.max_value(f'aimd/{domain}/window_max', int(state.window))
+            self.stats.min_value(f'aimd/{domain}/window_min', int(state.window))
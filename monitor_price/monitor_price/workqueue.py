@@ -0,0 +1,312 @@
+# 分布式爬取任务队列（租约/确认）
+#
+# 每个任务是 分类 × 品牌 × 页码 的一次列表页请求，任务编号为 "分类:品牌:页码"。
+# 多个爬虫进程（可以在不同机器上）从同一个队列领取任务：
+# - lease()：领取一批任务，租约在 lease_seconds 秒后到期；到期仍未确认的任务自动回到队列
+# - ack()：任务完成（该页的item已全部写入），不会再被领取
+# - fail()：任务多次失败后放弃，同样不再领取
+# ack/fail/release 只在租约仍属于调用的进程时生效：租约到期后任务被其他进程重新领取，
+# 原进程迟到的确认不会影响新的租约（返回 False）
+# - seed()：加入任务，已存在或已完成的任务不会重复加入，因此每个进程都可以重复提交
+# 队列按名称（默认 爬虫名_日期）区分，进程被杀掉后用同一个名称重新启动即可从中断处继续。
+#
+# 后端：
+#     sqlite  本机多个进程共享一个SQLite文件
+#     redis   多台机器共享一个Redis（或兼容Redis协议的服务），需要安装 redis
+#
+# 查看进度：
+#     python -m monitor_price.workqueue stats --name suning_all_20250928
+
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+
+Task = namedtuple('Task', ['task_id', 'payload'])
+
+
+def task_id(category_key, brand_code, page):
+    return f'{category_key}:{brand_code}:{page}'
+
+
+class SQLiteWorkQueue:
+    """基于SQLite文件的任务队列，领取任务时用 BEGIN IMMEDIATE 保证多个进程不会领到同一个任务"""
+
+    def __init__(self, path, name, lease_seconds=600):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.name = name
+        self.lease_seconds = lease_seconds
+
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_task (
+                queue TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                available_at REAL NOT NULL DEFAULT 0,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (queue, task_id)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS crawl_task_available ON crawl_task (queue, state, available_at)')
+
+    def seed(self, tasks):
+        """加入任务（可迭代的 Task），返回新加入的数量"""
+        rows = [
+            (self.name, task.task_id, json.dumps(task.payload, ensure_ascii=False), task.payload.get('page', 1))
+            for task in tasks
+        ]
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO crawl_task (queue, task_id, payload, page) VALUES (?, ?, ?, ?)', rows
+            )
+            added = self.conn.total_changes - before
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def lease(self, worker, count):
+        """领取最多 count 个任务（待领取的，或租约已到期的），页码小的优先"""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = self.conn.execute("""
+                SELECT task_id, payload FROM crawl_task
+                WHERE queue = ? AND state = 'pending' AND available_at <= ?
+                ORDER BY page, task_id
+                LIMIT ?
+            """, (self.name, now, count)).fetchall()
+            self.conn.executemany(
+                'UPDATE crawl_task SET available_at = ?, worker = ?, attempts = attempts + 1 '
+                'WHERE queue = ? AND task_id = ?',
+                [(now + self.lease_seconds, worker, self.name, row[0]) for row in rows]
+            )
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return [Task(row[0], json.loads(row[1])) for row in rows]
+
+    def ack(self, task_id, worker):
+        return self._update("state = 'done'", task_id, worker)
+
+    def fail(self, task_id, worker):
+        return self._update("state = 'failed'", task_id, worker)
+
+    def release(self, task_id, worker):
+        """放回队列，立即可以被再次领取（例如进程正常退出时未处理的任务）"""
+        return self._update('available_at = 0, worker = NULL', task_id, worker)
+
+    def _update(self, assignment, task_id, worker):
+        """更新 worker 领取的未完成任务，租约已被其他进程领取时不更新，返回是否更新"""
+        cursor = self.conn.execute(
+            f"UPDATE crawl_task SET {assignment} WHERE queue = ? AND task_id = ? AND state = 'pending' AND worker = ?",
+            (self.name, task_id, worker)
+        )
+        return cursor.rowcount > 0
+
+    def stats(self):
+        """返回 {'pending': 待领取, 'leased': 租约中, 'done': 完成, 'failed': 放弃}"""
+        now = time.time()
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        for state, leased, count in self.conn.execute("""
+            SELECT state, state = 'pending' AND available_at > ?, COUNT(*)
+            FROM crawl_task WHERE queue = ? GROUP BY 1, 2
+        """, (now, self.name)):
+            counts['leased' if leased else state] += count
+        return counts
+
+    def close(self):
+        self.conn.close()
+
+
+class RedisWorkQueue:
+    """
+    基于Redis的任务队列，键：
+        {prefix}:queue    有序集合，未完成的任务，分数为可领取时间（待领取为页码，租约中为到期时间）
+        {prefix}:payload  哈希，任务参数
+        {prefix}:owner    哈希，租约所属的进程
+        {prefix}:done / {prefix}:failed  集合，已完成/放弃的任务
+    加入、领取和确认任务都用 WATCH/MULTI 乐观锁，不依赖Lua脚本
+    """
+
+    def __init__(self, client, name, lease_seconds=600, key_prefix='monitor_price:workqueue'):
+        self.client = client
+        self.name = name
+        self.lease_seconds = lease_seconds
+        prefix = f'{key_prefix}:{name}'
+        self.queue_key = f'{prefix}:queue'
+        self.payload_key = f'{prefix}:payload'
+        self.owner_key = f'{prefix}:owner'
+        self.done_key = f'{prefix}:done'
+        self.failed_key = f'{prefix}:failed'
+
+    @classmethod
+    def from_url(cls, url, name, lease_seconds=600):
+        import redis
+
+        return cls(redis.Redis.from_url(url), name, lease_seconds)
+
+    def seed(self, tasks):
+        import redis
+
+        tasks = list(tasks)
+        if not tasks:
+            return 0
+        while True:
+            with self.client.pipeline() as pipe:
+                try:
+                    # 检查期间有任务完成或放弃时重试，避免把刚完成的任务重新加入队列
+                    pipe.watch(self.done_key, self.failed_key)
+                    check = self.client.pipeline(transaction=False)
+                    for task in tasks:
+                        check.sismember(self.done_key, task.task_id)
+                        check.sismember(self.failed_key, task.task_id)
+                    finished = check.execute()
+                    new_tasks = [
+                        task for index, task in enumerate(tasks)
+                        if not (finished[2 * index] or finished[2 * index + 1])
+                    ]
+                    if not new_tasks:
+                        pipe.unwatch()
+                        return 0
+                    pipe.multi()
+                    for task in new_tasks:
+                        pipe.hsetnx(self.payload_key, task.task_id, json.dumps(task.payload, ensure_ascii=False))
+                    # 待领取任务的分数为页码（远小于当前时间戳），领取时页码小的优先
+                    pipe.zadd(
+                        self.queue_key, {task.task_id: task.payload.get('page', 1) for task in new_tasks}, nx=True
+                    )
+                    return pipe.execute()[-1]
+                except redis.WatchError:
+                    continue
+
+    def lease(self, worker, count):
+        import redis
+
+        while True:
+            with self.client.pipeline() as pipe:
+                try:
+                    pipe.watch(self.queue_key)
+                    now = time.time()
+                    ids = pipe.zrangebyscore(self.queue_key, '-inf', now, start=0, num=count)
+                    if not ids:
+                        pipe.unwatch()
+                        return []
+                    pipe.multi()
+                    pipe.zadd(self.queue_key, {task: now + self.lease_seconds for task in ids}, xx=True)
+                    pipe.hset(self.owner_key, mapping={task: worker for task in ids})
+                    pipe.hmget(self.payload_key, ids)
+                    payloads = pipe.execute()[-1]
+                except redis.WatchError:
+                    continue  # 其他进程同时领取了任务，重试
+            return [
+                Task(task.decode('utf-8'), json.loads(payload) if payload else {})
+                for task, payload in zip(ids, payloads)
+            ]
+
+    def ack(self, task_id, worker):
+        return self._update(task_id, worker, self.done_key)
+
+    def fail(self, task_id, worker):
+        return self._update(task_id, worker, self.failed_key)
+
+    def release(self, task_id, worker):
+        return self._update(task_id, worker)
+
+    def _update(self, task_id, worker, finished_key=None):
+        """
+        租约仍属于 worker 时完成/放弃任务（finished_key），或放回队列（finished_key 为 None），返回是否更新
+        比较租约所属进程和更新在同一个事务中，期间有进程领取任务时重试
+        """
+        import redis
+
+        while True:
+            with self.client.pipeline() as pipe:
+                try:
+                    pipe.watch(self.owner_key)
+                    owner = pipe.hget(self.owner_key, task_id)
+                    if owner is None or owner.decode('utf-8') != worker:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    if finished_key is None:
+                        pipe.zadd(self.queue_key, {task_id: 0}, xx=True)
+                    else:
+                        pipe.zrem(self.queue_key, task_id)
+                        pipe.sadd(finished_key, task_id)
+                    pipe.hdel(self.owner_key, task_id)
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+
+    def stats(self):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zcount(self.queue_key, '-inf', time.time())
+        pipe.zcard(self.queue_key)
+        pipe.scard(self.done_key)
+        pipe.scard(self.failed_key)
+        available, unfinished, done, failed = pipe.execute()
+        return {'pending': available, 'leased': unfinished - available, 'done': done, 'failed': failed}
+
+    def close(self):
+        self.client.close()
+
+
+def open_workqueue(settings, name):
+    """按 WORKQUEUE_BACKEND 打开任务队列（settings 为 Scrapy Settings）"""
+    backend = settings.get('WORKQUEUE_BACKEND')
+    lease_seconds = settings.getint('WORKQUEUE_LEASE_SECONDS', 600)
+    if backend == 'sqlite':
+        return SQLiteWorkQueue(settings.get('WORKQUEUE_SQLITE_PATH'), name, lease_seconds)
+    if backend == 'redis':
+        return RedisWorkQueue.from_url(settings.get('WORKQUEUE_REDIS_URL'), name, lease_seconds)
+    raise ValueError(f'未知的任务队列后端: {backend}（可选: sqlite, redis）')
+
+
+def main(argv=None):
+    import argparse
+    from datetime import datetime
+
+    from scrapy.settings import Settings
+
+    parser = argparse.ArgumentParser(description='爬取任务队列')
+    parser.add_argument('command', choices=['stats'])
+    parser.add_argument('--name', default=f"suning_all_{datetime.now().strftime('%Y%m%d')}", help='队列名称')
+    parser.add_argument('--backend', default=None, help='sqlite / redis，默认使用 WORKQUEUE_BACKEND')
+    args = parser.parse_args(argv)
+
+    settings = Settings()
+    settings.setmodule('monitor_price.settings')
+    if args.backend:
+        settings.set('WORKQUEUE_BACKEND', args.backend)
+
+    queue = open_workqueue(settings, args.name)
+    try:
+        counts = queue.stats()
+    finally:
+        queue.close()
+    total = sum(counts.values())
+    print(f'{args.name}: 共 {total} 个任务，' + '，'.join(
+        f'{label} {counts[key]}' for key, label in
+        (('pending', '待领取'), ('leased', '租约中'), ('done', '完成'), ('failed', '放弃'))
+    ))
+
+
+if __name__ == '__main__':
+    main()
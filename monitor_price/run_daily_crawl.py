@@ -0,0 +1,44 @@
+"""
+每日爬取脚本（定时任务调用）
+
+使用方法:
+  python run_daily_crawl.py                              # 一个进程爬取全部分类
+  python run_daily_crawl.py --categories phone,computer  # 只爬取指定分类
+
+所有分类由 suning_all 爬虫在同一个进程中爬取，共用下载器、数据库连接池和去重状态；
+分类配置见 monitor_price/categories.py。日志写入 logs/crawl_YYYYmmdd.log。
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='每日爬取苏宁回收价格')
+    parser.add_argument('--categories', default=None, help='逗号分隔的分类键（默认使用 SUNING_CATEGORIES 配置）')
+    args = parser.parse_args(argv)
+
+    # 定时任务的工作目录不一定是项目目录，切换后才能找到 scrapy.cfg 和相对路径的数据目录
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    os.makedirs('logs', exist_ok=True)
+
+    settings = get_project_settings()
+    settings.set('LOG_FILE', os.path.join('logs', f"crawl_{datetime.now().strftime('%Y%m%d')}.log"))
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler('suning_all')
+    process.crawl(crawler, categories=args.categories)
+    process.start()
+
+    reason = crawler.stats.get_value('finish_reason')
+    print(f"爬取结束: {reason}，共 {crawler.stats.get_value('item_scraped_count', 0)} 条数据")
+    return 0 if reason == 'finished' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# 在 monitor_price 目录下运行：python -m pytest tests
+
+import unittest
+
+from monitor_price import codeset
+from monitor_price.codeset import CompactCodeSet, pack_code, unpack_code
+
+
+class PackCodeTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for code in ['P160831000000004', 'A1', 'Z9999999999999999', '0001', '000000000000042', '7']:
+            self.assertEqual(unpack_code(pack_code(code)), code)
+
+    def test_leading_zeros_are_distinct(self):
+        self.assertNotEqual(pack_code('P01'), pack_code('P1'))
+        self.assertNotEqual(pack_code('01'), pack_code('1'))
+
+    def test_unpackable_codes(self):
+        for code in ['', 'P', 'p123', 'PP123', 'P12345678901234567', '手机_Apple_iPhone 14', 'P12a', 'P１２']:
+            self.assertIsNone(pack_code(code), code)
+
+
+class CompactCodeSetTest(unittest.TestCase):
+
+    def test_behaves_like_set(self):
+        codes = ['P160831000000004', 'P160831000000005', '000123', '手机_Apple_iPhone 14', 'P1']
+        compact = CompactCodeSet(codes)
+        expected = set(codes)
+
+        compact.add('P160831000000004')
+        compact.add('手机_Apple_iPhone 14')
+        self.assertEqual(len(compact), len(expected))
+        for code in codes:
+            self.assertIn(code, compact)
+        self.assertNotIn('P160831000000006', compact)
+        self.assertNotIn('00123', compact)
+        self.assertNotIn('其他', compact)
+
+        compact.discard('P1')
+        compact.discard('手机_Apple_iPhone 14')
+        compact.discard('P999')  # 不存在时不报错
+        expected -= {'P1', '手机_Apple_iPhone 14'}
+        self.assertEqual(set(compact), expected)
+        self.assertEqual(len(compact), len(expected))
+
+    def test_merge_keeps_order_and_membership(self):
+        # 调小缓冲区阈值，多次合并后与 set 结果一致
+        old = codeset._MIN_BUFFER
+        codeset._MIN_BUFFER = 8
+        try:
+            compact = CompactCodeSet()
+            expected = set()
+            for number in range(0, 3000, 7):
+                code = 'P%016d' % ((number * 7919) % 100003)
+                compact.add(code)
+                expected.add(code)
+            for number in range(0, 3000, 21):
+                code = 'P%016d' % ((number * 7919) % 100003)
+                compact.discard(code)
+                expected.discard(code)
+            self.assertEqual(len(compact), len(expected))
+            self.assertEqual(set(compact), expected)
+            self.assertEqual(list(compact._sorted), sorted(compact._sorted))
+            for code in expected:
+                self.assertIn(code, compact)
+        finally:
+            codeset._MIN_BUFFER = old
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# 在 monitor_price 目录下运行：python -m pytest tests
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from twisted.internet import asyncioreactor
+from twisted.internet.error import ReactorAlreadyInstalledError
+
+# Scrapy 默认使用 asyncio 反应器，必须在导入 scrapy 的爬虫和管道之前安装
+try:
+    asyncioreactor.install()
+except ReactorAlreadyInstalledError:
+    pass
+
+from scrapy.http import Request, TextResponse
+from scrapy.utils.test import get_crawler
+
+from monitor_price.decoding import decode_listing
+from monitor_price.page_fingerprints import PageFingerprintStore, page_digest
+from monitor_price.pipelines import item_stored
+from monitor_price.spiders.suning_all import SuningAllSpider
+
+
+def list_items(page):
+    return [
+        {'itemCode': f'P{page}{index}', 'itemName': 'Apple iPhone 14', 'averagePrice': str(5000 + index)}
+        for index in range(3)
+    ]
+
+
+def digest_of(items):
+    body = json.dumps({'totalPage': 1, 'listItem': items}).encode('utf-8')
+    return page_digest(decode_listing(body).items)
+
+
+class PageFingerprintStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = PageFingerprintStore(os.path.join(self.tmpdir.name, 'pages.sqlite3'), full_sweep_days=7)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_sweep_due(self):
+        with mock.patch('monitor_price.page_fingerprints.time.time', return_value=1000.0):
+            self.store.save('phone', 'b1', 2, 'x')
+            self.store.save('phone', 'b1', 3, 'y')
+        with mock.patch('monitor_price.page_fingerprints.time.time', return_value=1000.0 + 86400):
+            self.assertFalse(self.store.sweep_due('phone', 'b1', 2, 3))
+            # 第4页从未输出过
+            self.assertTrue(self.store.sweep_due('phone', 'b1', 2, 4))
+        with mock.patch('monitor_price.page_fingerprints.time.time', return_value=1000.0 + 7 * 86400 + 1):
+            self.assertTrue(self.store.sweep_due('phone', 'b1', 2, 3))
+
+
+class StopPaginationTest(unittest.TestCase):
+    """增量爬取时逐页翻页，遇到未变化的页面停止"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        crawler = get_crawler(SuningAllSpider, {
+            'INCREMENTAL_CRAWL_ENABLED': True,
+            'INCREMENTAL_STORE_PATH': os.path.join(self.tmpdir.name, 'pages.sqlite3'),
+        })
+        self.spider = SuningAllSpider.from_crawler(crawler)
+        self.store = self.spider.page_store
+        self.signals = crawler.signals
+        self.stats = crawler.stats
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def parse_page(self, page, total_pages=4, meta=None):
+        request = self.spider.page_request('phone', 'pa00009', 'Apple', page, total_pages=total_pages)
+        request.meta.update(meta or {})
+        body = {'totalPage': total_pages, 'currentPage': page, 'listItem': list_items(page)}
+        response = TextResponse(
+            request.url, body=json.dumps(body).encode('utf-8'), encoding='utf-8', request=request
+        )
+        output = list(self.spider.parse(response))
+        return [r for r in output if isinstance(r, Request)], [r for r in output if not isinstance(r, Request)]
+
+    def save_pages(self, *pages):
+        for page in pages:
+            self.store.save('phone', 'pa00009', page, digest_of(list_items(page)))
+
+    def test_changed_page_requests_only_next_page(self):
+        requests, items = self.parse_page(1)
+        self.assertEqual(len(items), 3)
+        self.assertEqual([(r.meta['page'], r.meta['total_pages']) for r in requests], [(2, 4)])
+
+        # 该页写入后保存摘要
+        for item in items:
+            self.signals.send_catch_log(item_stored, item=item, spider=self.spider, stored=True)
+        self.assertTrue(self.store.unchanged('phone', 'pa00009', 1, digest_of(list_items(1))))
+
+    def test_unchanged_page_stops_pagination(self):
+        self.save_pages(1, 2, 3, 4)
+        requests, items = self.parse_page(1)
+        self.assertEqual((requests, items), ([], []))
+        self.assertEqual(self.stats.get_value('incremental/pages_not_requested'), 3)
+
+    def test_continues_when_later_page_due(self):
+        self.save_pages(1, 2, 4)
+        requests, items = self.parse_page(1)
+        self.assertEqual(items, [])
+        self.assertEqual([r.meta['page'] for r in requests], [2])
+        # 第2页未变化，第3页从未输出，继续翻页
+        requests, _ = self.parse_page(2)
+        self.assertEqual([r.meta['page'] for r in requests], [3])
+
+    def test_skipped_page_continues_pagination(self):
+        request = self.spider.page_request('phone', 'pa00009', 'Apple', 2, retry_count=3, total_pages=4)
+        response = TextResponse(request.url, status=500, body=b'', request=request)
+        requests = list(self.spider.parse(response))
+        self.assertEqual([r.meta['page'] for r in requests], [3])
+
+    def test_disabled_requests_all_pages(self):
+        self.spider.stop_unchanged_pages = False
+        self.save_pages(1, 2, 3, 4)
+        requests, items = self.parse_page(1)
+        self.assertEqual(items, [])
+        self.assertEqual([r.meta['page'] for r in requests], [2, 3, 4])
+        self.assertEqual(self.parse_page(2)[0], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# 在 monitor_price 目录下运行：python -m pytest tests
+
+import unittest
+from datetime import date
+
+from scrapy import Spider
+from twisted.internet import defer
+
+from monitor_price.pipelines import MonitorPricePipeline, item_stored
+
+
+class FakeStorage:
+    """runInteraction 返回由测试控制的 Deferred"""
+
+    name = 'fake'
+    target = None
+
+    def __init__(self):
+        self.queries = []
+
+    def open_spider(self, spider):
+        pass
+
+    def runInteraction(self, interaction, *args):
+        query = defer.Deferred()
+        self.queries.append((query, args))
+        return query
+
+    def upsert(self, tx, item):
+        raise NotImplementedError
+
+    touch = batch_upsert = upsert
+
+
+class FakeSignals:
+
+    def __init__(self):
+        self.sent = []
+
+    def send_catch_log(self, signal, **kwargs):
+        self.sent.append((signal, kwargs['item']['product_code'], kwargs['stored']))
+
+
+def make_item(code):
+    return {
+        'product_code': code, 'name': 'Apple iPhone 14', 'category': '手机', 'brand': 'Apple',
+        'model': 'iPhone 14', 'avg_price': '5800', 'scrape_date': date(2024, 1, 1), 'page_key': 1,
+    }
+
+
+class BackpressureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = FakeStorage()
+        self.signals = FakeSignals()
+        self.spider = Spider(name='test')
+        self.pipeline = MonitorPricePipeline(self.storage, max_inflight=1, max_retries=1, signals=self.signals)
+        # 不经过 reactor 定时，测试中手动触发重试
+        self.pipeline._schedule_retry = lambda: None
+
+    def test_slot_held_until_retry_succeeds(self):
+        self.pipeline.process_item(make_item('P1'), self.spider)
+        waiter = self.pipeline.process_item(make_item('P2'), self.spider)
+        self.assertIsInstance(waiter, defer.Deferred)
+
+        # 第一次写入失败后进入重试队列，仍占用名额，等待中的item不能写入
+        self.storage.queries[0][0].errback(RuntimeError('connection lost'))
+        self.assertEqual(self.pipeline._inflight, 1)
+        self.assertFalse(waiter.called)
+        self.assertEqual(len(self.storage.queries), 1)
+
+        self.pipeline._retry_failed()
+        self.storage.queries[1][0].callback(('inserted', 'P1', 1))
+        self.assertTrue(waiter.called)
+        self.assertEqual(self.pipeline._inflight, 1)
+        self.assertEqual(self.signals.sent, [(item_stored, 'P1', True)])
+
+    def test_slot_released_after_final_failure(self):
+        self.pipeline.max_retries = 0
+        self.pipeline.process_item(make_item('P1'), self.spider)
+        waiter = self.pipeline.process_item(make_item('P2'), self.spider)
+
+        self.storage.queries[0][0].errback(RuntimeError('connection lost'))
+        self.assertTrue(waiter.called)
+        self.assertEqual(self.signals.sent, [(item_stored, 'P1', False)])
+
+    def test_queued_write_error_does_not_escape(self):
+        self.pipeline.process_item(make_item('P1'), self.spider)
+        waiter = self.pipeline.process_item(make_item('P2'), self.spider)
+
+        def broken(*args):
+            raise RuntimeError('broken')
+
+        self.pipeline._run_interaction = broken
+        # 释放名额的写入回调不受等待中item的异常影响，该item通知爬虫未写入
+        self.storage.queries[0][0].callback(('inserted', 'P1', 1))
+        self.assertEqual(self.success_result(waiter)['product_code'], 'P2')
+        self.assertCountEqual(self.signals.sent, [(item_stored, 'P1', True), (item_stored, 'P2', False)])
+        self.assertEqual(self.pipeline._inflight, 0)
+
+    def test_batch_flushes_when_window_full(self):
+        pipeline = MonitorPricePipeline(self.storage, batch_size=100, max_inflight=2, signals=self.signals)
+        pipeline.process_item(make_item('P1'), self.spider)
+        self.assertEqual(self.storage.queries, [])
+        # 名额已满时不等定时刷新，缓冲区立即写入
+        pipeline.process_item(make_item('P2'), self.spider)
+        self.assertEqual(len(self.storage.queries), 1)
+        self.assertEqual(len(self.storage.queries[0][1][0]), 2)
+
+    def success_result(self, d):
+        results = []
+        d.addBoth(results.append)
+        self.assertEqual(len(results), 1)
+        self.assertNotIsInstance(results[0], Exception)
+        return results[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
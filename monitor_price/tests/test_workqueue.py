@@ -0,0 +1,223 @@
+# 在 monitor_price 目录下运行：python -m pytest tests
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from twisted.internet import asyncioreactor
+from twisted.internet.error import ReactorAlreadyInstalledError
+
+# Scrapy 默认使用 asyncio 反应器，必须在导入 scrapy 的爬虫和管道之前安装
+try:
+    asyncioreactor.install()
+except ReactorAlreadyInstalledError:
+    pass
+
+from scrapy.http import Request, TextResponse
+from scrapy.utils.test import get_crawler
+
+from monitor_price.pipelines import item_stored
+from monitor_price.spiders.suning_all import SuningAllSpider
+from monitor_price.workqueue import RedisWorkQueue, SQLiteWorkQueue, Task, task_id
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def make_task(page, brand_code='pa00009'):
+    payload = {'category_key': 'phone', 'brand_code': brand_code, 'brand_name': 'Apple', 'page': page}
+    return Task(task_id('phone', brand_code, page), payload)
+
+
+class WorkQueueCases:
+    """SQLite 和 Redis 后端共用的用例"""
+
+    def test_expired_lease_returns_to_queue(self):
+        self.queue.seed([make_task(1)])
+        with mock.patch('monitor_price.workqueue.time.time', return_value=1000.0):
+            self.assertEqual(len(self.queue.lease('a', 1)), 1)
+            self.assertEqual(self.queue.lease('b', 1), [])
+        with mock.patch('monitor_price.workqueue.time.time', return_value=1000.0 + self.queue.lease_seconds + 1):
+            self.assertEqual([task.task_id for task in self.queue.lease('b', 1)], [make_task(1).task_id])
+
+    def test_ack_fail_release(self):
+        done, failed, released = make_task(1), make_task(2), make_task(3)
+        self.queue.seed([done, failed, released])
+        self.assertEqual(len(self.queue.lease('a', 3)), 3)
+
+        self.assertTrue(self.queue.ack(done.task_id, 'a'))
+        self.assertTrue(self.queue.fail(failed.task_id, 'a'))
+        self.assertTrue(self.queue.release(released.task_id, 'a'))
+        self.assertEqual(self.queue.stats(), {'pending': 1, 'leased': 0, 'done': 1, 'failed': 1})
+
+        # 完成和放弃的任务不会重新加入或再被领取
+        self.assertEqual(self.queue.seed([done, failed]), 0)
+        self.assertEqual([task.task_id for task in self.queue.lease('b', 10)], [released.task_id])
+
+    def test_late_ack_after_lease_taken(self):
+        task = make_task(1)
+        self.queue.seed([task])
+        with mock.patch('monitor_price.workqueue.time.time', return_value=1000.0):
+            self.queue.lease('a', 1)
+        with mock.patch('monitor_price.workqueue.time.time', return_value=1000.0 + self.queue.lease_seconds + 1):
+            self.assertEqual(len(self.queue.lease('b', 1)), 1)
+
+            # a 的租约到期后任务由 b 领取，a 迟到的确认、放弃和放回都不生效
+            self.assertFalse(self.queue.ack(task.task_id, 'a'))
+            self.assertFalse(self.queue.fail(task.task_id, 'a'))
+            self.assertFalse(self.queue.release(task.task_id, 'a'))
+            self.assertEqual(self.queue.stats(), {'pending': 0, 'leased': 1, 'done': 0, 'failed': 0})
+
+            self.assertTrue(self.queue.ack(task.task_id, 'b'))
+        self.assertEqual(self.queue.stats(), {'pending': 0, 'leased': 0, 'done': 1, 'failed': 0})
+
+
+class SQLiteWorkQueueTest(WorkQueueCases, unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'queue.sqlite3')
+        self.queue = SQLiteWorkQueue(self.path, 'test')
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmpdir.cleanup()
+
+    def test_seed_is_idempotent(self):
+        self.assertEqual(self.queue.seed([make_task(1), make_task(2)]), 2)
+        self.assertEqual(self.queue.seed([make_task(1), make_task(2), make_task(3)]), 1)
+        self.assertEqual(self.queue.stats(), {'pending': 3, 'leased': 0, 'done': 0, 'failed': 0})
+
+    def test_lease_orders_by_page_and_excludes_leased(self):
+        self.queue.seed([make_task(3), make_task(1), make_task(2, brand_code='pa00010')])
+        first = self.queue.lease('a', 2)
+        self.assertEqual([task.payload['page'] for task in first], [1, 2])
+
+        # 另一个进程（另一个连接）只能领到剩下的任务
+        other = SQLiteWorkQueue(self.path, 'test')
+        try:
+            self.assertEqual([task.task_id for task in other.lease('b', 10)], [make_task(3).task_id])
+            self.assertEqual(other.lease('b', 10), [])
+        finally:
+            other.close()
+        self.assertEqual(self.queue.stats()['leased'], 3)
+
+    def test_queues_are_separated_by_name(self):
+        self.queue.seed([make_task(1)])
+        other = SQLiteWorkQueue(self.path, 'other')
+        try:
+            self.assertEqual(other.lease('b', 10), [])
+        finally:
+            other.close()
+
+
+
+@unittest.skipIf(fakeredis is None, '需要安装 fakeredis')
+class RedisWorkQueueTest(WorkQueueCases, unittest.TestCase):
+
+    def setUp(self):
+        self.queue = RedisWorkQueue(fakeredis.FakeRedis(), 'test')
+
+    def tearDown(self):
+        self.queue.close()
+
+    def test_seed_retries_when_task_finished_during_check(self):
+        task = make_task(1)
+        self.queue.seed([task])
+        self.queue.lease('a', 1)
+        # 检查已完成任务之后、加入队列之前，其他进程确认了该任务：事务失败后重新检查，不会重新加入
+        real_pipeline = self.queue.client.pipeline
+
+        def pipeline(transaction=True):
+            pipe = real_pipeline(transaction=transaction)
+            if not transaction:
+                real_execute = pipe.execute
+
+                def execute():
+                    result = real_execute()
+                    self.queue.ack(task.task_id, 'a')
+                    return result
+
+                pipe.execute = execute
+            return pipe
+
+        with mock.patch.object(self.queue.client, 'pipeline', side_effect=pipeline):
+            self.assertEqual(self.queue.seed([task]), 0)
+        self.assertEqual(self.queue.lease('b', 1), [])
+        self.assertEqual(self.queue.stats()['done'], 1)
+
+
+class SpiderAckTest(unittest.TestCase):
+    """列表页的任务在该页的item全部由管道确认后才确认（进程中断时租约到期后重新爬取）"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        crawler = get_crawler(SuningAllSpider, {
+            'WORKQUEUE_BACKEND': 'sqlite',
+            'WORKQUEUE_SQLITE_PATH': os.path.join(self.tmpdir.name, 'queue.sqlite3'),
+            'WORKQUEUE_NAME': 'test',
+            'WORKQUEUE_LEASE_BATCH': 1,
+        })
+        self.spider = SuningAllSpider.from_crawler(crawler)
+        self.signals = crawler.signals
+        self.queue = self.spider.work_queue
+        self.queue.seed([make_task(2), make_task(3)])
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmpdir.cleanup()
+
+    def parse_leased_page(self, list_items):
+        request = list(self.spider.lease_requests())[0]
+        body = {'totalPage': 3, 'currentPage': request.meta['page'], 'listItem': list_items}
+        response = TextResponse(
+            request.url, body=json.dumps(body).encode('utf-8'), encoding='utf-8', request=request
+        )
+        return list(self.spider.parse(response))
+
+    def list_item(self, code):
+        return {'itemCode': code, 'itemName': 'Apple iPhone 14', 'averagePrice': '5800'}
+
+    def test_ack_after_items_stored(self):
+        output = self.parse_leased_page([self.list_item('P1'), self.list_item('P2')])
+        items = [item for item in output if not isinstance(item, Request)]
+        self.assertEqual(len(items), 2)
+        # 解析后立即领取下一个任务，但该页的任务尚未确认
+        self.assertEqual(len([request for request in output if isinstance(request, Request)]), 1)
+        self.assertEqual(self.queue.stats()['done'], 0)
+
+        self.signals.send_catch_log(item_stored, item=items[0], spider=self.spider, stored=True)
+        self.assertEqual(self.queue.stats()['done'], 0)
+        self.signals.send_catch_log(item_stored, item=items[1], spider=self.spider, stored=False)
+        self.assertEqual(self.queue.stats()['done'], 1)
+        self.assertEqual(self.spider.writing_tasks, set())
+
+    def test_late_ack_ignored_after_lease_taken(self):
+        output = self.parse_leased_page([self.list_item('P1')])
+        items = [item for item in output if not isinstance(item, Request)]
+        # 写入期间租约到期，任务被其他进程领取
+        self.queue.conn.execute("UPDATE crawl_task SET worker = 'other'")
+
+        self.signals.send_catch_log(item_stored, item=items[0], spider=self.spider, stored=True)
+        self.assertEqual(self.queue.stats()['done'], 0)
+        self.assertEqual(self.spider.crawler.stats.get_value('workqueue/lease_lost'), 1)
+        self.assertEqual(self.spider.writing_tasks, set())
+
+    def test_unconfirmed_task_released_on_close(self):
+        self.parse_leased_page([self.list_item('P1')])
+        self.spider.close_work_queue(self.spider)
+
+        self.queue = SQLiteWorkQueue(self.queue.path, 'test')
+        self.assertEqual(self.queue.stats(), {'pending': 2, 'leased': 0, 'done': 0, 'failed': 0})
+
+    def test_empty_page_acked_immediately(self):
+        self.parse_leased_page([])
+        self.assertEqual(self.queue.stats()['done'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -152,6 +152,11 @@ CORS_ALLOWED_ORIGINS = [
 # DeepSeek AI API Key
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', None)
 
+# 产品搜索后端：ngram = 进程内n-gram倒排索引（按相关度排序），db = 数据库 LIKE 查询
+PRODUCT_SEARCH_BACKEND = os.getenv('PRODUCT_SEARCH_BACKEND', 'ngram')
+# 数据版本号的进程内缓存时间（秒），数据写入后各进程最多这么久后重建索引/缓存
+DATA_VERSION_TTL = float(os.getenv('DATA_VERSION_TTL', '5'))
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
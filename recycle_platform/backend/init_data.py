@@ -18,7 +18,7 @@ sys.path.insert(0, os.path.dirname(__file__))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
-from recycle.models import RecycleProduct, Policy
+from recycle.models import RecycleProduct, RecycleProductPrice, Policy
 
 def init_products():
     """初始化回收产品数据"""
@@ -129,24 +129,25 @@ def init_products():
 
     for product_data in products_data:
         product_data['scrape_date'] = today
+
+        product, created = RecycleProduct.objects.get_or_create(
+            product_code=product_data['product_code'],
+            defaults=product_data
+        )
+
         # 生成示例价格历史数据
-        history = []
         base_price = float(product_data['avg_price'])
         for i in range(7):
             day = today - timedelta(days=6 - i)
             # 模拟价格波动（±5%）
             fluctuation = (i - 3) * 100 / 500
             price = round(base_price * (0.98 + fluctuation), 2)
-            history.append({
-                'date': day.strftime('%Y-%m-%d'),
-                'price': price
-            })
-        product_data['price_history'] = history
+            RecycleProductPrice.objects.get_or_create(
+                product=product,
+                date=day,
+                defaults={'price': Decimal(str(price))}
+            )
 
-        product, created = RecycleProduct.objects.get_or_create(
-            product_code=product_data['product_code'],
-            defaults=product_data
-        )
         if created:
             count += 1
             print(f"✓ 创建: {product.brand} {product.model}")
@@ -1,6 +1,12 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Policy, RecycleProduct
+from .models import Policy, RecycleProduct, RecycleProductPrice
+
+
+class RecycleProductPriceInline(admin.TabularInline):
+    model = RecycleProductPrice
+    extra = 0
+    ordering = ('-date',)
 
 
 @admin.register(RecycleProduct)
@@ -9,12 +15,13 @@ class RecycleProductAdmin(admin.ModelAdmin):
     list_filter = ('category', 'brand', 'scrape_date')
     search_fields = ('product_code', 'name', 'brand', 'model')
     readonly_fields = ('product_code', 'created_at')
+    inlines = [RecycleProductPriceInline]
     fieldsets = (
         ('基本信息', {
             'fields': ('product_code', 'name', 'category', 'brand', 'model')
         }),
         ('价格信息', {
-            'fields': ('avg_price', 'scrape_date', 'price_history')
+            'fields': ('avg_price', 'scrape_date')
         }),
         ('系统信息', {
             'fields': ('created_at',),
@@ -0,0 +1,188 @@
+"""
+导入爬虫结果文件
+
+使用方法:
+  python manage.py import_crawl dump.jsonl.gz [更多文件...] [--chunk-size 2000]
+
+支持 JSON 数组和 JSONL（可 gzip 压缩），记录可以是 test.json 录制格式
+（item_code, product_name, price, brand_name, crawl_time），
+也可以是 MonitorPriceItem 字段（product_code, name, category, brand, model, avg_price, scrape_date）。
+文件按流式读取，每 chunk-size 行一个事务：产品按 product_code 批量更新/插入，
+当天价格按 (产品, 日期) 批量写入价格历史。同一产品以文件中靠后的记录为准，多天的文件请按日期顺序导入。
+"""
+
+import gzip
+import json
+import re
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recycle import versioning
+from recycle.models import RecycleProduct, RecycleProductPrice
+
+PRODUCT_UPDATE_FIELDS = ['name', 'category', 'brand', 'model', 'avg_price', 'scrape_date']
+
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_records(stream, read_size=1 << 20):
+    """
+    逐条读取 JSON 数组或 JSONL 中的对象，内存占用与文件大小无关
+    （两种格式统一处理：跳过顶层的方括号、逗号和空白，依次解析对象）
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer):
+            if buffer[pos] in '[]':
+                pos += 1
+                continue
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise CommandError(f'JSON格式错误: {e}')
+            else:
+                yield value
+                continue
+        elif eof:
+            return
+
+        data = stream.read(read_size)
+        eof = not data
+        buffer, pos = buffer[pos:] + data, 0
+
+
+def open_dump(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def normalize_record(row, default_category, default_date=None):
+    """转换为产品字段，缺少必填字段或价格无效时返回None"""
+    product_code = str(row.get('product_code') or row.get('item_code') or '').strip()
+    name = str(row.get('name') or row.get('product_name') or '').strip()
+    brand = str(row.get('brand') or row.get('brand_name') or '').strip()
+    model = str(row.get('model') or name).strip()
+    category = str(row.get('category') or default_category or '').strip()
+
+    price = row.get('avg_price', row.get('price'))
+    try:
+        price = Decimal(str(price).replace('¥', '').replace(',', '').strip()).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return None
+
+    scrape_date = default_date
+    if scrape_date is None:
+        raw_date = row.get('scrape_date') or row.get('crawl_time')
+        try:
+            scrape_date = date.fromisoformat(str(raw_date)[:10]) if raw_date else date.today()
+        except ValueError:
+            return None
+
+    if not (product_code and name and brand and model and category) or price <= 0:
+        return None
+
+    return {
+        'product_code': product_code[:50],
+        'name': name[:100],
+        'category': category[:50],
+        'brand': brand[:50],
+        'model': model[:100],
+        'avg_price': price,
+        'scrape_date': scrape_date,
+    }
+
+
+class Command(BaseCommand):
+    help = '批量导入爬虫结果文件（JSON/JSONL，可gzip压缩）到回收产品表和价格历史表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='爬虫结果文件')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='每个事务写入的行数')
+        parser.add_argument('--category', default='手机', help='记录中没有分类字段时使用的分类（test.json 录制格式）')
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='覆盖记录中的爬取日期（YYYY-MM-DD）')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size 必须大于0')
+
+        self.totals = {'rows': 0, 'invalid': 0, 'products': 0, 'prices': 0}
+        started = time.perf_counter()
+
+        for path in options['paths']:
+            self.stdout.write(f'导入 {path} ...')
+            chunk = []
+            with open_dump(path) as stream:
+                for row in iter_json_records(stream):
+                    self.totals['rows'] += 1
+                    record = normalize_record(row, options['category'], options['date'])
+                    if record is None:
+                        self.totals['invalid'] += 1
+                        continue
+                    chunk.append(record)
+                    if len(chunk) >= chunk_size:
+                        self._write_chunk(chunk)
+                        chunk = []
+                        self._progress(started)
+            if chunk:
+                self._write_chunk(chunk)
+            # 每个文件导入完成后更新数据版本，各进程的搜索索引随之重建
+            versioning.bump(versioning.PRODUCTS)
+
+        elapsed = time.perf_counter() - started
+        rate = self.totals['rows'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"导入完成: 读取 {self.totals['rows']} 行（无效 {self.totals['invalid']} 行），"
+            f"写入产品 {self.totals['products']} 条、价格 {self.totals['prices']} 条，"
+            f"耗时 {elapsed:.1f} 秒，{rate:.0f} 行/秒"
+        ))
+
+    def _progress(self, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"  已读取 {self.totals['rows']} 行，{self.totals['rows'] / elapsed:.0f} 行/秒")
+
+    def _write_chunk(self, records):
+        """一个事务内批量写入产品和价格历史"""
+        products = {}
+        prices = {}
+        for record in records:
+            products[record['product_code']] = RecycleProduct(**record)
+            prices[(record['product_code'], record['scrape_date'])] = record['avg_price']
+
+        # MySQL 按表上任一唯一索引判断冲突，不支持（也不需要）指定冲突字段
+        def conflict_target(fields):
+            if connection.features.supports_update_conflicts_with_target:
+                return {'unique_fields': fields}
+            return {}
+
+        with transaction.atomic():
+            RecycleProduct.objects.bulk_create(
+                products.values(),
+                update_conflicts=True,
+                update_fields=PRODUCT_UPDATE_FIELDS,
+                **conflict_target(['product_code']),
+            )
+            product_ids = dict(
+                RecycleProduct.objects.filter(product_code__in=list(products)).values_list('product_code', 'id')
+            )
+            RecycleProductPrice.objects.bulk_create(
+                [
+                    RecycleProductPrice(product_id=product_ids[code], date=scrape_date, price=price)
+                    for (code, scrape_date), price in prices.items()
+                ],
+                update_conflicts=True,
+                update_fields=['price'],
+                **conflict_target(['product', 'date']),
+            )
+
+        self.totals['products'] += len(products)
+        self.totals['prices'] += len(prices)
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:00
+
+from decimal import Decimal, InvalidOperation
+from datetime import date
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_prices(apps, schema_editor):
+    """将 price_history JSON 中的历史价格迁移到 RecycleProductPrice 表"""
+    RecycleProduct = apps.get_model('recycle', 'RecycleProduct')
+    RecycleProductPrice = apps.get_model('recycle', 'RecycleProductPrice')
+
+    batch = []
+    for product_id, history in RecycleProduct.objects.values_list('id', 'price_history').iterator(chunk_size=2000):
+        if not isinstance(history, list):
+            continue
+        seen = set()
+        for entry in history:
+            try:
+                day = date.fromisoformat(str(entry.get('date', '')))
+                price = Decimal(str(entry.get('price'))).quantize(Decimal('0.01'))
+            except (AttributeError, ValueError, TypeError, InvalidOperation):
+                continue
+            if day in seen:
+                continue
+            seen.add(day)
+            batch.append(RecycleProductPrice(product_id=product_id, date=day, price=price))
+        if len(batch) >= 2000:
+            RecycleProductPrice.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        RecycleProductPrice.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recycle', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecycleProductPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='回收价格')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='recycle.recycleproduct', verbose_name='回收产品')),
+            ],
+            options={
+                'verbose_name': '历史价格',
+                'verbose_name_plural': '历史价格',
+                'ordering': ['product', 'date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recycleproductprice',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='uniq_product_price_date'),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recycle', '0002_recycleproductprice'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recycleproduct',
+            options={'ordering': ['-scrape_date', '-id'], 'verbose_name': '回收产品', 'verbose_name_plural': '回收产品'},
+        ),
+        migrations.AddIndex(
+            model_name='recycleproduct',
+            index=models.Index(fields=['-scrape_date', '-id'], name='recycle_product_latest_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='recycleproduct',
+            name='recycle_rec_scrape__1c61b2_idx',
+        ),
+    ]
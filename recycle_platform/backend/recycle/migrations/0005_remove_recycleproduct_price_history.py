@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    删除早期的 price_history JSON 字段：价格历史已在 0002 迁移到 recycle_recycleproductprice，
+    爬虫此后不再维护该字段
+    """
+
+    dependencies = [
+        ('recycle', '0004_dataversion'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='recycleproduct',
+            name='price_history',
+        ),
+    ]
@@ -10,7 +10,6 @@ class RecycleProduct(models.Model):
     model = models.CharField('产品型号', max_length=100)
     avg_price = models.DecimalField('平均回收价格', max_digits=10, decimal_places=2)
     scrape_date = models.DateField('爬取日期')
-    price_history = models.JSONField('历史价格', default=list, blank=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
 
     class Meta:
@@ -18,14 +17,33 @@ class RecycleProduct(models.Model):
         verbose_name_plural = '回收产品'
         indexes = [
             models.Index(fields=['category', 'brand', 'model']),
-            models.Index(fields=['-scrape_date']),
+            # 产品列表按 (scrape_date, id) 倒序做游标分页
+            models.Index(fields=['-scrape_date', '-id'], name='recycle_product_latest_idx'),
         ]
-        ordering = ['-scrape_date']
+        ordering = ['-scrape_date', '-id']
 
     def __str__(self):
         return f"{self.brand} {self.model}"
 
 
+class RecycleProductPrice(models.Model):
+    product = models.ForeignKey(RecycleProduct, on_delete=models.CASCADE, related_name='prices', verbose_name='回收产品')
+    date = models.DateField('日期')
+    price = models.DecimalField('回收价格', max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = '历史价格'
+        verbose_name_plural = '历史价格'
+        constraints = [
+            # (product, date) 唯一索引：爬虫幂等写入 + 按日期区间查询
+            models.UniqueConstraint(fields=['product', 'date'], name='uniq_product_price_date'),
+        ]
+        ordering = ['product', 'date']
+
+    def __str__(self):
+        return f"{self.product} {self.date}: {self.price}"
+
+
 class Policy(models.Model):
     title = models.CharField('政策标题', max_length=200)
     content = models.TextField('政策内容', blank=True)
@@ -40,3 +58,20 @@ class Policy(models.Model):
     def __str__(self):
         return self.title
 
+
+
+class DataVersion(models.Model):
+    """
+    数据版本号：产品等数据每次写入后加一（爬虫管道、导入命令、后台编辑），
+    各进程据此判断内存中的索引/缓存是否需要重建，见 recycle/versioning.py
+    """
+    name = models.CharField('数据名称', max_length=50, unique=True)
+    version = models.PositiveBigIntegerField('版本号', default=0)
+    updated_at = models.DateTimeField('更新时间', default=timezone.now)
+
+    class Meta:
+        verbose_name = '数据版本'
+        verbose_name_plural = '数据版本'
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,203 @@
+"""
+产品关键词搜索：进程内 n-gram 倒排索引
+
+原来的搜索对 名称/品牌/型号/类型/产品编号 做五个 icontains（LIKE '%关键词%'）再 OR，无法使用索引，每次都全表扫描。
+这里在每个进程内对五个字段建立单字和相邻双字的倒排索引（中文不需要分词）：
+- 查询时取关键词中最少见的一个字/双字的倒排列表作为候选，再逐条用子串匹配确认，
+  结果与 icontains 完全一致（不区分大小写的子串匹配）
+- 结果按相关度排序：字段权重（编号 > 品牌/型号 > 名称 > 类型）× 匹配程度（完全相同 > 前缀 > 包含），
+  相同时按爬取日期、id 倒序
+- 排序后的结果按关键词缓存（SEARCH_CACHE_SIZE 个），翻页时用 bisect 定位游标
+
+搜索耗时与匹配的产品数成正比（约 2~3 微秒/个），与产品总数无关；常用关键词命中缓存后为微秒级。
+索引记录构建时的产品数据版本号（见 versioning.py），数据写入后版本号变化，
+下一次搜索时在后台线程重建（并预先计算旧索引缓存中的关键词），重建完成前继续使用旧索引；
+进程内第一次搜索时同步构建。
+"""
+
+import bisect
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from . import versioning
+
+logger = logging.getLogger(__name__)
+
+# 索引的字段及权重（顺序与 ProductSearchIndex.texts 中的字段顺序一致）
+SEARCH_FIELDS = ('product_code', 'name', 'category', 'brand', 'model')
+FIELD_WEIGHTS = (4, 2, 1, 3, 3)
+# 匹配程度的倍数：完全相同 / 前缀 / 包含
+EXACT, PREFIX, CONTAINS = 3, 2, 1
+
+SEARCH_CACHE_SIZE = 256
+BUILD_CHUNK_SIZE = 5000
+
+# 排序键：得分 << 60 | 日期序数 << 40 | id，一个整数即可比较，也直接用作翻页游标
+SCORE_SHIFT = 60
+DATE_SHIFT = 40
+ID_MASK = (1 << DATE_SHIFT) - 1
+
+# 字段之间的分隔符，保证双字不会跨字段
+SEPARATOR = '\x1f'
+
+
+def grams_of(values):
+    """各字段中出现的单字和相邻双字（不跨字段）"""
+    grams = set()
+    for value in values:
+        grams.update(value)
+        grams.update(map(str.__add__, value, value[1:]))
+    return grams
+
+
+class ProductSearchIndex:
+
+    def __init__(self, version):
+        self.version = version
+        self.ranks = array('q')      # 日期序数 << 40 | id，得分相同时的排序
+        self.texts = []              # 小写的 编号\x1f名称\x1f类型\x1f品牌\x1f型号
+        self.postings = {}           # 单字/双字 -> array('I') 行号（升序）
+        self._cache = OrderedDict()  # 关键词 -> 排序后的结果
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, version):
+        from .models import RecycleProduct
+
+        started = time.perf_counter()
+        index = cls(version)
+        rows = RecycleProduct.objects.order_by().values_list('id', 'scrape_date', *SEARCH_FIELDS)
+        for product_id, scrape_date, *values in rows.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            index.add(product_id, scrape_date, values)
+        logger.info(
+            f'产品搜索索引已构建: 版本 {version}，{len(index)} 个产品，'
+            f'{len(index.postings)} 个索引项，耗时 {time.perf_counter() - started:.2f} 秒'
+        )
+        return index
+
+    def add(self, product_id, scrape_date, values):
+        values = [str(value).lower() for value in values]
+        row = len(self.texts)
+        self.ranks.append(scrape_date.toordinal() << DATE_SHIFT | product_id)
+        self.texts.append(SEPARATOR.join(values))
+        postings = self.postings
+        for gram in grams_of(values):
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array('I')
+            posting.append(row)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def search(self, keyword):
+        """
+        返回按相关度从高到低排列的结果，每个元素为排序键的相反数（列表升序），
+        排序键 = 得分 << 60 | 日期序数 << 40 | id
+        """
+        keyword = keyword.lower()
+        with self._cache_lock:
+            if keyword in self._cache:
+                self._cache.move_to_end(keyword)
+                return self._cache[keyword]
+
+        keys = self._search(keyword)
+        with self._cache_lock:
+            self._cache[keyword] = keys
+            while len(self._cache) > SEARCH_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return keys
+
+    def cached_keywords(self):
+        with self._cache_lock:
+            return list(self._cache)
+
+    def _search(self, keyword):
+        if not keyword or SEPARATOR in keyword:
+            return []
+        # 关键词的所有双字（单字关键词用单字），任一不在索引中即无结果
+        if len(keyword) == 1:
+            grams = {keyword}
+        else:
+            grams = {keyword[i:i + 2] for i in range(len(keyword) - 1)}
+        postings = [self.postings.get(gram) for gram in grams]
+        if any(posting is None for posting in postings):
+            return []
+
+        keys = []
+        append = keys.append
+        texts, ranks = self.texts, self.ranks
+        for row in min(postings, key=len):
+            text = texts[row]
+            if keyword not in text:
+                continue
+            score = 0
+            for value, weight in zip(text.split(SEPARATOR), FIELD_WEIGHTS):
+                if keyword in value:
+                    if value == keyword:
+                        score += weight * EXACT
+                    elif value.startswith(keyword):
+                        score += weight * PREFIX
+                    else:
+                        score += weight * CONTAINS
+            append(-(score << SCORE_SHIFT | ranks[row]))
+        keys.sort()
+        return keys
+
+    def page(self, keyword, limit, after=None):
+        """
+        一页结果：返回 (产品id列表, 总数, 下一页游标或None)
+        after 为上一页的游标（排序键）
+        """
+        keys = self.search(keyword)
+        start = bisect.bisect_right(keys, -after) if after is not None else 0
+        page = keys[start:start + limit]
+        next_key = -page[-1] if page and start + limit < len(keys) else None
+        return [-key & ID_MASK for key in page], len(keys), next_key
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    当前进程的搜索索引；数据版本变化时在后台线程重建，重建完成前返回旧索引
+    """
+    global _index
+
+    version = versioning.get_version(versioning.PRODUCTS).number
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    if index is None:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = ProductSearchIndex.build(version)
+            return _index
+
+    if _index_lock.acquire(blocking=False):
+        threading.Thread(target=_rebuild, args=(version,), name='product-search-index', daemon=True).start()
+    return index
+
+
+def _rebuild(version):
+    global _index
+
+    from django.db import connection
+
+    try:
+        index = ProductSearchIndex.build(version)
+        # 预先计算旧索引中缓存的关键词，切换后常用搜索仍然命中缓存
+        for keyword in _index.cached_keywords():
+            index.search(keyword)
+        _index = index
+    except Exception:
+        logger.exception('产品搜索索引重建失败，继续使用旧索引')
+    finally:
+        connection.close()
+        _index_lock.release()
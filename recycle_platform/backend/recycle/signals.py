@@ -0,0 +1,20 @@
+"""
+后台编辑、Django ORM 单条写入产品或政策时更新数据版本
+（bulk_create / update 不发送信号，批量写入方需自行调用 versioning.bump）
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import versioning
+from .models import Policy, RecycleProduct
+
+
+@receiver([post_save, post_delete], sender=RecycleProduct, dispatch_uid='recycle_product_version')
+def bump_product_version(sender, **kwargs):
+    versioning.bump_on_commit(versioning.PRODUCTS)
+
+
+@receiver([post_save, post_delete], sender=Policy, dispatch_uid='policy_version')
+def bump_policy_version(sender, **kwargs):
+    versioning.bump_on_commit(versioning.POLICIES)
@@ -0,0 +1,95 @@
+"""
+进程内的 类型 → 品牌 → 型号 树
+
+types/brands/models 三个接口原来每次请求都执行一次 SELECT DISTINCT ... ORDER BY，
+前端切换下拉框时会连续调用。这里在第一次使用时用一条查询（走 (category, brand, model) 索引）
+加载整棵树，记录产品数据版本号（见 versioning.py），版本号变化后下一次请求时重新加载。
+稳定状态下三个接口都不查询数据库（版本号本身每 DATA_VERSION_TTL 秒最多查询一次）。
+
+Catalog 是供 /api/catalog/ 使用的完整目录（类型 → 品牌 → 型号 → 产品编号），
+加载时即序列化为JSON并计算内容摘要（用于强ETag），请求时直接返回或304。
+"""
+
+import hashlib
+import json
+import threading
+
+from . import versioning
+
+
+class Taxonomy:
+
+    def __init__(self, version, rows):
+        """rows 为按 (category, brand, model) 排序且去重的三元组"""
+        self.version = version
+        self.tree = {}  # 类型 -> {品牌 -> [型号, ...]}
+        for category, brand, model in rows:
+            self.tree.setdefault(category, {}).setdefault(brand, []).append(model)
+        self.types = list(self.tree)
+        self.brands = {category: list(brands) for category, brands in self.tree.items()}
+
+    @classmethod
+    def load(cls, version):
+        from .models import RecycleProduct
+
+        rows = RecycleProduct.objects.values_list('category', 'brand', 'model').distinct().order_by(
+            'category', 'brand', 'model'
+        )
+        return cls(version, rows.iterator())
+
+    def brands_of(self, category):
+        return self.brands.get(category, [])
+
+    def models_of(self, category, brand):
+        return self.tree.get(category, {}).get(brand, [])
+
+
+class Catalog:
+
+    def __init__(self, version, rows):
+        """
+        rows 为按 (category, brand, model) 排序的 (category, brand, model, product_code)，
+        同一型号有多个产品时取第一个（与 price_trend 按型号查询时一致：爬取日期最新的）
+        """
+        self.version = version
+        tree = {}
+        for category, brand, model, product_code in rows:
+            tree.setdefault(category, {}).setdefault(brand, {}).setdefault(model, product_code)
+        self.body = json.dumps(tree, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        # 内容不变时（例如只更新了价格）摘要和 ETag 也不变
+        self.digest = hashlib.sha256(self.body).hexdigest()[:32]
+
+    @classmethod
+    def load(cls, version):
+        from .models import RecycleProduct
+
+        rows = RecycleProduct.objects.values_list('category', 'brand', 'model', 'product_code').order_by(
+            'category', 'brand', 'model', '-scrape_date', '-id'
+        )
+        return cls(version, rows.iterator(chunk_size=5000))
+
+
+_cache = {}  # 类 -> 实例
+_lock = threading.Lock()
+
+
+def _get(cls):
+    """当前进程中 cls 的实例，产品数据版本变化后重新加载"""
+    version = versioning.get_version(versioning.PRODUCTS).number
+    instance = _cache.get(cls)
+    if instance is not None and instance.version == version:
+        return instance
+
+    with _lock:
+        instance = _cache.get(cls)
+        if instance is None or instance.version != version:
+            instance = _cache[cls] = cls.load(version)
+        return instance
+
+
+def get_taxonomy():
+    return _get(Taxonomy)
+
+
+def get_catalog():
+    return _get(Catalog)
@@ -1,3 +1,216 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db.models import Q
+from django.test import TestCase, override_settings
+
+from . import search, taxonomy, versioning, views
+from .models import RecycleProduct
+
+BRANDS = ['Apple', 'HUAWEI', '小米', 'apple watch']
+CATEGORIES = ['手机', '平板', '笔记本']
+
+
+def reset_caches():
+    """清空进程内的版本号、搜索索引和目录缓存（各用例的数据不同）"""
+    versioning._cache.clear()
+    taxonomy._cache.clear()
+    search._index = None
+
+
+class ProductTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        start = date(2024, 1, 1)
+        RecycleProduct.objects.bulk_create([
+            RecycleProduct(
+                product_code=f'P{index:06d}',
+                name=f'{BRANDS[index % 4]} {CATEGORIES[index % 3]} 型号{index}',
+                category=CATEGORIES[index % 3],
+                brand=BRANDS[index % 4],
+                model=f'iPhone {index}' if index % 4 == 0 else f'Model-{index}',
+                avg_price=Decimal(100 + index),
+                # 多个产品同一天，翻页时需要按 id 区分
+                scrape_date=start + timedelta(days=index // 5),
+            )
+            for index in range(47)
+        ])
+        versioning.bump(versioning.PRODUCTS)
+
+    def setUp(self):
+        reset_caches()
+        self.addCleanup(reset_caches)
+
+    def get(self, path, **params):
+        return self.client.get(path, params)
+
+
+class ProductsListTest(ProductTestCase):
+
+    def fetch_all(self, **params):
+        results, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            data = self.get('/api/products/', **query).json()
+            results.extend(data['results'])
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                return results, pages
+
+    def test_legacy_shape_without_paging_params(self):
+        data = self.get('/api/products/').json()
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), RecycleProduct.objects.count())
+        self.assertEqual(set(data[0]), set(views.PRODUCT_FIELDS))
+
+        data = self.get('/api/products/', keyword='apple').json()
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), views._filter_products(RecycleProduct.objects.all(), 'apple').count())
+
+    def test_cursor_pages_cover_all_rows_in_order(self):
+        results, pages = self.fetch_all(limit=10, fields='id')
+        expected = list(RecycleProduct.objects.order_by('-scrape_date', '-id').values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in results], expected)
+        self.assertEqual(pages, 5)
+
+    def test_count_and_fields(self):
+        data = self.get('/api/products/', limit=5, fields='id,brand').json()
+        self.assertEqual(data['count'], RecycleProduct.objects.count())
+        self.assertEqual(set(data['results'][0]), {'id', 'brand'})
+
+        second = self.get('/api/products/', limit=5, cursor=data['next_cursor']).json()
+        self.assertIsNone(second['count'])
+        self.assertIsNone(self.get('/api/products/', limit=5, count='0').json()['count'])
+
+    def test_limit_is_clamped(self):
+        data = self.get('/api/products/', limit=1000).json()
+        self.assertEqual(len(data['results']), min(views.PRODUCTS_MAX_LIMIT, RecycleProduct.objects.count()))
+        self.assertEqual(len(self.get('/api/products/', limit='abc').json()['results']), views.PRODUCTS_DEFAULT_LIMIT)
+
+    def test_invalid_cursor_and_fields(self):
+        for cursor in ['@@', views.encode_cursor('x'), views.encode_cursor('2024-01-01', 'a'), 'bnVsbA']:
+            response = self.get('/api/products/', cursor=cursor)
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertNotIn('ETag', response)
+        with override_settings(PRODUCT_SEARCH_BACKEND='ngram'):
+            response = self.get('/api/products/', keyword='apple', cursor=views.encode_cursor('2024-01-01', 1))
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get('/api/products/', fields='id,price_history').status_code, 400)
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='ngram')
+    def test_search_pages_match_icontains(self):
+        for keyword in ['apple', 'APPLE', 'iphone 1', '小米', '手', 'P00004', '-1', 'nothing']:
+            results, _ = self.fetch_all(keyword=keyword, limit=7, fields='id')
+            ids = [row['id'] for row in results]
+            self.assertEqual(len(ids), len(set(ids)), keyword)
+            self.assertEqual(set(ids), set(views._filter_products(RecycleProduct.objects.all(), keyword).values_list(
+                'id', flat=True
+            )), keyword)
+
+
+class SearchIndexTest(ProductTestCase):
+
+    def test_matches_icontains(self):
+        index = search.ProductSearchIndex.build(0)
+        for keyword in ['apple', 'Apple', 'APPLE WATCH', '型号1', 'e w', 'model-4', 'p0000', 'x', '', '\x1f']:
+            ids, count, _ = index.page(keyword, 1000)
+            expected = RecycleProduct.objects.filter(
+                Q(name__icontains=keyword) | Q(brand__icontains=keyword) | Q(model__icontains=keyword)
+                | Q(category__icontains=keyword) | Q(product_code__icontains=keyword)
+            ) if keyword and keyword != '\x1f' else RecycleProduct.objects.none()
+            self.assertEqual(sorted(ids), sorted(expected.values_list('id', flat=True)), keyword)
+            self.assertEqual(count, len(ids), keyword)
+
+    def test_ranking(self):
+        index = search.ProductSearchIndex.build(0)
+        ids, _, _ = index.page('apple', 1000)
+        brands = dict(RecycleProduct.objects.values_list('id', 'brand'))
+        # 品牌完全相同（Apple）排在品牌前缀匹配（apple watch）之前
+        first_watch = next(i for i, product_id in enumerate(ids) if brands[product_id] == 'apple watch')
+        self.assertTrue(all(brands[product_id] == 'Apple' for product_id in ids[:first_watch]))
+        self.assertTrue(all(brands[product_id] == 'apple watch' for product_id in ids[first_watch:]))
+
+        # 产品编号完全相同时排第一
+        product = RecycleProduct.objects.get(product_code='P000012')
+        self.assertEqual(index.page('p000012', 1)[0], [product.id])
+
+    def test_page_cursor(self):
+        index = search.ProductSearchIndex.build(0)
+        everything, count, _ = index.page('手', 1000)
+        collected, after = [], None
+        while True:
+            ids, _, after = index.page('手', 4, after)
+            collected.extend(ids)
+            if after is None:
+                break
+        self.assertEqual(collected, everything)
+        self.assertEqual(count, len(everything))
+
+    def test_rebuilds_after_version_change(self):
+        first = search.get_index()
+        self.assertIs(search.get_index(), first)
+        versioning.bump(versioning.PRODUCTS)
+        # 已有索引时在后台线程重建，先返回旧索引（测试中不启动线程，测试数据库在事务中）
+        with mock.patch.object(search.threading, 'Thread') as thread:
+            try:
+                self.assertIs(search.get_index(), first)
+                self.assertIs(search.get_index(), first)
+            finally:
+                search._index_lock.release()
+        thread.assert_called_once()
+        self.assertEqual(thread.call_args.kwargs['args'], (versioning.get_version(versioning.PRODUCTS).number,))
+
+
+class ConditionalTest(ProductTestCase):
+
+    def test_not_modified(self):
+        response = self.get('/api/types/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+        version = versioning.get_version(versioning.PRODUCTS)
+        self.assertEqual(etag, views.version_etag_of(versioning.PRODUCTS, version.number))
+
+        response = self.client.get('/api/types/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        versioning.bump(versioning.PRODUCTS)
+        response = self.client.get('/api/types/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_error_responses_have_no_validators(self):
+        for params in [{}, {'product_code': 'missing'}]:
+            response = self.get('/api/price-trend/', **params)
+            self.assertIn(response.status_code, (400, 404))
+            self.assertNotIn('ETag', response)
+            self.assertNotIn('Last-Modified', response)
+
+        code = RecycleProduct.objects.values_list('product_code', flat=True).first()
+        response = self.get('/api/price-trend/', product_code=code)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_catalog_etag_includes_revision(self):
+        response = self.get('/api/catalog/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/catalog/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # 只有价格变化时目录不变，ETag 不变
+        RecycleProduct.objects.update(avg_price=Decimal('1'))
+        versioning.bump(versioning.PRODUCTS)
+        self.assertEqual(self.client.get('/api/catalog/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        revision = views.ETAG_REVISION
+        views.ETAG_REVISION = revision + 1
+        try:
+            response = self.client.get('/api/catalog/', HTTP_IF_NONE_MATCH=etag)
+        finally:
+            views.ETAG_REVISION = revision
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('types/', views.types_list, name='types_list'),
     path('brands/', views.brands_list, name='brands_list'),
     path('models/', views.models_list, name='models_list'),
+    path('catalog/', views.catalog, name='catalog'),
     path('price-trend/', views.price_trend, name='price_trend'),
     path('policies/', views.policies_list, name='policies_list'),
     path('policies/<int:policy_id>/', views.policy_detail, name='policy_detail'),
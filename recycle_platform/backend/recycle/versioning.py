@@ -0,0 +1,69 @@
+"""
+数据版本号
+
+数据（产品、政策）每次写入后版本号加一，写入方：
+    爬虫管道   直接在数据库中 INSERT ... ON DUPLICATE KEY UPDATE version = version + 1
+    导入命令   import_crawl 每个文件导入完成后
+    后台编辑   模型的 post_save / post_delete 信号（见 signals.py）
+进程内的索引和缓存记录构建时的版本号，版本号变化后重建；
+读接口用版本号生成 ETag / Last-Modified，数据未变化时直接返回304（见 views.conditional）。
+读取版本号有 DATA_VERSION_TTL 秒的进程内缓存，稳定状态下每个进程每 TTL 秒最多查询一次数据库。
+"""
+
+import time
+from collections import namedtuple
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+PRODUCTS = 'products'
+POLICIES = 'policies'
+
+Version = namedtuple('Version', ['number', 'updated_at'])
+
+_cache = {}  # name -> (过期时间, Version)
+
+
+def get_version(name):
+    """当前版本号（可能延迟最多 DATA_VERSION_TTL 秒），从未写入过时为 Version(0, None)"""
+    now = time.monotonic()
+    cached = _cache.get(name)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    from .models import DataVersion
+
+    row = DataVersion.objects.filter(name=name).values_list('version', 'updated_at').first()
+    version = Version(*row) if row else Version(0, None)
+    _cache[name] = (now + settings.DATA_VERSION_TTL, version)
+    return version
+
+
+def bump(name):
+    """版本号加一；当前进程立即可见，其他进程在缓存过期后可见"""
+    from .models import DataVersion
+
+    now = timezone.now()
+    updated = DataVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=now)
+    if not updated:
+        try:
+            with transaction.atomic():
+                DataVersion.objects.create(name=name, version=1, updated_at=now)
+        except IntegrityError:
+            # 其他进程同时创建了这一行
+            DataVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=now)
+    _cache.pop(name, None)
+
+
+def bump_on_commit(name):
+    """当前事务提交后版本号加一；同一事务内多次调用（例如批量删除时每行一次信号）只更新一次"""
+    connection = transaction.get_connection()
+    for _, callback, *_ in connection.run_on_commit:
+        if getattr(callback, 'data_version', None) == name:
+            return
+    callback = partial(bump, name)
+    callback.data_version = name
+    transaction.on_commit(callback)
@@ -1,23 +1,154 @@
-from datetime import timedelta
+import base64
+import json
+from datetime import date, timedelta
+from functools import wraps
 
 import requests
 from django.conf import settings
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
-from .models import Policy, RecycleProduct
+from . import search, taxonomy, versioning
+from .models import Policy, RecycleProduct, RecycleProductPrice
+
+# 价格趋势默认/最大返回天数
+TREND_DEFAULT_DAYS = 7
+TREND_MAX_DAYS = 365
+
+# 产品列表每页默认/最大条数
+PRODUCTS_DEFAULT_LIMIT = 20
+PRODUCTS_MAX_LIMIT = 100
+# 产品列表可返回的字段（fields= 参数从中选择）
+PRODUCT_FIELDS = ('id', 'product_code', 'name', 'category', 'brand', 'model', 'avg_price', 'scrape_date')
+# 传了其中任一参数时使用分页格式，否则返回原来的不分页列表（兼容旧客户端）
+PRODUCTS_PAGED_PARAMS = ('limit', 'cursor', 'fields', 'count')
+
+
+# 接口返回格式变化时加一，使客户端和CDN缓存的旧格式失效
+ETAG_REVISION = 1
 
 
 def json_response(data, status=200):
     return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
 
 
+def version_etag_of(name, number):
+    return f'"{name}-{number}-{ETAG_REVISION}"'
+
+
+def conditional(name, etag_func=None):
+    """
+    条件请求：按数据版本号（versioning.py）生成 ETag 和 Last-Modified，
+    请求的 If-None-Match / If-Modified-Since 与之匹配时在执行视图前返回304；
+    Cache-Control: no-cache 让浏览器和CDN缓存响应，但每次使用前重新验证
+    etag_func 可替换默认的按版本号生成的 ETag（参数为 request）
+    只有 200（和 304）响应带 ETag / Last-Modified，400/404 等错误响应不带，避免客户端缓存并复用错误结果
+    """
+    def version_etag(request, *args, **kwargs):
+        if etag_func is not None:
+            return etag_func(request)
+        return version_etag_of(name, versioning.get_version(name).number)
+
+    def last_modified(request, *args, **kwargs):
+        return versioning.get_version(name).updated_at
+
+    def decorator(view):
+        conditional_view = condition(etag_func=version_etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                del response['ETag']
+                del response['Last-Modified']
+            return response
+
+        return cache_control(no_cache=True)(wrapper)
+
+    return decorator
+
+
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回其中的值列表，格式错误时抛出 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError(cursor)
+    if not isinstance(values, list):
+        raise ValueError(cursor)
+    return values
+
+
+def products_etag(request):
+    # 搜索索引在后台重建时仍用旧索引返回结果，ETag 按实际使用的索引版本生成，避免新版本号对应旧结果
+    if request.GET.get('keyword', '').strip() and settings.PRODUCT_SEARCH_BACKEND == 'ngram':
+        return version_etag_of(versioning.PRODUCTS, search.get_index().version)
+    return version_etag_of(versioning.PRODUCTS, versioning.get_version(versioning.PRODUCTS).number)
+
+
+def catalog_etag(request):
+    # 按目录内容的摘要生成，格式版本（ETAG_REVISION）变化时同样失效
+    return f'"catalog-{taxonomy.get_catalog().digest}-{ETAG_REVISION}"'
+
+
+@conditional(versioning.PRODUCTS, etag_func=products_etag)
 def products_list(request):
+    """
+    产品列表/搜索，游标分页，每页耗时与总行数无关
+    不带分页参数（PRODUCTS_PAGED_PARAMS）时按原来的格式返回全部匹配产品的列表
+    无关键词时按 (scrape_date, id) 倒序；有关键词时按相关度排序（PRODUCT_SEARCH_BACKEND=ngram，见 search.py）
+    参数：
+        keyword  搜索关键词
+        limit    每页条数（默认 20，最大 100）
+        cursor   上一页返回的 next_cursor
+        fields   逗号分隔的返回字段，默认全部
+        count    为 0 时不统计总数（count 返回 null）；只在第一页统计
+    响应：{"results": [...], "next_cursor": "..." 或 null, "count": 总数或 null}
+    """
     keyword = request.GET.get('keyword', '').strip()
-    queryset = RecycleProduct.objects.all()
-    
+    if not any(param in request.GET for param in PRODUCTS_PAGED_PARAMS):
+        products = _filter_products(RecycleProduct.objects.all(), keyword).values(*PRODUCT_FIELDS)
+        return json_response(list(products))
+
+    try:
+        limit = int(request.GET.get('limit', PRODUCTS_DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        limit = PRODUCTS_DEFAULT_LIMIT
+    limit = max(1, min(limit, PRODUCTS_MAX_LIMIT))
+
+    fields = [field.strip() for field in request.GET.get('fields', '').split(',') if field.strip()]
+    unknown = [field for field in fields if field not in PRODUCT_FIELDS]
+    if unknown:
+        return json_response({'detail': f"不支持的字段: {', '.join(unknown)}"}, status=400)
+    fields = fields or list(PRODUCT_FIELDS)
+
+    cursor = request.GET.get('cursor')
+    try:
+        after = decode_cursor(cursor) if cursor else None
+        if keyword and settings.PRODUCT_SEARCH_BACKEND == 'ngram':
+            results, next_cursor, count = _search_products(keyword, limit, fields, after)
+        else:
+            results, next_cursor, count = _list_products(keyword, limit, fields, after)
+    except (TypeError, ValueError):
+        return json_response({'detail': '无效的游标'}, status=400)
+
+    if after is not None or request.GET.get('count', '1') == '0':
+        count = None
+    elif count is None:
+        count = _filter_products(RecycleProduct.objects.all(), keyword).count()
+    return json_response({'results': results, 'next_cursor': next_cursor, 'count': count})
+
+
+def _filter_products(queryset, keyword):
     # 模糊搜索：支持产品名称、品牌、型号、类型
     if keyword:
         queryset = queryset.filter(
@@ -27,71 +158,102 @@ def products_list(request):
             Q(category__icontains=keyword) |
             Q(product_code__icontains=keyword)
         )
-    
-    products = queryset.values(
-        'id', 'product_code', 'name', 'category', 'brand', 'model', 'avg_price', 'scrape_date'
-    )
-    return json_response(list(products))
+    return queryset
+
+
+def _list_products(keyword, limit, fields, after):
+    """按 (scrape_date, id) 倒序的一页，返回 (结果, 下一页游标, None)"""
+    page = _filter_products(RecycleProduct.objects.all(), keyword)
+    if after is not None:
+        if len(after) != 2:
+            raise ValueError(after)
+        last_date, last_id = date.fromisoformat(after[0]), int(after[1])
+        page = page.filter(Q(scrape_date__lt=last_date) | Q(scrape_date=last_date, id__lt=last_id))
+
+    # 多取一条判断是否还有下一页；排序键总是查询出来用于生成游标
+    columns = list(dict.fromkeys([*fields, 'scrape_date', 'id']))
+    rows = list(page.order_by('-scrape_date', '-id').values(*columns)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['scrape_date'].isoformat(), rows[-1]['id'])
+
+    return [{field: row[field] for field in fields} for row in rows], next_cursor, None
+
+
+def _search_products(keyword, limit, fields, after):
+    """从搜索索引取一页id（按相关度），再按主键查询字段，返回 (结果, 下一页游标, 总数)"""
+    if after is not None and (len(after) != 1 or not isinstance(after[0], int)):
+        raise ValueError(after)
+    ids, count, next_key = search.get_index().page(keyword, limit, after[0] if after else None)
+
+    rows = RecycleProduct.objects.filter(id__in=ids).values(*dict.fromkeys([*fields, 'id']))
+    by_id = {row['id']: row for row in rows}
+    # 索引重建前被删除的产品直接跳过
+    results = [{field: by_id[i][field] for field in fields} for i in ids if i in by_id]
+    return results, encode_cursor(next_key) if next_key is not None else None, count
 
 
+@conditional(versioning.PRODUCTS)
 def types_list(request):
-    types = RecycleProduct.objects.values_list('category', flat=True).distinct().order_by('category')
-    return json_response(list(types))
+    return json_response(taxonomy.get_taxonomy().types)
 
 
+@conditional(versioning.PRODUCTS)
 def brands_list(request):
     category = request.GET.get('category')
     if not category:
         return json_response([])
-    brands = RecycleProduct.objects.filter(category=category).values_list('brand', flat=True).distinct().order_by('brand')
-    return json_response(list(brands))
+    return json_response(taxonomy.get_taxonomy().brands_of(category))
 
 
+@conditional(versioning.PRODUCTS)
 def models_list(request):
     category = request.GET.get('category')
     brand = request.GET.get('brand')
     if not category or not brand:
         return json_response([])
-    models = RecycleProduct.objects.filter(category=category, brand=brand).values_list('model', flat=True).distinct().order_by('model')
-    return json_response(list(models))
+    return json_response(taxonomy.get_taxonomy().models_of(category, brand))
 
 
+@conditional(versioning.PRODUCTS, etag_func=catalog_etag)
+def catalog(request):
+    """完整的 类型 → 品牌 → 型号 → 产品编号 目录，带强ETag，内容未变时返回304"""
+    return HttpResponse(taxonomy.get_catalog().body, content_type='application/json; charset=utf-8')
+
+
+@conditional(versioning.PRODUCTS)
 def price_trend(request):
+    product_code = request.GET.get('product_code')
     category = request.GET.get('category')
     brand = request.GET.get('brand')
     model = request.GET.get('model')
-    if not all([category, brand, model]):
+    if product_code:
+        product = RecycleProduct.objects.filter(product_code=product_code).first()
+    elif all([category, brand, model]):
+        product = RecycleProduct.objects.filter(category=category, brand=brand, model=model).first()
+    else:
         return json_response({'detail': '缺少参数'}, status=400)
 
-    product = RecycleProduct.objects.filter(category=category, brand=brand, model=model).first()
     if not product:
         return json_response({'detail': '未找到对应产品'}, status=404)
 
-    # 获取价格历史数据
-    history = product.price_history or []
-    
-    # 确保history是列表格式
-    if not isinstance(history, list):
-        history = []
-    
+    try:
+        days = int(request.GET.get('days', TREND_DEFAULT_DAYS))
+    except (TypeError, ValueError):
+        days = TREND_DEFAULT_DAYS
+    days = max(1, min(days, TREND_MAX_DAYS))
+
+    # 按 (product, date) 唯一索引做日期区间查询，数据库已按日期排序
+    end_date = product.scrape_date or timezone.now().date()
+    start_date = end_date - timedelta(days=days - 1)
+    prices = RecycleProductPrice.objects.filter(
+        product=product, date__range=(start_date, end_date)
+    ).order_by('date').values_list('date', 'price')
+    history = [{'date': day.strftime('%Y-%m-%d'), 'price': float(price)} for day, price in prices]
+
     # 如果有历史数据，直接使用（有几天显示几天）
-    if history:
-        # 按日期排序，确保数据按时间顺序排列
-        history_sorted = sorted(history, key=lambda x: x.get('date', ''))
-        
-        # 格式化数据，确保price是浮点数
-        formatted_history = []
-        for item in history_sorted:
-            try:
-                formatted_history.append({
-                    'date': item.get('date', ''),
-                    'price': float(item.get('price', 0))
-                })
-            except (ValueError, TypeError):
-                continue
-        
-        history = formatted_history
-    else:
+    if not history:
         # 如果没有历史数据，生成模拟的7天数据
         base_date = product.scrape_date or timezone.now().date()
         base_price = float(product.avg_price)
@@ -116,6 +278,7 @@ def price_trend(request):
     })
 
 
+@conditional(versioning.POLICIES)
 def policies_list(request):
     keyword = request.GET.get('keyword', '').strip()
     queryset = Policy.objects.all()
@@ -135,6 +298,7 @@ def policies_list(request):
     return json_response(policies)
 
 
+@conditional(versioning.POLICIES)
 def policy_detail(request, policy_id):
     policy = Policy.objects.filter(id=policy_id).first()
     if not policy:
@@ -156,7 +320,6 @@ def ai_chat(request):
     if request.method != 'POST':
         return json_response({'detail': '只支持POST请求'}, status=405)
     
-    import json
     try:
         body = json.loads(request.body)
     except json.JSONDecodeError: